@@ -1,28 +1,54 @@
+import click
 from flask import Flask
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from app.config import Config
+from app.replicas import RoutingSession
 
-db = SQLAlchemy()
-migrate = Migrate()
+# RoutingSession sends reads of @read_replica views to a replica when configured
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+def release_db_connection():
+    """Return the request's DB connection to the pool before slow outbound I/O.
+
+    Loaded ORM objects become detached (read any attributes you still need
+    first); the session checks out a fresh connection the next time it is
+    used. This keeps the pool from being pinned by requests that are just
+    waiting on Google.
+    """
+    db.session.close()
+
+
+def init_migrate(app):
+    """Register Flask-Migrate (imports alembic, so only done when needed)."""
+    from flask_migrate import Migrate
+
+    Migrate(app, db)
 
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
-    # Initialize extensions
+    # orjson-backed JSON provider when installed
+    from app.serialization import init_json
+
+    init_json(app)
+
+    # Initialize extensions. The schema is managed exclusively by Alembic
+    # migrations (run once per deploy by render_start.py), so app startup
+    # never touches the database.
     db.init_app(app)
-    migrate.init_app(app, db)
 
-    # Create tables on startup (for Render deployment)
-    with app.app_context():
-        try:
-            db.create_all()
-            print("Database tables created/verified!")
-        except Exception as e:
-            print(f"Database init skipped: {e}")
+    # Optional read replicas (DATABASE_REPLICA_URLS)
+    from app.replicas import init_replicas
+
+    init_replicas(app)
+
+    # Alembic is only needed by the `flask db` commands, not by web workers
+    if click.get_current_context(silent=True) is not None:
+        init_migrate(app)
 
     # Configure CORS - allow multiple origins
     allowed_origins = [
@@ -45,11 +71,34 @@ def create_app(config_class=Config):
     from app.routes.drive_routes import drive_bp
     from app.routes.dataroom_routes import dataroom_bp
     from app.routes.file_routes import file_bp
+    from app.routes.upload_routes import upload_bp
 
     app.register_blueprint(auth_bp, url_prefix="/auth")
     app.register_blueprint(drive_bp, url_prefix="/api/drive")
     app.register_blueprint(dataroom_bp, url_prefix="/api/datarooms")
     app.register_blueprint(file_bp, url_prefix="/api/files")
+    app.register_blueprint(upload_bp, url_prefix="/api/datarooms")
+
+    # Maintenance CLI commands
+    from app.cli import register_cli
+
+    register_cli(app)
+
+    # Prometheus metrics (request, Google API and DB instrumentation)
+    from app.metrics import init_metrics
+
+    init_metrics(app)
+
+    # Request timelines, slow-request logging and opt-in profiling
+    from app.profiling import init_profiling
+
+    init_profiling(app)
+
+    # gzip/brotli for JSON responses. Registered last so it runs first among
+    # after_request hooks, and request timings include compression
+    from app.compression import init_compression
+
+    init_compression(app)
 
     # Health check endpoint
     @app.route("/health")
@@ -56,6 +56,7 @@ def require_auth(f):
             return jsonify({"error": "UNAUTHORIZED", "message": "User not found"}), 401
 
         g.current_user = user
+        g.current_user_id = user.id
         return f(*args, **kwargs)
 
     return decorated_function
@@ -0,0 +1,198 @@
+"""Flask CLI commands for maintenance jobs (run with ``flask <command>``)."""
+import click
+from flask import Flask
+from flask.cli import AppGroup
+
+
+def register_cli(app: Flask) -> None:
+    @app.cli.command("extract-text")
+    @click.option("--batch-size", default=200, show_default=True)
+    def extract_text_command(batch_size):
+        """Extract and index text for imported files that have none yet."""
+        from app.extraction import index_pending
+
+        last_id = None
+        while True:
+            last_id = index_pending(batch_size, after_id=last_id)
+            if last_id is None:
+                break
+            click.echo(f"Indexed up to file {last_id}")
+        click.echo("Text extraction complete.")
+
+    @app.cli.command("reconcile-usage")
+    def reconcile_usage_command():
+        """Recompute user and dataroom storage counters from the files table."""
+        from app.usage import reconcile_usage
+
+        corrected = reconcile_usage()
+        click.echo(f"Usage reconciled ({corrected} counters corrected).")
+
+    @app.cli.command("cleanup-uploads")
+    def cleanup_uploads_command():
+        """Remove resumable upload sessions older than UPLOAD_SESSION_MAX_AGE_HOURS."""
+        from app.uploads import cleanup_sessions
+
+        max_age = app.config["UPLOAD_SESSION_MAX_AGE_HOURS"] * 3600
+        click.echo(f"Removed {cleanup_sessions(max_age)} stale upload sessions.")
+
+    @app.cli.command("scrub-storage")
+    @click.option("--batch-size", default=200, show_default=True)
+    @click.option("--max-seconds", type=float, help="Stop (resumably) after this long.")
+    @click.option("--restart", is_flag=True, help="Start a new pass instead of resuming.")
+    @click.option("--delete-orphans", is_flag=True, help="Remove orphaned files found on disk.")
+    def scrub_storage_command(batch_size, max_seconds, restart, delete_orphans):
+        """Verify stored files against their rows; list orphans after a full pass."""
+        from app.scrubber import ScrubInProgressError, find_orphans, scrub_storage
+        from app.storage import release_storage
+
+        try:
+            state = scrub_storage(batch_size, max_seconds, restart)
+        except ScrubInProgressError as e:
+            raise click.ClickException(str(e))
+
+        totals = state["totals"]
+        click.echo(
+            f"Checked {totals['checked']} files: {totals['missing']} missing, "
+            f"{totals['corrupt']} corrupt, {totals['checksums_recorded']} checksums recorded."
+        )
+        if not state.get("complete"):
+            click.echo(f"Pass incomplete; the next run resumes after file {state.get('after_id')}.")
+            return
+
+        orphans = list(find_orphans())
+        for path in orphans:
+            click.echo(f"Orphan: {path}")
+        if delete_orphans:
+            release_storage(orphans)
+        click.echo(f"Scrub pass complete ({len(orphans)} orphaned files"
+                   f"{' removed' if delete_orphans else ''}).")
+
+    @app.cli.command("purge-files")
+    @click.option("--retention-days", type=int, help="Defaults to FILE_RETENTION_DAYS.")
+    @click.option("--mode", type=click.Choice(["archive", "delete"]),
+                  help="Defaults to FILE_PURGE_MODE.")
+    @click.option("--batch-size", type=int, help="Defaults to FILE_PURGE_BATCH_SIZE.")
+    @click.option("--max-seconds", type=float, help="Stop after this long.")
+    @click.option("--dry-run", is_flag=True, help="Only count the rows that would be purged.")
+    @click.option("--vacuum", is_flag=True, help="VACUUM (ANALYZE) the files table afterwards.")
+    def purge_files_command(retention_days, mode, batch_size, max_seconds, dry_run, vacuum):
+        """Archive or delete file rows deleted/failed longer than the retention period."""
+        from app.purge import count_purgeable, purge_files, vacuum_files
+
+        if retention_days is None:
+            retention_days = app.config["FILE_RETENTION_DAYS"]
+        if dry_run:
+            click.echo(f"{count_purgeable(retention_days)} file rows older than "
+                       f"{retention_days} days would be purged.")
+            return
+
+        mode = mode or app.config["FILE_PURGE_MODE"]
+        result = purge_files(
+            retention_days,
+            mode=mode,
+            batch_size=batch_size or app.config["FILE_PURGE_BATCH_SIZE"],
+            pause_seconds=app.config["FILE_PURGE_PAUSE_SECONDS"],
+            max_seconds=max_seconds,
+        )
+        verb = "Archived" if mode == "archive" else "Deleted"
+        click.echo(f"{verb} {result['purged']} file rows in {result['batches']} batches"
+                   f"{'' if result['complete'] else ' (stopped early; run again to continue)'}.")
+        if vacuum and vacuum_files():
+            click.echo("Vacuumed files tables.")
+
+    dataroom_cli = AppGroup("dataroom", help="Bulk import, export and verification of datarooms.")
+
+    @dataroom_cli.command("import-manifest")
+    @click.argument("manifest", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--user", "user_email", required=True, help="Email of the owning user.")
+    @click.option("--dataroom", "dataroom_id", help="Dataroom for entries that don't name one.")
+    @click.option("--workers", type=int, help="Defaults to MANIFEST_WORKERS.")
+    @click.option("--batch-size", type=int, help="Defaults to MANIFEST_BATCH_SIZE.")
+    @click.option("--checkpoint", type=click.Path(dir_okay=False),
+                  help="Progress file (default: MANIFEST.progress.json).")
+    @click.option("--restart", is_flag=True, help="Ignore the checkpoint and start over.")
+    @click.option("--defer-processing", is_flag=True,
+                  help="Skip text extraction and thumbnails (run `flask extract-text` later).")
+    def import_manifest_command(manifest, user_email, dataroom_id, workers, batch_size,
+                                checkpoint, restart, defer_processing):
+        """Import the Drive files and local paths listed in a JSON or CSV manifest."""
+        from app.manifests import ManifestError, import_manifest
+        from app.tasks import wait_for_tasks
+
+        def progress(state):
+            rate = state["imported"] / state["elapsed_seconds"] if state["elapsed_seconds"] else 0
+            click.echo(f"{state['position']}/{state['total']}: {state['imported']} imported, "
+                       f"{state['skipped']} skipped, {state['failed_count']} failed "
+                       f"({rate:.0f} files/s)")
+
+        try:
+            state = import_manifest(
+                manifest,
+                user_email,
+                dataroom_id=dataroom_id,
+                workers=workers or app.config["MANIFEST_WORKERS"],
+                batch_size=batch_size or app.config["MANIFEST_BATCH_SIZE"],
+                checkpoint_path=checkpoint,
+                restart=restart,
+                process=not defer_processing,
+                on_progress=progress,
+            )
+        except ManifestError as e:
+            raise click.ClickException(str(e))
+        finally:
+            # Let queued extraction and thumbnails finish before exiting
+            wait_for_tasks()
+
+        for failure in state["failed"]:
+            click.echo(f"Failed #{failure['index']} {failure['source']}: {failure['error']}")
+        click.echo(f"Import complete: {state['imported']} imported, {state['skipped']} skipped, "
+                   f"{state['failed_count']} failed.")
+        if defer_processing:
+            click.echo("Run `flask extract-text` to index them.")
+
+    @dataroom_cli.command("export")
+    @click.argument("dataroom_id")
+    @click.argument("out_dir", type=click.Path(file_okay=False))
+    @click.option("--workers", type=int, help="Defaults to MANIFEST_WORKERS.")
+    def export_command(dataroom_id, out_dir, workers):
+        """Copy a dataroom's files to OUT_DIR with a manifest for import-manifest."""
+        from app.manifests import ManifestError, export_dataroom
+
+        try:
+            result = export_dataroom(dataroom_id, out_dir, workers or app.config["MANIFEST_WORKERS"])
+        except ManifestError as e:
+            raise click.ClickException(str(e))
+        for failure in result["failed"]:
+            click.echo(f"Failed {failure['file_id']}: {failure['error']}")
+        click.echo(f"Exported {result['exported']} files to {out_dir}.")
+        if result["failed"]:
+            raise click.ClickException(f"{len(result['failed'])} files could not be exported.")
+
+    @dataroom_cli.command("verify")
+    @click.argument("dataroom_id")
+    @click.option("--manifest", type=click.Path(exists=True, dir_okay=False),
+                  help="Also check that every entry of this manifest was imported.")
+    @click.option("--workers", type=int, help="Defaults to MANIFEST_WORKERS.")
+    def verify_command(dataroom_id, manifest, workers):
+        """Check a dataroom's stored files against their sizes and checksums."""
+        from app.manifests import ManifestError, verify_dataroom
+
+        try:
+            result = verify_dataroom(
+                dataroom_id, manifest, workers or app.config["MANIFEST_WORKERS"]
+            )
+        except ManifestError as e:
+            raise click.ClickException(str(e))
+
+        for status in ("missing", "corrupt"):
+            for file_id in result[status]:
+                click.echo(f"{status.capitalize()}: {file_id}")
+        for source in result["missing_entries"]:
+            click.echo(f"Not imported: {source}")
+        click.echo(f"{result['ok']} files ok, {len(result['missing'])} missing, "
+                   f"{len(result['corrupt'])} corrupt, "
+                   f"{len(result['missing_entries'])} manifest entries not imported.")
+        if result["missing"] or result["corrupt"] or result["missing_entries"]:
+            raise click.ClickException("Verification failed.")
+
+    app.cli.add_command(dataroom_cli)
@@ -0,0 +1,133 @@
+"""Copy-on-write dataroom cloning.
+
+A clone gets new ``files`` rows pointing at the same ``storage_path`` as the
+originals, so no bytes are copied; stored files are only removed from disk
+once no imported row references them (``storage.release_storage``). Rows
+are copied with a single ``INSERT ... SELECT`` on Postgres, together with
+their extracted text so the clone is searchable immediately.
+
+Clone file ids are derived from (original id, new dataroom id), which lets
+the ``file_contents`` copy join back to the new rows without a round trip.
+"""
+import hashlib
+import uuid
+from typing import List, Optional
+from sqlalchemy import String, cast, func, insert, literal
+from sqlalchemy.dialects.postgresql import UUID
+from app import db
+from app.models import Dataroom, File, FileContent
+
+# Columns copied verbatim from the source rows
+FILE_COLUMNS = (
+    "user_id",
+    "google_file_id",
+    "name",
+    "mime_type",
+    "size_bytes",
+    "storage_path",
+    "sha256",
+    "original_url",
+    "status",
+    "imported_at",
+)
+CONTENT_COLUMNS = ("text", "search_vector", "status", "extracted_at")
+
+
+def clone_file_id(file_id: str, dataroom_id: str) -> str:
+    """The id of ``file_id``'s copy in ``dataroom_id``."""
+    return str(uuid.UUID(hashlib.md5(f"{file_id}{dataroom_id}".encode("utf-8")).hexdigest()))
+
+
+def _clone_file_id_sql(file_id_column, dataroom_id: str):
+    # Same derivation as clone_file_id, computed by Postgres
+    return cast(cast(func.md5(file_id_column + literal(dataroom_id)), UUID), String)
+
+
+def _copy_rows_sql(source_id: str, clone_id: str, file_ids: Optional[List[str]]) -> None:
+    files = File.__table__
+    # FOR SHARE: a concurrent delete of a source row waits for us (or we skip
+    # the row), so it can't release a stored file the clone now references
+    source = (
+        db.select(
+            _clone_file_id_sql(files.c.id, clone_id),
+            literal(clone_id),
+            *(files.c[name] for name in FILE_COLUMNS),
+        )
+        .where(files.c.dataroom_id == source_id, files.c.status == "imported")
+        .with_for_update(read=True)
+    )
+    if file_ids is not None:
+        source = source.where(files.c.id.in_(file_ids))
+    db.session.execute(
+        insert(files).from_select(["id", "dataroom_id", *FILE_COLUMNS], source)
+    )
+
+    contents = FileContent.__table__
+    source = (
+        db.select(
+            _clone_file_id_sql(contents.c.file_id, clone_id),
+            *(contents.c[name] for name in CONTENT_COLUMNS),
+        )
+        .join(files, files.c.id == contents.c.file_id)
+        .where(files.c.dataroom_id == source_id, files.c.status == "imported")
+    )
+    if file_ids is not None:
+        source = source.where(files.c.id.in_(file_ids))
+    db.session.execute(
+        insert(contents).from_select(["file_id", *CONTENT_COLUMNS], source)
+    )
+
+
+def _copy_rows_python(source_id: str, clone_id: str, file_ids: Optional[List[str]]) -> None:
+    # Databases without md5()/uuid casts: read the rows, then bulk insert
+    files = File.__table__
+    contents = FileContent.__table__
+    query = db.select(files).where(
+        files.c.dataroom_id == source_id, files.c.status == "imported"
+    )
+    if file_ids is not None:
+        query = query.where(files.c.id.in_(file_ids))
+    rows = db.session.execute(query).mappings().all()
+    if not rows:
+        return
+
+    db.session.execute(insert(files), [
+        {
+            "id": clone_file_id(row["id"], clone_id),
+            "dataroom_id": clone_id,
+            **{name: row[name] for name in FILE_COLUMNS},
+        }
+        for row in rows
+    ])
+
+    content_rows = db.session.execute(
+        db.select(contents).where(contents.c.file_id.in_([row["id"] for row in rows]))
+    ).mappings().all()
+    if content_rows:
+        db.session.execute(insert(contents), [
+            {
+                "file_id": clone_file_id(row["file_id"], clone_id),
+                **{name: row[name] for name in CONTENT_COLUMNS},
+            }
+            for row in content_rows
+        ])
+
+
+def clone_dataroom(source: Dataroom, name: str, file_ids: Optional[List[str]] = None) -> Dataroom:
+    """Clone a dataroom (or a subset of its files) without copying stored bytes."""
+    clone = Dataroom(user_id=source.user_id, name=name, description=source.description)
+    db.session.add(clone)
+    db.session.flush()
+
+    if db.engine.dialect.name == "postgresql":
+        _copy_rows_sql(source.id, clone.id, file_ids)
+    else:
+        _copy_rows_python(source.id, clone.id, file_ids)
+
+    # Dataroom counters are logical; the user's usage is unchanged (no new bytes)
+    clone.file_count, clone.storage_used_bytes = db.session.execute(
+        db.select(func.count(), func.coalesce(func.sum(File.size_bytes), 0))
+        .where(File.dataroom_id == clone.id)
+    ).one()
+    db.session.commit()
+    return clone
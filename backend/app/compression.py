@@ -0,0 +1,100 @@
+"""Response compression for JSON API responses.
+
+Responses of at least ``COMPRESS_MIN_BYTES`` are gzip-compressed, or
+brotli-compressed when the client accepts it and the ``brotli`` package is
+installed. Streamed responses (large listings) are compressed chunk by chunk
+as they are sent. File downloads and thumbnails are left alone: they're
+served with ``send_file`` and are mostly already compressed.
+"""
+import zlib
+from flask import Flask, current_app, request
+
+COMPRESSIBLE_MIMETYPES = {"application/json"}
+
+# gzip level / brotli quality: fast settings suited to dynamic responses
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+class _Gzip:
+    def __init__(self):
+        # wbits=31: gzip container
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+def _choose_encoding():
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def _compress_stream(chunks, compressor):
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """Compress ``response`` in place if it's worth it and the client accepts it."""
+    if (
+        request.method == "HEAD"
+        or response.status_code != 200
+        or response.direct_passthrough
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+
+    if not response.is_streamed and (
+        response.calculate_content_length() or 0
+    ) < current_app.config["COMPRESS_MIN_BYTES"]:
+        return response
+
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+    compressor = _Brotli() if encoding == "br" else _Gzip()
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.iter_encoded(), compressor)
+        response.headers.pop("Content-Length", None)
+    else:
+        response.set_data(compressor.compress(response.get_data()) + compressor.flush())
+    response.headers["Content-Encoding"] = encoding
+
+    # A strong ETag would now be wrong for the compressed bytes
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app: Flask) -> None:
+    """Compress JSON responses (COMPRESSION_ENABLED=false turns it off)."""
+    if app.config.get("COMPRESSION_ENABLED", True):
+        app.after_request(compress_response)
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import threading
+import uuid
+from typing import Iterable, Optional
+
+# Eviction trims to this fraction of the budget, so one scan covers many puts
+LOW_WATER_FRACTION = 0.9
+
+
+class DiskLRUCache:
+    """Size-bounded on-disk cache with least-recently-used eviction.
+
+    Entries are plain files named after a hash of their key. Recency is
+    tracked through the file mtime (bumped on every hit), so the cache is
+    shared safely between gunicorn workers without any in-memory index.
+
+    Each process keeps a running total of the cache size, seeded by one walk
+    of the directory and updated on its own puts and deletes; the directory
+    is only walked again (which also picks up other workers' entries) once
+    that total goes over budget, and eviction then frees a tenth of the
+    budget so the next walk is many puts away.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None  # unknown until the first put
+
+    def _path_for(self, key: Iterable[str]) -> str:
+        digest = hashlib.sha256("\x00".join(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get_path(self, key: Iterable[str]) -> Optional[str]:
+        """Return the path of a cached entry, marking it as recently used."""
+        path = self._path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get(self, key: Iterable[str]) -> Optional[bytes]:
+        """Return the cached content for a key, or None on a miss."""
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted by another worker between utime and open
+            return None
+
+    def put(self, key: Iterable[str], content: bytes) -> str:
+        """Store content under a key and evict old entries if over budget."""
+        path = self._path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        replaced = self._size_of(path)
+
+        # Write to a temp file first so readers never see a partial entry
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan()[1]
+            else:
+                self._total_bytes += len(content) - replaced
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+        return path
+
+    def delete(self, key: Iterable[str]) -> None:
+        """Remove an entry from the cache if present."""
+        path = self._path_for(key)
+        size = self._size_of(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+
+    @staticmethod
+    def _size_of(path: str) -> int:
+        try:
+            return os.stat(path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _scan(self):
+        """All entries as (mtime, size, path), and their total size."""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        return entries, total
+
+    def evict(self) -> None:
+        """Remove least recently used entries if over budget, down to the low-water mark."""
+        entries, total = self._scan()
+        if total > self.max_bytes:
+            low_water = int(self.max_bytes * LOW_WATER_FRACTION)
+            entries.sort()
+            for _, size, path in entries:
+                if total <= low_water:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        with self._lock:
+            self._total_bytes = total
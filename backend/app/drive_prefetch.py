@@ -0,0 +1,135 @@
+"""Speculative prefetch of the next Drive listing page.
+
+When the picker asks for a page with ``prefetch=1``, ``list_files`` starts
+fetching the following page in the background as soon as it has the current
+one. The result is kept in a per-user, per-worker cache keyed by
+``(page_token, page_size, q, folder_id)``, so the "load more" request that
+follows is answered without waiting on Drive (or joins the fetch still in
+flight).
+
+Each user has at most ``DRIVE_PREFETCH_MAX_PER_USER`` prefetches; starting
+another one evicts the oldest. Entries expire after
+``DRIVE_PREFETCH_TTL_SECONDS``, and when a user's request hits one entry the
+rest are dropped: a prefetch that hasn't started yet is cancelled. A
+request that lands on another worker just misses and fetches normally.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from flask import current_app
+from app.google_client import list_drive_files
+from app.metrics import DRIVE_PREFETCHES
+
+# Threads per worker process for prefetching
+PREFETCH_THREADS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+# user_id -> OrderedDict[key, (future, expires_at)]
+_entries: Dict[str, "OrderedDict[Tuple, Tuple[Future, float]]"] = {}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=PREFETCH_THREADS, thread_name_prefix="drive-prefetch"
+            )
+        return _executor
+
+
+def _drop(future: Optional[Future]) -> None:
+    # A queued fetch is cancelled; a running one finishes and is discarded
+    if future is not None:
+        future.cancel()
+        DRIVE_PREFETCHES.labels(outcome="wasted").inc()
+
+
+def _sweep(now: float) -> None:
+    # Drop expired entries of users who never came back. Call with _lock held
+    for user_id in list(_entries):
+        entries = _entries[user_id]
+        for key in [k for k, (_, expires_at) in entries.items() if expires_at <= now]:
+            _drop(entries.pop(key)[0])
+        if not entries:
+            del _entries[user_id]
+
+
+def _fetch(app, access_token: str, key: Tuple) -> dict:
+    page_token, page_size, query, folder_id = key
+    with app.app_context():
+        return list_drive_files(
+            access_token=access_token,
+            page_size=page_size,
+            page_token=page_token,
+            query=query,
+            folder_id=folder_id,
+        )
+
+
+def start_prefetch(user_id: str, access_token: str, key: Tuple) -> None:
+    """Fetch the page for ``key`` (page_token, page_size, q, folder_id) in the background."""
+    max_entries = current_app.config["DRIVE_PREFETCH_MAX_PER_USER"]
+    if max_entries <= 0:
+        return
+    now = time.monotonic()
+    expires_at = now + current_app.config["DRIVE_PREFETCH_TTL_SECONDS"]
+    app = current_app._get_current_object()
+
+    with _lock:
+        _sweep(now)
+        entries = _entries.setdefault(user_id, OrderedDict())
+        if key in entries:
+            return
+        while len(entries) >= max_entries:
+            _drop(entries.popitem(last=False)[1][0])
+        entries[key] = (None, expires_at)
+
+    future = _get_executor().submit(_fetch, app, access_token, key)
+    with _lock:
+        entries = _entries.get(user_id)
+        if entries is not None and key in entries:
+            entries[key] = (future, expires_at)
+            return
+    # Evicted while submitting
+    _drop(future)
+
+
+def take_prefetched(user_id: str, key: Tuple, timeout: float = 30) -> Optional[dict]:
+    """The prefetched page for ``key``, or None to fetch it normally.
+
+    A fetch still in flight is waited for rather than repeated. The user's
+    other prefetches are dropped.
+    """
+    now = time.monotonic()
+    with _lock:
+        entries = _entries.pop(user_id, None)
+    if not entries:
+        return None
+
+    found = None
+    for entry_key, (future, expires_at) in entries.items():
+        if entry_key == key and expires_at > now and future is not None:
+            found = future
+        else:
+            _drop(future)
+    if found is None:
+        return None
+
+    if found.cancel():
+        # Still queued: fetching it directly is just as fast
+        DRIVE_PREFETCHES.labels(outcome="wasted").inc()
+        return None
+    waited = not found.done()
+    try:
+        result = found.result(timeout=timeout)
+    except Exception:
+        # Includes a timeout; the request then fetches the page itself
+        DRIVE_PREFETCHES.labels(outcome="failed").inc()
+        return None
+    DRIVE_PREFETCHES.labels(outcome="waited" if waited else "used").inc()
+    return result
@@ -0,0 +1,164 @@
+"""Per-user import progress events, delivered over Server-Sent Events.
+
+``import_file`` and ``download_drive_file`` publish progress for the
+current user; ``GET /api/files/import/events`` subscribes and streams it.
+By default events are fanned out in-process, which only reaches
+subscribers connected to the same worker. With several gunicorn workers,
+set ``EVENTS_REDIS_URL`` to relay them through Redis pub/sub (requires the
+``redis`` package).
+"""
+import json
+import queue
+import threading
+import time
+from typing import Callable, Optional
+from flask import current_app, request
+
+# Events buffered per subscriber before a slow client starts losing them
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Minimum gap between "downloading" events for one import
+PROGRESS_INTERVAL_SECONDS = 0.25
+
+
+class _LocalSubscription:
+    def __init__(self, broker, user_id: str):
+        self._broker = broker
+        self._user_id = user_id
+        self._queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def get(self, timeout: float) -> Optional[dict]:
+        """Wait up to ``timeout`` seconds for the next event."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self._broker._unsubscribe(self._user_id, self)
+
+
+class LocalEventBroker:
+    """In-process pub/sub keyed by user id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, user_id: str, event: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription._queue.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def subscribe(self, user_id: str) -> _LocalSubscription:
+        subscription = _LocalSubscription(self, user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, user_id: str, subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+
+class _RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def get(self, timeout: float) -> Optional[dict]:
+        message = self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message["data"])
+
+    def close(self) -> None:
+        self._pubsub.close()
+
+
+class RedisEventBroker:
+    """Cross-worker pub/sub over Redis channels (one channel per user)."""
+
+    def __init__(self, url: str):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _channel(user_id: str) -> str:
+        return f"dataroom:import-events:{user_id}"
+
+    def publish(self, user_id: str, event: dict) -> None:
+        self._redis.publish(self._channel(user_id), json.dumps(event))
+
+    def subscribe(self, user_id: str) -> _RedisSubscription:
+        pubsub = self._redis.pubsub()
+        pubsub.subscribe(self._channel(user_id))
+        return _RedisSubscription(pubsub)
+
+
+def get_event_broker():
+    """Get the import event broker for the current app."""
+    broker = current_app.extensions.get("event_broker")
+    if broker is None:
+        redis_url = current_app.config.get("EVENTS_REDIS_URL")
+        broker = RedisEventBroker(redis_url) if redis_url else LocalEventBroker()
+        current_app.extensions["event_broker"] = broker
+    return broker
+
+
+def publish_import_event(user_id: str, import_id: str, stage: str, **fields) -> None:
+    """Publish an import progress event; failures never break the import."""
+    event = {"import_id": import_id, "stage": stage, "timestamp": time.time(), **fields}
+    try:
+        get_event_broker().publish(user_id, event)
+    except Exception as e:
+        current_app.logger.warning(f"Failed to publish import event: {str(e)}")
+
+
+def download_progress(
+    user_id: str, import_id: str, **fields
+) -> Callable[[int, Optional[int]], None]:
+    """Build a ``download_drive_file`` progress callback publishing throttled events."""
+    last_sent = 0.0
+
+    def report(bytes_downloaded: int, total_bytes: Optional[int]) -> None:
+        nonlocal last_sent
+        now = time.monotonic()
+        done = total_bytes is not None and bytes_downloaded >= total_bytes
+        if not done and now - last_sent < PROGRESS_INTERVAL_SECONDS:
+            return
+        last_sent = now
+        publish_import_event(
+            user_id,
+            import_id,
+            "downloading",
+            bytes_downloaded=bytes_downloaded,
+            total_bytes=total_bytes,
+            **fields,
+        )
+
+    return report
+
+
+def format_sse(event: dict) -> str:
+    """Encode an event as a Server-Sent Events message."""
+    return f"event: import\ndata: {json.dumps(event)}\n\n"
+
+
+def streams_block_worker() -> bool:
+    """Whether an open stream would tie up a whole worker (e.g. gunicorn sync)."""
+    if request.environ.get("wsgi.multithread"):
+        return False
+    try:
+        from gevent import monkey
+    except ImportError:
+        return True
+    return not monkey.is_module_patched("socket")
@@ -0,0 +1,24 @@
+import os
+from typing import Optional
+from flask import current_app
+from app.disk_cache import DiskLRUCache
+
+
+def get_export_cache() -> Optional[DiskLRUCache]:
+    """Get the Google Workspace export cache for the current app, if enabled."""
+    if not current_app.config.get("EXPORT_CACHE_ENABLED", True):
+        return None
+
+    cache = current_app.extensions.get("export_cache")
+    if cache is None:
+        root = current_app.config.get("EXPORT_CACHE_PATH") or os.path.join(
+            current_app.config["STORAGE_PATH"], ".cache", "exports"
+        )
+        cache = DiskLRUCache(root, current_app.config["EXPORT_CACHE_MAX_BYTES"])
+        current_app.extensions["export_cache"] = cache
+    return cache
+
+
+def export_cache_key(file_id: str, version: str, export_mime: str) -> tuple:
+    """Build the cache key for an exported Drive file revision."""
+    return (file_id, version, export_mime)
@@ -0,0 +1,240 @@
+"""Text extraction and full-text indexing of imported files.
+
+Extraction runs off the request path: ``import_file`` submits
+``index_file`` as a background task, and ``flask extract-text`` indexes
+anything still pending (e.g. files imported before this existed, or after
+a crash) in keyset-paginated batches. The parsing itself happens in a
+worker process (``run_in_process``), so it never holds up a gevent hub.
+"""
+import csv
+import io
+import os
+import re
+import zipfile
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from typing import Optional
+from xml.etree import ElementTree
+from flask import current_app
+from sqlalchemy import cast, func, literal
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from app import db
+from app.models import File, FileContent
+from app.tasks import run_in_process
+
+# Postgres caps a tsvector at 1 MB; keep well below it
+MAX_TEXT_CHARS = 500_000
+
+# Largest uncompressed XML part read from a .docx/.xlsx (guards against zip bombs)
+MAX_ZIP_MEMBER_BYTES = 64 * 1024 * 1024
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+class _HTMLTextParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def _read_text(path: str) -> str:
+    with open(path, "rb") as f:
+        return f.read(MAX_TEXT_CHARS * 4).decode("utf-8", errors="replace")
+
+
+def _extract_html(path: str) -> str:
+    parser = _HTMLTextParser()
+    parser.feed(_read_text(path))
+    return " ".join(parser.parts)
+
+
+def _extract_csv(path: str) -> str:
+    reader = csv.reader(io.StringIO(_read_text(path)))
+    return "\n".join(" ".join(row) for row in reader)
+
+
+def _extract_pdf(path: str) -> Optional[str]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+
+    parts, length = [], 0
+    for page in PdfReader(path).pages:
+        text = page.extract_text() or ""
+        parts.append(text)
+        length += len(text)
+        if length >= MAX_TEXT_CHARS:
+            break
+    return "\n".join(parts)
+
+
+class _TextParts:
+    """Collects text parts, noting when ``MAX_TEXT_CHARS`` is reached."""
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+
+    def add(self, text: str) -> None:
+        self.parts.append(text)
+        self.length += len(text) + 1
+
+    @property
+    def full(self) -> bool:
+        return self.length >= MAX_TEXT_CHARS
+
+    def text(self) -> str:
+        return "\n".join(self.parts)
+
+
+def _iter_zip_xml(archive: zipfile.ZipFile, name: str, tag: str):
+    """Stream the ``tag`` elements of one XML part of an Office file."""
+    info = archive.getinfo(name)
+    # ZipExtFile never inflates past the declared size, so checking it suffices
+    if info.file_size > MAX_ZIP_MEMBER_BYTES:
+        raise ValueError(f"{name} is too large to extract ({info.file_size} bytes)")
+    with archive.open(info) as f:
+        for _, element in ElementTree.iterparse(f):
+            if element.tag == tag:
+                yield element
+                element.clear()
+
+
+def _extract_docx(path: str) -> str:
+    text = _TextParts()
+    with zipfile.ZipFile(path) as archive:
+        for paragraph in _iter_zip_xml(archive, "word/document.xml", f"{WORD_NS}p"):
+            text.add("".join(t.text or "" for t in paragraph.iter(f"{WORD_NS}t")))
+            if text.full:
+                break
+    return text.text()
+
+
+def _extract_xlsx(path: str) -> str:
+    text = _TextParts()
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        if "xl/sharedStrings.xml" in names:
+            for item in _iter_zip_xml(archive, "xl/sharedStrings.xml", f"{SHEET_NS}si"):
+                text.add("".join(t.text or "" for t in item.iter(f"{SHEET_NS}t")))
+                if text.full:
+                    return text.text()
+        for name in names:
+            if not (name.startswith("xl/worksheets/") and name.endswith(".xml")):
+                continue
+            # Inline strings and numeric values (shared strings are above)
+            for cell in _iter_zip_xml(archive, name, f"{SHEET_NS}c"):
+                if cell.get("t") == "s":
+                    continue
+                for t in cell.iter(f"{SHEET_NS}t"):
+                    text.add(t.text or "")
+                value = cell.find(f"{SHEET_NS}v")
+                if value is not None and value.text:
+                    text.add(value.text)
+                if text.full:
+                    return text.text()
+    return text.text()
+
+
+EXTRACTORS = {
+    ".txt": _read_text,
+    ".json": _read_text,
+    ".xml": _read_text,
+    ".csv": _extract_csv,
+    ".html": _extract_html,
+    ".htm": _extract_html,
+    ".pdf": _extract_pdf,
+    ".docx": _extract_docx,
+    ".xlsx": _extract_xlsx,
+}
+
+
+def extract_text(path: str) -> Optional[str]:
+    """Extract plain text from a stored file, or None if the type is unsupported.
+
+    Dispatches on the stored file's extension, which reflects the actual
+    content (Google Docs are stored as exported PDFs, for example).
+    """
+    extractor = EXTRACTORS.get(os.path.splitext(path)[1].lower())
+    if extractor is None:
+        return None
+    text = extractor(path)
+    if text is None:
+        return None
+    # Collapse whitespace runs and drop NULs (not allowed in Postgres text)
+    return re.sub(r"\s+", " ", text.replace("\x00", " ")).strip()[:MAX_TEXT_CHARS]
+
+
+def search_config():
+    """The Postgres text search configuration (e.g. 'english') as a regconfig."""
+    return cast(literal(current_app.config["TEXT_SEARCH_CONFIG"]), REGCONFIG)
+
+
+def _search_vector(name: str, text: Optional[str]):
+    if db.engine.dialect.name != "postgresql":
+        return None
+    return func.to_tsvector(search_config(), f"{name} {text or ''}")
+
+
+def index_file(file_id: str) -> Optional[str]:
+    """Extract and index one file. Returns the resulting status."""
+    file = db.session.get(File, file_id)
+    if not file or file.status != "imported" or not file.storage_path:
+        return None
+
+    try:
+        text = run_in_process(extract_text, file.storage_path)
+        status = "extracted" if text is not None else "unsupported"
+    except Exception as e:
+        current_app.logger.warning(f"Text extraction failed for {file_id}: {str(e)}")
+        text, status = None, "failed"
+
+    content = file.content or FileContent(file_id=file.id)
+    content.text = text
+    content.status = status
+    content.search_vector = _search_vector(file.name, text)
+    content.extracted_at = datetime.now(timezone.utc)
+    db.session.add(content)
+    db.session.commit()
+    return status
+
+
+def index_pending(batch_size: int = 200, after_id: Optional[str] = None) -> Optional[str]:
+    """Index the next keyset batch of imported files with no extracted content.
+
+    Returns the last file id processed (pass it back as ``after_id``), or
+    None when nothing is left.
+    """
+    query = (
+        db.select(File.id)
+        .outerjoin(FileContent, FileContent.file_id == File.id)
+        .where(
+            File.status == "imported",
+            File.storage_path.isnot(None),
+            FileContent.file_id.is_(None),
+        )
+        .order_by(File.id)
+        .limit(batch_size)
+    )
+    if after_id:
+        query = query.where(File.id > after_id)
+
+    file_ids = db.session.scalars(query).all()
+    for file_id in file_ids:
+        index_file(file_id)
+    return file_ids[-1] if file_ids else None
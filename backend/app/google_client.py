@@ -1,14 +1,29 @@
+import time
 import requests
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, Optional
 from flask import current_app
 from app.models import OAuthAccount
 from app import db
+from app.export_cache import get_export_cache, export_cache_key
+from app.metrics import observe_google_call
+from app.profiling import record_span
 
 GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
 GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v3/userinfo"
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v3/certs"
 GOOGLE_DRIVE_API = "https://www.googleapis.com/drive/v3"
 
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# Google Workspace files (Docs, Sheets, etc.) need to be exported
+GOOGLE_WORKSPACE_EXPORT_TYPES = {
+    "application/vnd.google-apps.document": "application/pdf",
+    "application/vnd.google-apps.spreadsheet": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.google-apps.presentation": "application/pdf",
+    "application/vnd.google-apps.drawing": "application/pdf",
+}
+
 
 class GoogleClientError(Exception):
     """Custom exception for Google API errors."""
@@ -19,14 +34,47 @@ class GoogleClientError(Exception):
         super().__init__(self.message)
 
 
+def _google_url(name: str, default: str) -> str:
+    """Get a Google endpoint URL, allowing config overrides (e.g. a local fake)."""
+    return current_app.config.get(name) or default
+
+
+def _request(function: str, method: str, url: str, read: Optional[Callable] = None, **kwargs):
+    """Send a request to a Google API, recording latency and status.
+
+    With ``read`` the body is streamed and ``read(response)`` is returned;
+    the recorded duration then covers the whole transfer, not just the
+    time to the response headers. The call is also added to the current
+    request's profiling timeline.
+    """
+    start = time.perf_counter()
+    status = "error"
+    try:
+        response = requests.request(method, url, stream=read is not None, **kwargs)
+        status = response.status_code
+        if read is None:
+            return response
+        with response:
+            return read(response)
+    except requests.RequestException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        observe_google_call(function, str(status), duration)
+        record_span("http", function, start, duration, method=method, status=status)
+
+
 def exchange_code_for_tokens(code: str, redirect_uri: Optional[str] = None) -> dict:
     """Exchange authorization code for access and refresh tokens."""
     # Use provided redirect_uri or get from config
     if not redirect_uri:
         redirect_uri = current_app.config.get("GOOGLE_REDIRECT_URI")
     
-    response = requests.post(
-        GOOGLE_TOKEN_URL,
+    response = _request(
+        "exchange_code_for_tokens",
+        "POST",
+        _google_url("GOOGLE_TOKEN_URL", GOOGLE_TOKEN_URL),
         data={
             "client_id": current_app.config["GOOGLE_CLIENT_ID"],
             "client_secret": current_app.config["GOOGLE_CLIENT_SECRET"],
@@ -48,8 +96,10 @@ def exchange_code_for_tokens(code: str, redirect_uri: Optional[str] = None) -> d
 
 def refresh_access_token(refresh_token: str) -> dict:
     """Refresh the access token using the refresh token."""
-    response = requests.post(
-        GOOGLE_TOKEN_URL,
+    response = _request(
+        "refresh_access_token",
+        "POST",
+        _google_url("GOOGLE_TOKEN_URL", GOOGLE_TOKEN_URL),
         data={
             "client_id": current_app.config["GOOGLE_CLIENT_ID"],
             "client_secret": current_app.config["GOOGLE_CLIENT_SECRET"],
@@ -70,8 +120,10 @@ def refresh_access_token(refresh_token: str) -> dict:
 
 def get_user_info(access_token: str) -> dict:
     """Get user information from Google."""
-    response = requests.get(
-        GOOGLE_USERINFO_URL,
+    response = _request(
+        "get_user_info",
+        "GET",
+        _google_url("GOOGLE_USERINFO_URL", GOOGLE_USERINFO_URL),
         headers={"Authorization": f"Bearer {access_token}"},
         timeout=30,
     )
@@ -84,6 +136,23 @@ def get_user_info(access_token: str) -> dict:
     return response.json()
 
 
+def get_google_certs() -> requests.Response:
+    """Fetch Google's ID token signing keys (a JWKS; see app/id_tokens.py)."""
+    response = _request(
+        "get_google_certs",
+        "GET",
+        _google_url("GOOGLE_CERTS_URL", GOOGLE_CERTS_URL),
+        timeout=10,
+    )
+
+    if response.status_code != 200:
+        raise GoogleClientError(
+            f"Failed to get signing keys: {response.text}", "CERTS_FAILED"
+        )
+
+    return response
+
+
 def ensure_valid_access_token(oauth_account: OAuthAccount) -> str:
     """Ensure the access token is valid, refreshing if necessary."""
     # Add 5 minute margin
@@ -156,8 +225,10 @@ def list_drive_files(
         q_parts.append(f"name contains '{query}'")
     params["q"] = " and ".join(q_parts)
 
-    response = requests.get(
-        f"{GOOGLE_DRIVE_API}/files",
+    response = _request(
+        "list_drive_files",
+        "GET",
+        f"{_google_url('GOOGLE_DRIVE_API', GOOGLE_DRIVE_API)}/files",
         headers={"Authorization": f"Bearer {access_token}"},
         params=params,
         timeout=30,
@@ -173,10 +244,12 @@ def list_drive_files(
 
 def get_drive_file_metadata(access_token: str, file_id: str) -> dict:
     """Get metadata for a specific Drive file."""
-    response = requests.get(
-        f"{GOOGLE_DRIVE_API}/files/{file_id}",
+    response = _request(
+        "get_drive_file_metadata",
+        "GET",
+        f"{_google_url('GOOGLE_DRIVE_API', GOOGLE_DRIVE_API)}/files/{file_id}",
         headers={"Authorization": f"Bearer {access_token}"},
-        params={"fields": "id,name,mimeType,size,webViewLink"},
+        params={"fields": "id,name,mimeType,size,webViewLink,version,modifiedTime"},
         timeout=30,
     )
 
@@ -188,38 +261,77 @@ def get_drive_file_metadata(access_token: str, file_id: str) -> dict:
     return response.json()
 
 
-def download_drive_file(access_token: str, file_id: str, mime_type: str) -> bytes:
-    """Download a file from Google Drive."""
-    # Google Workspace files (Docs, Sheets, etc.) need to be exported
-    google_workspace_types = {
-        "application/vnd.google-apps.document": "application/pdf",
-        "application/vnd.google-apps.spreadsheet": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        "application/vnd.google-apps.presentation": "application/pdf",
-        "application/vnd.google-apps.drawing": "application/pdf",
-    }
+def _read_content(response: requests.Response, progress=None) -> bytes:
+    """Read a streamed download, reporting (bytes so far, total or None)."""
+    try:
+        total = int(response.headers["Content-Length"])
+    except (KeyError, ValueError):
+        total = None
+
+    buffer = bytearray()
+    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if progress is not None:
+            progress(len(buffer), total)
+    return bytes(buffer)
+
+
+def download_drive_file(
+    access_token: str,
+    file_id: str,
+    mime_type: str,
+    version: Optional[str] = None,
+    progress: Optional[Callable[[int, Optional[int]], None]] = None,
+) -> bytes:
+    """Download a file from Google Drive.
+
+    Google Workspace exports are cached on disk by (file id, version, export
+    mime type) when a version is given, so re-importing an unchanged doc
+    skips the slow server-side export. ``progress`` is called with the bytes
+    downloaded so far and the total size (None when Drive doesn't send it).
+    """
+    def read(response: requests.Response) -> bytes:
+        if response.status_code != 200:
+            raise GoogleClientError(
+                f"Failed to download file: {response.text}", "DRIVE_DOWNLOAD_FAILED"
+            )
+        return _read_content(response, progress)
+
+    if mime_type in GOOGLE_WORKSPACE_EXPORT_TYPES:
+        export_mime = GOOGLE_WORKSPACE_EXPORT_TYPES[mime_type]
+
+        cache = get_export_cache() if version else None
+        if cache is not None:
+            cached = cache.get(export_cache_key(file_id, version, export_mime))
+            if cached is not None:
+                if progress is not None:
+                    progress(len(cached), len(cached))
+                return cached
 
-    if mime_type in google_workspace_types:
         # Export Google Workspace file
-        export_mime = google_workspace_types[mime_type]
-        response = requests.get(
-            f"{GOOGLE_DRIVE_API}/files/{file_id}/export",
+        content = _request(
+            "download_drive_file",
+            "GET",
+            f"{_google_url('GOOGLE_DRIVE_API', GOOGLE_DRIVE_API)}/files/{file_id}/export",
+            read=read,
             headers={"Authorization": f"Bearer {access_token}"},
             params={"mimeType": export_mime},
             timeout=120,
         )
     else:
         # Download regular file
-        response = requests.get(
-            f"{GOOGLE_DRIVE_API}/files/{file_id}",
+        content = _request(
+            "download_drive_file",
+            "GET",
+            f"{_google_url('GOOGLE_DRIVE_API', GOOGLE_DRIVE_API)}/files/{file_id}",
+            read=read,
             headers={"Authorization": f"Bearer {access_token}"},
             params={"alt": "media"},
             timeout=120,
         )
+        cache = None
 
-    if response.status_code != 200:
-        raise GoogleClientError(
-            f"Failed to download file: {response.text}", "DRIVE_DOWNLOAD_FAILED"
-        )
-
-    return response.content
+    if cache is not None:
+        cache.put(export_cache_key(file_id, version, export_mime), content)
 
+    return content
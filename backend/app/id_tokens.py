@@ -0,0 +1,131 @@
+"""Local verification of Google ID tokens at login.
+
+The token response of the OAuth code exchange carries an OpenID ``id_token``,
+a JWT signed by Google with the user's ``sub``, ``email`` and ``name``.
+Checking its signature, audience, issuer and expiry against Google's
+published keys identifies the user without the userinfo request.
+
+The keys (a JWKS) are cached per worker process for as long as the certs
+response's ``Cache-Control: max-age`` allows. Google publishes new keys well
+before signing with them, but a token with an unknown ``kid`` still triggers
+an early refresh (at most every ``MIN_REFRESH_SECONDS``). Any failure -
+no id_token, a bad token, the keys unreachable, RS256 unsupported because
+``cryptography`` isn't installed - falls back to userinfo, as does a token
+whose email isn't marked ``email_verified``.
+"""
+import re
+import threading
+import time
+from typing import Dict, Optional
+import jwt
+import requests
+from flask import current_app
+from app.google_client import GoogleClientError, get_google_certs, get_user_info
+from app.metrics import LOGIN_IDENTITIES
+
+GOOGLE_ISSUERS = ["https://accounts.google.com", "accounts.google.com"]
+
+# Used when the certs response has no max-age
+DEFAULT_MAX_AGE_SECONDS = 3600
+
+# Least time between two fetches triggered by unknown kids or failures
+MIN_REFRESH_SECONDS = 60
+
+# Allowed clock skew for exp/iat
+LEEWAY_SECONDS = 60
+
+
+class IdTokenError(Exception):
+    """The id_token couldn't be verified."""
+
+
+def _max_age(response: requests.Response) -> int:
+    match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+    if not match:
+        return DEFAULT_MAX_AGE_SECONDS
+    # Age is how long a shared cache on the way has held the response already
+    try:
+        age = int(response.headers.get("Age", 0))
+    except ValueError:
+        age = 0
+    return max(int(match.group(1)) - age, 0)
+
+
+class GoogleKeyCache:
+    """Google's signing keys by kid, refreshed per Cache-Control."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: Dict[str, object] = {}
+        self._expires_at = 0.0
+        self._fetched_at = float("-inf")
+
+    def get_key(self, kid: Optional[str]):
+        with self._lock:
+            now = time.monotonic()
+            stale = now >= self._expires_at
+            unknown = kid not in self._keys and now - self._fetched_at >= MIN_REFRESH_SECONDS
+            if stale or unknown:
+                self._refresh(now)
+            key = self._keys.get(kid)
+        if key is None:
+            raise IdTokenError(f"No Google signing key with kid {kid!r}")
+        return key
+
+    def _refresh(self, now: float) -> None:
+        self._fetched_at = now
+        try:
+            response = get_google_certs()
+            keys = {key.key_id: key.key for key in jwt.PyJWKSet.from_dict(response.json()).keys}
+        except (GoogleClientError, requests.RequestException, ValueError, jwt.PyJWTError) as e:
+            # Keep serving the keys we have; try again shortly
+            self._expires_at = now + MIN_REFRESH_SECONDS
+            current_app.logger.warning(f"Could not refresh Google signing keys: {e}")
+            return
+        self._keys = keys
+        self._expires_at = now + _max_age(response)
+
+
+def get_google_key_cache() -> GoogleKeyCache:
+    cache = current_app.extensions.get("google_key_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault("google_key_cache", GoogleKeyCache())
+    return cache
+
+
+def verify_id_token(id_token: str, client_id: str) -> dict:
+    """Verify a Google ID token issued to ``client_id``; returns its claims."""
+    if not jwt.algorithms.has_crypto:
+        raise IdTokenError("RS256 needs the cryptography package")
+    try:
+        header = jwt.get_unverified_header(id_token)
+        key = get_google_key_cache().get_key(header.get("kid"))
+        return jwt.decode(
+            id_token,
+            key,
+            algorithms=["RS256"],
+            audience=client_id,
+            issuer=GOOGLE_ISSUERS,
+            leeway=LEEWAY_SECONDS,
+            options={"require": ["exp", "iat", "iss", "aud", "sub"]},
+        )
+    except jwt.InvalidTokenError as e:
+        raise IdTokenError(str(e))
+
+
+def get_google_identity(token_data: dict) -> dict:
+    """The signed-in user's ``sub``, ``email`` and ``name`` from a token response."""
+    id_token = token_data.get("id_token")
+    if id_token and current_app.config["GOOGLE_ID_TOKEN_VERIFY"]:
+        try:
+            claims = verify_id_token(id_token, current_app.config["GOOGLE_CLIENT_ID"])
+        except IdTokenError as e:
+            current_app.logger.warning(f"Google id_token not verified, using userinfo: {e}")
+        else:
+            # Accounts are looked up by email, so only take a verified one
+            if claims.get("email") and claims.get("email_verified") is True:
+                LOGIN_IDENTITIES.labels(source="id_token").inc()
+                return claims
+
+    LOGIN_IDENTITIES.labels(source="userinfo").inc()
+    return get_user_info(token_data["access_token"])
@@ -0,0 +1,177 @@
+"""Coalescing of concurrent imports of the same Drive file revision.
+
+Imports of one ``(google_file_id, version)`` that overlap in time - two
+users importing a shared file, or a double-clicked import button - share a
+single download. Within a worker process the first import downloads (in its
+import slot) and later ones attach to it, receiving its progress and then
+its bytes. If the download fails, e.g. because the first user's token was
+revoked, waiting imports download on their own.
+
+With ``IMPORT_COALESCE_ACROSS_WORKERS`` (Postgres only) the downloading
+worker also holds a session advisory lock on the revision, and leaves binary
+files in a small on-disk handoff cache (Workspace exports already land in
+the export cache). Other workers wait for the lock instead of downloading,
+then read the bytes from there. This costs a database connection per
+download in progress, so it is off by default.
+
+Each importer still stores its own copy; duplicate rows in one dataroom are
+prevented at commit time by the import route.
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from flask import current_app
+from sqlalchemy import func, select
+from app import db
+from app.disk_cache import DiskLRUCache
+from app.export_cache import get_export_cache
+from app.google_client import GOOGLE_WORKSPACE_EXPORT_TYPES
+from app.metrics import IMPORTS_COALESCED
+
+Progress = Callable[[int, Optional[int]], None]
+
+# How often a worker waiting on another worker's download checks the lock
+LOCK_POLL_SECONDS = 0.2
+
+
+class _Flight:
+    __slots__ = ("event", "content", "listeners")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.content: Optional[bytes] = None
+        self.listeners: List[Progress] = []
+
+    def report(self, done: int, total: Optional[int]) -> None:
+        for listener in list(self.listeners):
+            listener(done, total)
+
+
+class InflightDownloads:
+    """Downloads in progress in this worker process, by revision."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[tuple, _Flight] = {}
+
+    def download(
+        self, key: tuple, fetch: Callable[[Progress], bytes], progress: Optional[Progress] = None
+    ) -> bytes:
+        """Run ``fetch``, or wait for the call already in flight for ``key``."""
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                if progress is not None:
+                    flight.listeners.append(progress)
+
+            if leader:
+                try:
+                    flight.content = fetch(flight.report)
+                    return flight.content
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                    flight.event.set()
+
+            flight.event.wait()
+            if flight.content is not None:
+                IMPORTS_COALESCED.labels(source="process").inc()
+                return flight.content
+            # The download we attached to failed; try again ourselves
+
+
+def get_inflight_downloads() -> InflightDownloads:
+    downloads = current_app.extensions.get("inflight_downloads")
+    if downloads is None:
+        downloads = current_app.extensions.setdefault("inflight_downloads", InflightDownloads())
+    return downloads
+
+
+def get_handoff_cache() -> DiskLRUCache:
+    """Where the downloading worker leaves binary files for the others."""
+    cache = current_app.extensions.get("import_handoff_cache")
+    if cache is None:
+        root = os.path.join(current_app.config["STORAGE_PATH"], ".cache", "imports")
+        cache = DiskLRUCache(root, current_app.config["IMPORT_HANDOFF_CACHE_BYTES"])
+        current_app.extensions["import_handoff_cache"] = cache
+    return cache
+
+
+def _lock_id(google_file_id: str, version: str) -> int:
+    digest = hashlib.sha256(f"import\x00{google_file_id}\x00{version}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def _download_across_workers(
+    google_file_id: str,
+    version: str,
+    mime_type: str,
+    fetch: Callable[[Progress], bytes],
+    progress: Progress,
+) -> bytes:
+    # Workspace exports are cached by download_drive_file itself
+    handoff = None
+    if mime_type not in GOOGLE_WORKSPACE_EXPORT_TYPES or get_export_cache() is None:
+        handoff = get_handoff_cache()
+    key = ("import", google_file_id, version)
+    lock_id = _lock_id(google_file_id, version)
+    deadline = time.monotonic() + current_app.config["IMPORT_COALESCE_WAIT_SECONDS"]
+    waited = False
+
+    while time.monotonic() < deadline:
+        # A pooled connection is only held while we own the lock
+        conn = db.engine.connect()
+        try:
+            if conn.scalar(select(func.pg_try_advisory_lock(lock_id))):
+                try:
+                    cached = handoff.get(key) if handoff is not None else None
+                    if cached is not None:
+                        if waited:
+                            IMPORTS_COALESCED.labels(source="worker").inc()
+                        return cached
+                    content = fetch(progress)
+                    if handoff is not None:
+                        handoff.put(key, content)
+                    return content
+                finally:
+                    conn.scalar(select(func.pg_advisory_unlock(lock_id)))
+        finally:
+            conn.close()
+        waited = True
+        time.sleep(LOCK_POLL_SECONDS)
+
+    current_app.logger.warning(f"Gave up waiting for another worker to import {google_file_id}")
+    return fetch(progress)
+
+
+def coalesced_download(
+    google_file_id: str,
+    version: Optional[str],
+    mime_type: str,
+    fetch: Callable[[Progress], bytes],
+    progress: Optional[Progress] = None,
+) -> bytes:
+    """Download a Drive file, sharing the transfer with concurrent imports of it.
+
+    ``fetch(progress)`` performs the actual download.
+    """
+    if not current_app.config["IMPORT_COALESCING"]:
+        return fetch(progress)
+
+    across_workers = (
+        version is not None
+        and current_app.config["IMPORT_COALESCE_ACROSS_WORKERS"]
+        and db.engine.dialect.name == "postgresql"
+    )
+    if across_workers:
+        def download(report: Progress) -> bytes:
+            return _download_across_workers(google_file_id, version, mime_type, fetch, report)
+    else:
+        download = fetch
+
+    return get_inflight_downloads().download((google_file_id, version), download, progress)
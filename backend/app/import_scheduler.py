@@ -0,0 +1,183 @@
+"""Fair scheduling of Drive imports across users.
+
+Each worker process runs at most ``IMPORT_SLOTS`` downloads at once. An
+import waits for a slot in one of two lanes, picked from the size Drive
+reports:
+
+- ``small`` (at most ``IMPORT_SMALL_FILE_BYTES``, or no size, i.e. a
+  Workspace export) is always served first, and ``IMPORT_SMALL_RESERVED_SLOTS``
+  slots are kept free of large downloads so a one-off import never waits
+  behind someone's batch;
+- ``large`` gets the remaining slots.
+
+Within a lane users are served by start-time fair queuing weighted by
+bytes: each user's queued imports get virtual start tags that advance by the
+file size, and the smallest tag goes next. A user with a 500-file folder
+queued and a user importing one file alternate, and nobody holds more than
+``IMPORT_MAX_PER_USER`` slots. Waiting longer than
+``IMPORT_QUEUE_TIMEOUT_SECONDS`` raises ``ImportQueueTimeoutError``.
+
+Scheduling is per worker process; with gevent workers each one serves many
+users at once, so that's where queues form.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from flask import current_app
+from app.metrics import IMPORT_QUEUE_DEPTH, IMPORT_QUEUE_WAIT
+
+LANES = ("small", "large")
+
+
+class ImportQueueTimeoutError(Exception):
+    """Raised when an import waited too long for a download slot."""
+
+    def __init__(self, waited_seconds: float):
+        self.waited_seconds = waited_seconds
+        self.message = f"Too many imports in progress; no download slot after {waited_seconds:.0f}s"
+
+
+class _Ticket:
+    __slots__ = ("user_id", "lane", "start", "enqueued_at", "granted", "event")
+
+    def __init__(self, user_id: str, lane: str, start: float):
+        self.user_id = user_id
+        self.lane = lane
+        self.start = start
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.event = threading.Event()
+
+
+class ImportScheduler:
+    """Download slots handed out fairly across users (see module docstring)."""
+
+    def __init__(self, slots: int, per_user: int, small_bytes: int, small_reserved: int):
+        self.slots = slots
+        self.per_user = per_user
+        self.small_bytes = small_bytes
+        self.large_slots = max(slots - small_reserved, 1)
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Dict[str, deque]] = {}
+        self._running: Dict[str, int] = {}
+        self._running_large = 0
+        self._finish: Dict[str, float] = {}  # each user's last virtual finish tag
+        self._vtime = 0.0
+
+    def lane_for(self, size_bytes: Optional[int]) -> str:
+        return "small" if size_bytes is None or size_bytes <= self.small_bytes else "large"
+
+    def acquire(
+        self,
+        user_id: str,
+        size_bytes: Optional[int],
+        timeout: float,
+        on_queued: Optional[Callable[[], None]] = None,
+    ) -> _Ticket:
+        """Block until a slot is free for this import; ``release`` it when done."""
+        lane = self.lane_for(size_bytes)
+        # Tiny files still cost something, so a flood of them is paced too
+        cost = max(size_bytes or 0, self.small_bytes)
+        with self._lock:
+            start = max(self._vtime, self._finish.get(user_id, 0.0))
+            self._finish[user_id] = start + cost
+            ticket = _Ticket(user_id, lane, start)
+            self._queues.setdefault(user_id, {name: deque() for name in LANES})[lane].append(ticket)
+            IMPORT_QUEUE_DEPTH.labels(lane=lane).inc()
+            self._dispatch()
+
+        if not ticket.granted and on_queued is not None:
+            on_queued()
+        if not ticket.event.wait(timeout):
+            with self._lock:
+                if not ticket.granted:
+                    self._queues[user_id][lane].remove(ticket)
+                    IMPORT_QUEUE_DEPTH.labels(lane=lane).dec()
+                    self._forget_if_idle(user_id)
+                    raise ImportQueueTimeoutError(time.monotonic() - ticket.enqueued_at)
+
+        IMPORT_QUEUE_WAIT.labels(lane=lane).observe(time.monotonic() - ticket.enqueued_at)
+        return ticket
+
+    def release(self, ticket: _Ticket) -> None:
+        with self._lock:
+            self._running[ticket.user_id] -= 1
+            if ticket.lane == "large":
+                self._running_large -= 1
+            self._forget_if_idle(ticket.user_id)
+            self._dispatch()
+
+    def _pick(self, lane: str) -> Optional[_Ticket]:
+        best = None
+        for user_id, queues in self._queues.items():
+            queue = queues[lane]
+            if queue and self._running.get(user_id, 0) < self.per_user:
+                if best is None or queue[0].start < best.start:
+                    best = queue[0]
+        return best
+
+    def _dispatch(self) -> None:
+        while sum(self._running.values()) < self.slots:
+            ticket = self._pick("small")
+            if ticket is None and self._running_large < self.large_slots:
+                ticket = self._pick("large")
+            if ticket is None:
+                return
+
+            self._queues[ticket.user_id][ticket.lane].popleft()
+            IMPORT_QUEUE_DEPTH.labels(lane=ticket.lane).dec()
+            self._running[ticket.user_id] = self._running.get(ticket.user_id, 0) + 1
+            if ticket.lane == "large":
+                self._running_large += 1
+            self._vtime = max(self._vtime, ticket.start)
+            ticket.granted = True
+            ticket.event.set()
+
+    def _forget_if_idle(self, user_id: str) -> None:
+        # An idle user's next import starts at the current virtual time anyway
+        queues = self._queues.get(user_id)
+        if self._running.get(user_id) or (queues and any(queues.values())):
+            return
+        self._queues.pop(user_id, None)
+        self._running.pop(user_id, None)
+        if not self._queues:
+            # Nothing queued or running anywhere: no history worth keeping
+            self._finish.clear()
+        elif self._finish.get(user_id, 0.0) <= self._vtime:
+            self._finish.pop(user_id, None)
+
+
+def get_import_scheduler() -> Optional[ImportScheduler]:
+    """The worker's import scheduler (None when IMPORT_SLOTS is 0)."""
+    if not current_app.config["IMPORT_SLOTS"]:
+        return None
+    scheduler = current_app.extensions.get("import_scheduler")
+    if scheduler is None:
+        scheduler = current_app.extensions.setdefault("import_scheduler", ImportScheduler(
+            slots=current_app.config["IMPORT_SLOTS"],
+            per_user=current_app.config["IMPORT_MAX_PER_USER"],
+            small_bytes=current_app.config["IMPORT_SMALL_FILE_BYTES"],
+            small_reserved=current_app.config["IMPORT_SMALL_RESERVED_SLOTS"],
+        ))
+    return scheduler
+
+
+@contextmanager
+def import_slot(
+    user_id: str, size_bytes: Optional[int], on_queued: Optional[Callable[[], None]] = None
+):
+    """Hold a download slot for the duration of the block."""
+    scheduler = get_import_scheduler()
+    if scheduler is None:
+        yield
+        return
+
+    ticket = scheduler.acquire(
+        user_id, size_bytes, current_app.config["IMPORT_QUEUE_TIMEOUT_SECONDS"], on_queued
+    )
+    try:
+        yield
+    finally:
+        scheduler.release(ticket)
@@ -0,0 +1,61 @@
+"""Stateless signed download links.
+
+``create_download_token`` packs everything needed to serve a file (storage
+path relative to ``STORAGE_PATH``, name, MIME type, content hash) into a
+short-lived HS256 token. ``GET /api/files/links/<token>`` only checks the
+signature and expiry, then serves straight from disk, so downloads through a
+link never touch the database and can be cached by a CDN or opened directly
+by a browser's PDF viewer.
+
+Links can't be revoked: a link to a deleted file keeps working until it
+expires unless the stored bytes are gone too. Keep lifetimes short.
+"""
+import hashlib
+import hmac
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import jwt
+from flask import current_app
+from app.models import File
+
+
+def _signing_key() -> str:
+    # Derived from JWT_SECRET by default, so a link can never pass as a session token
+    secret = current_app.config.get("DOWNLOAD_LINK_SECRET")
+    if secret:
+        return secret
+    return hmac.new(
+        current_app.config["JWT_SECRET"].encode("utf-8"), b"download-links", hashlib.sha256
+    ).hexdigest()
+
+
+def create_download_token(file: File, expires_in: int, inline: bool = False) -> tuple:
+    """Sign a download link for ``file``. Returns (token, expires_at)."""
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+    payload = {
+        "fid": file.id,
+        "path": os.path.relpath(file.storage_path, current_app.config["STORAGE_PATH"]),
+        # Legacy rows have no checksum; their links get a stat-based ETag instead
+        "sha": file.sha256,
+        "name": file.name,
+        "mime": file.mime_type or "application/octet-stream",
+        "inline": inline,
+        "exp": expires_at,
+    }
+    return jwt.encode(payload, _signing_key(), algorithm="HS256"), expires_at
+
+
+def decode_download_token(token: str) -> Optional[dict]:
+    """Verify a download link; returns its payload with an absolute ``path``."""
+    try:
+        payload = jwt.decode(token, _signing_key(), algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+
+    base = os.path.abspath(current_app.config["STORAGE_PATH"])
+    path = os.path.abspath(os.path.join(base, payload["path"]))
+    if not path.startswith(base + os.sep):
+        return None
+    payload["path"] = path
+    return payload
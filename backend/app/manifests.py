@@ -0,0 +1,517 @@
+"""Manifest-driven bulk import, export and verification (``flask dataroom``).
+
+A manifest is a JSON array (or ``{"files": [...]}``) or a CSV file with a
+header; each entry has either a ``google_file_id`` or a local ``path``
+(relative paths resolve against the manifest's directory), plus an optional
+``dataroom`` name (default: ``--dataroom``), ``name``, ``mime_type`` and
+``sha256`` to check the bytes against. ``export`` writes a manifest in this
+format next to the copied files, so an export can be imported elsewhere.
+
+``import_manifest`` works through the manifest in chunks of
+``batch_size`` entries. A thread pool fetches, hashes and stores each file
+(Drive downloads or local copies) while the main thread inserts the
+previous chunk's rows in one statement - ``COPY`` on Postgres, executemany
+elsewhere - updates the usage counters once per dataroom and commits.
+Committed rows are queued for text extraction and thumbnails on the
+background task pool, like single imports, unless ``process`` is off.
+After every commit the manifest position is checkpointed, so an
+interrupted run resumes at the next chunk; entries already imported into
+their dataroom (same Drive file, or same local path) are skipped either
+way. Quotas aren't enforced: this is an operator tool.
+"""
+import csv
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from flask import Flask, current_app
+from app import db
+from app.google_client import download_drive_file, ensure_valid_access_token, get_drive_file_metadata
+from app.import_coalescing import coalesced_download
+from app.models import Dataroom, File, OAuthAccount, User
+from app.scrubber import verify_stored_file
+from app.storage import ensure_directory_exists, get_extension_for_mime_type, get_storage_path, save_file
+from app.tasks import schedule_file_processing
+from app.usage import record_file_added
+
+CHUNK_SIZE = 1024 * 1024
+
+# Failures kept in the checkpoint (the count is always exact)
+MAX_RECORDED_FAILURES = 1000
+
+# Columns written for each imported row (in COPY order)
+ROW_COLUMNS = (
+    "id",
+    "dataroom_id",
+    "user_id",
+    "google_file_id",
+    "name",
+    "mime_type",
+    "size_bytes",
+    "storage_path",
+    "sha256",
+    "original_url",
+    "status",
+    "imported_at",
+)
+
+
+class ManifestError(Exception):
+    """The manifest (or checkpoint) can't be used."""
+
+
+# ----------------------------------------------------------------------
+# Manifests
+
+
+def read_manifest(path: str) -> List[dict]:
+    """Entries of a JSON or CSV manifest, with local paths made absolute."""
+    with open(path, newline="") as f:
+        if path.lower().endswith(".csv"):
+            entries = [{k: v for k, v in row.items() if v} for row in csv.DictReader(f)]
+        else:
+            data = json.load(f)
+            entries = data.get("files", []) if isinstance(data, dict) else data
+
+    base = os.path.dirname(os.path.abspath(path))
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not (entry.get("google_file_id") or entry.get("path")):
+            raise ManifestError(f"Entry {index} needs a google_file_id or a path")
+        if entry.get("path"):
+            entry["path"] = os.path.normpath(os.path.join(base, entry["path"]))
+    return entries
+
+
+def _entry_key(entry: dict) -> Tuple[str, str]:
+    # What identifies an entry's file within its dataroom (see _original_url)
+    if entry.get("path"):
+        return ("original_url", _original_url(entry["path"]))
+    return ("google_file_id", entry["google_file_id"])
+
+
+def _original_url(path: str) -> str:
+    return f"file://{path}"
+
+
+def _imported_keys(dataroom_id: str, entries: List[dict]) -> set:
+    """Keys of ``entries`` already imported into the dataroom."""
+    found = set()
+    by_column = defaultdict(list)
+    for entry in entries:
+        column, value = _entry_key(entry)
+        by_column[column].append(value)
+    for column, values in by_column.items():
+        attr = getattr(File, column)
+        found.update(
+            (column, value)
+            for value in db.session.scalars(
+                db.select(attr).where(
+                    File.dataroom_id == dataroom_id, File.status == "imported", attr.in_(values)
+                )
+            )
+        )
+    return found
+
+
+# ----------------------------------------------------------------------
+# Fetch, hash and store (worker threads)
+
+
+def _store_local(entry: dict, user_id: str, dataroom_id: str) -> dict:
+    name = entry.get("name") or os.path.basename(entry["path"])
+    mime_type = entry.get("mime_type") or mimetypes.guess_type(name)[0] or "application/octet-stream"
+    extension = get_extension_for_mime_type(mime_type) or os.path.splitext(name)[1].lower()
+    storage_path = get_storage_path(user_id, dataroom_id, f"{uuid.uuid4()}{extension}")
+    ensure_directory_exists(storage_path)
+
+    digest = hashlib.sha256()
+    size_bytes = 0
+    try:
+        with open(entry["path"], "rb") as src, open(storage_path, "wb") as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                dst.write(chunk)
+                size_bytes += len(chunk)
+    except BaseException:
+        # Don't leave a partial copy behind (a missing source never created one)
+        if os.path.exists(storage_path):
+            os.remove(storage_path)
+        raise
+    return {
+        "name": name,
+        "mime_type": mime_type,
+        "size_bytes": size_bytes,
+        "storage_path": storage_path,
+        "sha256": digest.hexdigest(),
+        "original_url": _original_url(entry["path"]),
+        "google_file_id": None,
+    }
+
+
+def _store_drive(entry: dict, user_id: str, dataroom_id: str, access_token: str) -> dict:
+    google_file_id = entry["google_file_id"]
+    metadata = get_drive_file_metadata(access_token, google_file_id)
+    mime_type = metadata.get("mimeType", "application/octet-stream")
+    version = metadata.get("version") or metadata.get("modifiedTime")
+    content = coalesced_download(
+        google_file_id,
+        version,
+        mime_type,
+        lambda progress: download_drive_file(access_token, google_file_id, mime_type, version),
+    )
+
+    storage_path = get_storage_path(
+        user_id, dataroom_id, f"{uuid.uuid4()}{get_extension_for_mime_type(mime_type)}"
+    )
+    return {
+        "name": entry.get("name") or metadata["name"],
+        "mime_type": mime_type,
+        "size_bytes": save_file(storage_path, content),
+        "storage_path": storage_path,
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "original_url": metadata.get("webViewLink"),
+        "google_file_id": google_file_id,
+    }
+
+
+def _fetch(app: Flask, entry: dict, user_id: str, dataroom_id: str, access_token: Optional[str]):
+    """Store one entry's file; returns (row, None) or (None, error)."""
+    with app.app_context():
+        try:
+            if entry.get("path"):
+                stored = _store_local(entry, user_id, dataroom_id)
+            elif access_token is None:
+                return None, "Google account not connected"
+            else:
+                stored = _store_drive(entry, user_id, dataroom_id, access_token)
+        except Exception as e:
+            return None, str(e)
+
+        if entry.get("sha256") and entry["sha256"] != stored["sha256"]:
+            os.remove(stored["storage_path"])
+            return None, "sha256 mismatch"
+
+    return {
+        "id": str(uuid.uuid4()),
+        "dataroom_id": dataroom_id,
+        "user_id": user_id,
+        "status": "imported",
+        "imported_at": datetime.now(timezone.utc),
+        **stored,
+    }, None
+
+
+# ----------------------------------------------------------------------
+# Import
+
+
+def _insert_rows(rows: List[dict]) -> None:
+    if db.engine.dialect.name == "postgresql":
+        connection = db.session.connection().connection.driver_connection
+        with connection.cursor() as cursor:
+            with cursor.copy(f"COPY files ({', '.join(ROW_COLUMNS)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row([row[column] for column in ROW_COLUMNS])
+    else:
+        db.session.execute(db.insert(File), rows)
+
+
+def _commit_chunk(rows: List[dict], process: bool = True) -> None:
+    """Insert a chunk's rows and count them, in one transaction."""
+    if not rows:
+        return
+    try:
+        _insert_rows(rows)
+        totals = defaultdict(lambda: [0, 0])
+        for row in rows:
+            totals[(row["user_id"], row["dataroom_id"])][0] += 1
+            totals[(row["user_id"], row["dataroom_id"])][1] += row["size_bytes"]
+        for (user_id, dataroom_id), (count, size_bytes) in totals.items():
+            record_file_added(user_id, dataroom_id, size_bytes, count=count)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for row in rows:
+            if os.path.exists(row["storage_path"]):
+                os.remove(row["storage_path"])
+        raise
+
+    if process:
+        for row in rows:
+            schedule_file_processing(row["id"], row["storage_path"])
+
+
+def _discard(chunks) -> None:
+    """Remove the files stored for chunks that will never be committed."""
+    for _, futures, _ in chunks:
+        for _, _, future in futures:
+            if not future.cancel():
+                row, _ = future.result()
+                if row is not None and os.path.exists(row["storage_path"]):
+                    os.remove(row["storage_path"])
+
+
+def _resolve_datarooms(user: User, entries: List[dict], default_id: Optional[str]) -> Dict:
+    """Map each entry's dataroom name to an id, creating missing rooms."""
+    rooms = {}
+    if default_id:
+        room = Dataroom.query.filter_by(id=default_id, user_id=user.id).first()
+        if room is None:
+            raise ManifestError(f"Dataroom {default_id} not found for {user.email}")
+        rooms[None] = room.id
+
+    for name in {entry.get("dataroom") for entry in entries} - set(rooms):
+        if name is None:
+            raise ManifestError("Entries without a dataroom need --dataroom")
+        room = Dataroom.query.filter_by(user_id=user.id, name=name).first()
+        if room is None:
+            room = Dataroom(user_id=user.id, name=name)
+            db.session.add(room)
+            db.session.flush()
+        rooms[name] = room.id
+    db.session.commit()
+    return rooms
+
+
+def _load_checkpoint(path: str, manifest_digest: str, restart: bool) -> dict:
+    state = {}
+    if not restart and os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+        if state.get("manifest_sha256") != manifest_digest:
+            raise ManifestError(f"{path} belongs to a different manifest; use --restart")
+    state.update(manifest_sha256=manifest_digest)
+    for key in ("position", "imported", "skipped", "failed_count"):
+        state.setdefault(key, 0)
+    state.setdefault("failed", [])
+    return state
+
+
+def _save_checkpoint(path: str, state: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def import_manifest(
+    manifest_path: str,
+    user_email: str,
+    dataroom_id: Optional[str] = None,
+    workers: int = 8,
+    batch_size: int = 1000,
+    checkpoint_path: Optional[str] = None,
+    restart: bool = False,
+    process: bool = True,
+    on_progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """Import every manifest entry; returns the checkpoint state (counts, failures).
+
+    With ``process`` each committed chunk is queued for text extraction and
+    thumbnails; callers that exit afterwards should ``wait_for_tasks()``.
+    """
+    app = current_app._get_current_object()
+    entries = read_manifest(manifest_path)
+    user = User.query.filter_by(email=user_email).first()
+    if user is None:
+        raise ManifestError(f"No user with email {user_email}")
+    user_id = user.id
+    rooms = _resolve_datarooms(user, entries, dataroom_id)
+    oauth_account = OAuthAccount.query.filter_by(user_id=user_id, provider="google").first()
+    needs_drive = any(not entry.get("path") for entry in entries)
+
+    checkpoint_path = checkpoint_path or f"{manifest_path}.progress.json"
+    state = _load_checkpoint(checkpoint_path, _file_sha256(manifest_path), restart)
+
+    def fail(index: int, entry: dict, error: str) -> None:
+        state["failed_count"] += 1
+        if len(state["failed"]) < MAX_RECORDED_FAILURES:
+            state["failed"].append({
+                "index": index,
+                "source": entry.get("path") or entry.get("google_file_id"),
+                "error": error,
+            })
+
+    def submit_chunk(pool, start: int):
+        """Dedupe one chunk and start fetching it."""
+        chunk = list(enumerate(entries[start:start + batch_size], start))
+        access_token = None
+        if needs_drive and oauth_account is not None:
+            # Refreshes (and commits) only when close to expiry
+            access_token = ensure_valid_access_token(oauth_account)
+
+        by_room = defaultdict(list)
+        for _, entry in chunk:
+            by_room[rooms[entry.get("dataroom")]].append(entry)
+        done = {room: _imported_keys(room, room_entries) for room, room_entries in by_room.items()}
+        db.session.commit()  # don't sit in a transaction while fetching
+
+        futures, skipped = [], 0
+        for index, entry in chunk:
+            room = rooms[entry.get("dataroom")]
+            key = _entry_key(entry)
+            if key in done[room]:
+                skipped += 1
+                continue
+            done[room].add(key)  # duplicates within the manifest
+            futures.append((index, entry, pool.submit(_fetch, app, entry, user_id, room, access_token)))
+        return start + len(chunk), futures, skipped
+
+    started = time.monotonic()
+    position = state["position"]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dataroom-import") as pool:
+        # One chunk is fetched while the previous one is written
+        in_flight = deque()
+        try:
+            while position < len(entries) or in_flight:
+                while position < len(entries) and len(in_flight) < 2:
+                    submitted = submit_chunk(pool, position)
+                    in_flight.append(submitted)
+                    position = submitted[0]
+
+                end, futures, skipped = in_flight[0]
+                rows = []
+                for index, entry, future in futures:
+                    row, error = future.result()
+                    if error:
+                        fail(index, entry, error)
+                    else:
+                        rows.append(row)
+                in_flight.popleft()
+                _commit_chunk(rows, process)
+
+                state["position"] = end
+                state["imported"] += len(rows)
+                state["skipped"] += skipped
+                state["elapsed_seconds"] = round(
+                    state.get("elapsed_seconds", 0) + time.monotonic() - started, 1
+                )
+                started = time.monotonic()
+                _save_checkpoint(checkpoint_path, state)
+                if on_progress is not None:
+                    on_progress({**state, "total": len(entries)})
+        except BaseException:
+            # The resumed run fetches these chunks again
+            _discard(in_flight)
+            raise
+    return state
+
+
+# ----------------------------------------------------------------------
+# Export and verify
+
+
+def _room_files(dataroom_id: str):
+    return db.session.execute(
+        db.select(File.id, File.name, File.mime_type, File.size_bytes, File.storage_path, File.sha256)
+        .where(File.dataroom_id == dataroom_id, File.status == "imported")
+        .order_by(File.imported_at)
+    ).all()
+
+
+def _export_name(name: str, file_id: str, used: set) -> str:
+    safe = re.sub(r"[^\w.\- ]", "_", name).strip() or file_id
+    if safe in used:
+        stem, extension = os.path.splitext(safe)
+        safe = f"{stem}-{file_id[:8]}{extension}"
+    used.add(safe)
+    return safe
+
+
+def export_dataroom(dataroom_id: str, out_dir: str, workers: int = 8) -> dict:
+    """Copy a dataroom's files to ``out_dir/files`` and write ``out_dir/manifest.json``."""
+    room = db.session.get(Dataroom, dataroom_id)
+    if room is None:
+        raise ManifestError(f"Dataroom {dataroom_id} not found")
+    room_name = room.name
+    rows = _room_files(dataroom_id)
+    db.session.commit()
+
+    os.makedirs(os.path.join(out_dir, "files"), exist_ok=True)
+    used = set()
+    targets = [os.path.join("files", _export_name(row.name, row.id, used)) for row in rows]
+
+    def copy(row, target: str):
+        try:
+            shutil.copyfile(row.storage_path, os.path.join(out_dir, target))
+        except OSError as e:
+            return None, str(e)
+        sha = _file_sha256(os.path.join(out_dir, target))
+        if row.sha256 and sha != row.sha256:
+            return None, "sha256 mismatch"
+        return sha, None
+
+    files, failed = [], []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dataroom-export") as pool:
+        for row, target, (sha, error) in zip(rows, targets, pool.map(copy, rows, targets)):
+            if error:
+                failed.append({"file_id": row.id, "error": error})
+                continue
+            files.append({
+                "dataroom": room_name,
+                "path": target,
+                "name": row.name,
+                "mime_type": row.mime_type,
+                "sha256": sha,
+            })
+
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump({"files": files}, f, indent=1)
+    return {"exported": len(files), "failed": failed}
+
+
+def verify_dataroom(
+    dataroom_id: str, manifest_path: Optional[str] = None, workers: int = 8
+) -> dict:
+    """Check a dataroom's stored files (and that it holds every manifest entry).
+
+    Read-only; ``flask scrub-storage`` is what flags bad rows.
+    """
+    room = db.session.get(Dataroom, dataroom_id)
+    if room is None:
+        raise ManifestError(f"Dataroom {dataroom_id} not found")
+    rows = _room_files(dataroom_id)
+
+    missing_entries = []
+    if manifest_path:
+        entries = [
+            entry for entry in read_manifest(manifest_path)
+            if entry.get("dataroom") in (None, room.name)
+        ]
+        found = set()
+        for start in range(0, len(entries), 1000):
+            found |= _imported_keys(dataroom_id, entries[start:start + 1000])
+        missing_entries = [
+            entry.get("path") or entry["google_file_id"]
+            for entry in entries if _entry_key(entry) not in found
+        ]
+    db.session.commit()
+
+    results = {"ok": 0, "missing": [], "corrupt": []}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dataroom-verify") as pool:
+        checks = pool.map(
+            lambda row: verify_stored_file(row.storage_path, row.size_bytes, row.sha256), rows
+        )
+        for row, (status, _) in zip(rows, checks):
+            if status == "ok":
+                results["ok"] += 1
+            else:
+                results[status].append(row.id)
+    results["missing_entries"] = missing_entries
+    return results
@@ -0,0 +1,220 @@
+"""Prometheus metrics for the API, its Google calls and the database.
+
+Under gunicorn the metrics are aggregated across workers through
+prometheus_client's multiprocess mode: set ``PROMETHEUS_MULTIPROC_DIR``
+(``gunicorn.conf.py`` does this automatically) before the app is imported.
+"""
+import os
+import time
+from flask import Response, current_app, g, has_request_context, request, jsonify
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.profiling import record_span
+
+HTTP_REQUEST_LATENCY = Histogram(
+    "dataroom_http_request_duration_seconds",
+    "HTTP request latency by blueprint route",
+    ["blueprint", "route", "method", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+GOOGLE_API_LATENCY = Histogram(
+    "dataroom_google_api_duration_seconds",
+    "Outbound Google API latency by google_client function",
+    ["function", "status"],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "dataroom_db_queries_per_request",
+    "Number of SQL statements executed per request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "dataroom_db_seconds_per_request",
+    "Time spent executing SQL statements per request",
+    ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+IMPORTED_BYTES = Counter(
+    "dataroom_imported_bytes_total", "Bytes imported from Google Drive into storage"
+)
+SERVED_BYTES = Counter(
+    "dataroom_downloaded_bytes_total", "Bytes of stored files downloaded by clients"
+)
+HOT_FILE_CACHE_REQUESTS = Counter(
+    "dataroom_hot_file_cache_requests_total",
+    "Stored file reads through the in-memory hot-file cache",
+    ["result"],  # hit, miss, bypass (too large to cache)
+)
+HOT_FILE_CACHE_BYTES = Gauge(
+    "dataroom_hot_file_cache_bytes",
+    "Bytes held by the in-memory hot-file cache",
+    multiprocess_mode="livesum",
+)
+DRIVE_PREFETCHES = Counter(
+    "dataroom_drive_prefetches_total",
+    "Speculative Drive listing page fetches by outcome",
+    ["outcome"],  # used, waited, wasted, failed
+)
+DB_READ_ROUTING = Counter(
+    "dataroom_db_read_routing_total",
+    "Where @read_replica requests ran their queries",
+    ["target"],  # replica, primary_sticky, primary_lagging, primary_miss, primary_error
+)
+FILES_PURGED = Counter(
+    "dataroom_files_purged_total",
+    "Deleted/failed file rows removed by the retention purge",
+    ["mode"],  # archive, delete
+)
+LOGIN_IDENTITIES = Counter(
+    "dataroom_login_identities_total",
+    "Logins by where the user's identity came from",
+    ["source"],  # id_token, userinfo
+)
+IMPORTS_IN_PROGRESS = Gauge(
+    "dataroom_imports_in_progress",
+    "Imports currently being processed",
+    multiprocess_mode="livesum",
+)
+IMPORT_QUEUE_DEPTH = Gauge(
+    "dataroom_import_queue_depth",
+    "Imports waiting for a download slot",
+    ["lane"],  # small, large
+    multiprocess_mode="livesum",
+)
+IMPORT_QUEUE_WAIT = Histogram(
+    "dataroom_import_queue_wait_seconds",
+    "Time imports waited for a download slot",
+    ["lane"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+IMPORTS_COALESCED = Counter(
+    "dataroom_imports_coalesced_total",
+    "Imports that reused a concurrent import's download",
+    ["source"],  # process, worker
+)
+SSE_CONNECTIONS = Gauge(
+    "dataroom_sse_connections",
+    "Open import event streams",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "dataroom_db_pool_checked_out",
+    "Database connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CAPACITY = Gauge(
+    "dataroom_db_pool_capacity",
+    "Database pool size plus max overflow",
+    multiprocess_mode="livesum",
+)
+
+
+def observe_google_call(function: str, status: str, duration: float) -> None:
+    """Record the latency and outcome of an outbound Google API call."""
+    GOOGLE_API_LATENCY.labels(function=function, status=status).observe(duration)
+
+
+def _route_label() -> str:
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, so a statement that fails leaves nothing behind
+    if context is not None:
+        context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start_time", None)
+    if start is None:
+        return
+    duration = time.perf_counter() - start
+    if has_request_context():
+        g.db_query_count = g.get("db_query_count", 0) + 1
+        g.db_query_time = g.get("db_query_time", 0.0) + duration
+    # The same timing feeds the profiling timeline
+    record_span("sql", statement[:200], start, duration)
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+def _instrument_engine(app) -> None:
+    from app import db
+
+    with app.app_context():
+        pool = db.engine.pool
+    # What we configured (10 is QueuePool's default); the pool doesn't expose it
+    max_overflow = app.config["SQLALCHEMY_ENGINE_OPTIONS"].get("max_overflow", 10)
+
+    def on_first_connect(dbapi_connection, connection_record):
+        # Recorded lazily so it lands in the worker process (preload_app safe)
+        if hasattr(pool, "size"):
+            DB_POOL_CAPACITY.set(pool.size() + max(max_overflow, 0))
+
+    event.listen(pool, "first_connect", on_first_connect)
+    event.listen(pool, "checkout", _on_checkout)
+    event.listen(pool, "checkin", _on_checkin)
+
+
+def _metrics_registry():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def init_metrics(app) -> None:
+    """Install request/DB instrumentation and the /metrics endpoint."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _instrument_engine(app)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start_time = time.perf_counter()
+        g.db_query_count = 0
+        g.db_query_time = 0.0
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.get("request_start_time")
+        if start is None or request.endpoint == "metrics":
+            return response
+
+        route = _route_label()
+        HTTP_REQUEST_LATENCY.labels(
+            blueprint=request.blueprint or "app",
+            route=route,
+            method=request.method,
+            status=str(response.status_code),
+        ).observe(time.perf_counter() - start)
+        DB_QUERIES_PER_REQUEST.labels(route=route).observe(g.db_query_count)
+        DB_TIME_PER_REQUEST.labels(route=route).observe(g.db_query_time)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        token = current_app.config.get("METRICS_TOKEN")
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return jsonify({"error": "UNAUTHORIZED", "message": "Invalid metrics token"}), 401
+        return Response(generate_latest(_metrics_registry()), mimetype=CONTENT_TYPE_LATEST)
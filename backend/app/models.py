@@ -1,5 +1,6 @@
 import uuid
 from datetime import datetime, timezone
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from app import db
 
 
@@ -13,6 +14,10 @@ class User(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
     email = db.Column(db.String(255), unique=True, nullable=False)
     name = db.Column(db.String(255), nullable=True)
+    # Maintained incrementally by app.usage; reconciled by `flask reconcile-usage`
+    storage_used_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    # Per-user override of USER_QUOTA_BYTES (NULL = use the default)
+    storage_quota_bytes = db.Column(db.BigInteger, nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(
         db.DateTime,
@@ -71,6 +76,11 @@ class Dataroom(db.Model):
     user_id = db.Column(db.String(36), db.ForeignKey("users.id"), nullable=False)
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=True)
+    # Counters over imported files, maintained by app.usage
+    file_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    storage_used_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    # Bumped on every change to the dataroom or its files; drives listing ETags
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(
         db.DateTime,
@@ -84,6 +94,27 @@ class Dataroom(db.Model):
         "File", back_populates="dataroom", cascade="all, delete-orphan"
     )
 
+    # Columns behind to_dict, for listings that select plain rows
+    DICT_COLUMNS = (
+        "id",
+        "user_id",
+        "name",
+        "description",
+        "created_at",
+        "updated_at",
+        "file_count",
+        "storage_used_bytes",
+    )
+
+    @classmethod
+    def row_to_dict(cls, row):
+        """to_dict for a row of DICT_COLUMNS."""
+        result = dict(zip(cls.DICT_COLUMNS, row))
+        for key in ("created_at", "updated_at"):
+            if result[key]:
+                result[key] = result[key].isoformat()
+        return result
+
     def to_dict(self, include_files=False):
         result = {
             "id": self.id,
@@ -92,7 +123,8 @@ class Dataroom(db.Model):
             "description": self.description,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-            "file_count": len([f for f in self.files if f.status == "imported"]),
+            "file_count": self.file_count,
+            "storage_used_bytes": self.storage_used_bytes,
         }
         if include_files:
             result["files"] = [
@@ -105,22 +137,63 @@ class File(db.Model):
     __tablename__ = "files"
 
     id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
-    dataroom_id = db.Column(db.String(36), db.ForeignKey("datarooms.id"), nullable=False)
+    dataroom_id = db.Column(
+        db.String(36), db.ForeignKey("datarooms.id"), nullable=False, index=True
+    )
     user_id = db.Column(db.String(36), db.ForeignKey("users.id"), nullable=False)
     google_file_id = db.Column(db.String(255), nullable=True)
     name = db.Column(db.String(500), nullable=False)
     mime_type = db.Column(db.String(255), nullable=True)
     size_bytes = db.Column(db.BigInteger, nullable=True)
-    storage_path = db.Column(db.String(1000), nullable=True)
+    # Shared between a file and its clones; see storage.release_storage
+    storage_path = db.Column(db.String(1000), nullable=True, index=True)
+    sha256 = db.Column(db.String(64), nullable=True)  # NULL only for legacy rows
     original_url = db.Column(db.Text, nullable=True)
     status = db.Column(
         db.String(50), default="imported"
-    )  # 'imported', 'deleted', 'failed'
+    )  # 'imported', 'deleted', 'failed', or 'missing'/'corrupt' (set by the scrubber)
     imported_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Start of the retention period after which `flask purge-files` removes the row
+    deleted_at = db.Column(db.DateTime, nullable=True)
 
     # Relationships
     dataroom = db.relationship("Dataroom", back_populates="files")
     user = db.relationship("User", back_populates="files")
+    content = db.relationship(
+        "FileContent", uselist=False, cascade="all, delete-orphan", passive_deletes=True
+    )
+
+    __table_args__ = (
+        # Only the rows the purge job walks, so it stays small
+        db.Index(
+            "ix_files_purgeable",
+            "id",
+            postgresql_where=db.text("status IN ('deleted', 'failed')"),
+            sqlite_where=db.text("status IN ('deleted', 'failed')"),
+        ),
+    )
+
+    # Columns behind to_dict, for listings that select plain rows
+    DICT_COLUMNS = (
+        "id",
+        "dataroom_id",
+        "google_file_id",
+        "name",
+        "mime_type",
+        "size_bytes",
+        "sha256",
+        "original_url",
+        "status",
+        "imported_at",
+    )
+
+    @classmethod
+    def row_to_dict(cls, row):
+        """to_dict for a row of DICT_COLUMNS."""
+        result = dict(zip(cls.DICT_COLUMNS, row))
+        if result["imported_at"]:
+            result["imported_at"] = result["imported_at"].isoformat()
+        return result
 
     def to_dict(self):
         return {
@@ -130,8 +203,52 @@ class File(db.Model):
             "name": self.name,
             "mime_type": self.mime_type,
             "size_bytes": self.size_bytes,
+            "sha256": self.sha256,
             "original_url": self.original_url,
             "status": self.status,
             "imported_at": self.imported_at.isoformat() if self.imported_at else None,
         }
 
+
+class FileArchive(db.Model):
+    """Purged file rows, kept out of the hot ``files`` table (FILE_PURGE_MODE=archive)."""
+
+    __tablename__ = "files_archive"
+
+    id = db.Column(db.String(36), primary_key=True)
+    dataroom_id = db.Column(db.String(36), nullable=False)
+    user_id = db.Column(db.String(36), nullable=False, index=True)
+    google_file_id = db.Column(db.String(255), nullable=True)
+    name = db.Column(db.String(500), nullable=False)
+    mime_type = db.Column(db.String(255), nullable=True)
+    size_bytes = db.Column(db.BigInteger, nullable=True)
+    storage_path = db.Column(db.String(1000), nullable=True)
+    sha256 = db.Column(db.String(64), nullable=True)
+    original_url = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(50), nullable=True)
+    imported_at = db.Column(db.DateTime, nullable=True)
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+
+class FileContent(db.Model):
+    """Text extracted from a stored file, indexed for full-text search."""
+
+    __tablename__ = "file_contents"
+
+    file_id = db.Column(
+        db.String(36), db.ForeignKey("files.id", ondelete="CASCADE"), primary_key=True
+    )
+    text = db.Column(db.Text, nullable=True)
+    # tsvector on Postgres (GIN indexed); plain text elsewhere (search falls back to LIKE)
+    search_vector = db.Column(db.Text().with_variant(TSVECTOR(), "postgresql"), nullable=True)
+    status = db.Column(db.String(50), nullable=False)  # 'extracted', 'unsupported', 'failed'
+    extracted_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        db.Index(
+            "ix_file_contents_search_vector",
+            "search_vector",
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
@@ -0,0 +1,175 @@
+"""First-page PNG thumbnails for imported PDFs and images.
+
+Thumbnails are rendered lazily by ``GET /api/files/<id>/thumbnail`` (or
+eagerly after import when ``THUMBNAILS_EAGER`` is set) and kept in a
+size-bounded ``DiskLRUCache`` keyed by the stored file and the width.
+Requested widths are snapped to ``THUMBNAIL_WIDTHS`` so the number of
+variants per file stays bounded.
+
+Rendering needs Pillow (images) and pypdfium2 (PDFs); both are imported
+lazily and a missing library only makes that type unpreviewable. It runs in
+a worker process (``run_in_process``), so a large page never stalls the
+other requests of a gevent worker.
+"""
+import hashlib
+import io
+import os
+from typing import Optional
+from flask import current_app
+from app.disk_cache import DiskLRUCache
+from app.tasks import run_in_process
+
+THUMBNAIL_WIDTHS = (64, 128, 256, 512, 1024)
+DEFAULT_THUMBNAIL_WIDTH = 256
+
+# Thumbnails are at most 4:1 portrait; taller pages are cropped to the top
+MAX_ASPECT_RATIO = 4
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+PDF_EXTENSIONS = {".pdf"}
+
+
+def get_thumbnail_cache() -> DiskLRUCache:
+    """Get the thumbnail cache for the current app."""
+    cache = current_app.extensions.get("thumbnail_cache")
+    if cache is None:
+        root = current_app.config.get("THUMBNAIL_CACHE_PATH") or os.path.join(
+            current_app.config["STORAGE_PATH"], ".cache", "thumbnails"
+        )
+        cache = DiskLRUCache(root, current_app.config["THUMBNAIL_CACHE_MAX_BYTES"])
+        current_app.extensions["thumbnail_cache"] = cache
+    return cache
+
+
+def snap_width(width: Optional[int]) -> int:
+    """Round a requested width up to the nearest supported thumbnail width."""
+    if not width:
+        return DEFAULT_THUMBNAIL_WIDTH
+    for allowed in THUMBNAIL_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def is_previewable(storage_path: Optional[str]) -> bool:
+    """Whether a stored file is of a type thumbnails can be rendered for."""
+    if not storage_path:
+        return False
+    extension = os.path.splitext(storage_path)[1].lower()
+    return extension in IMAGE_EXTENSIONS or extension in PDF_EXTENSIONS
+
+
+def thumbnail_key(storage_path: str, width: int) -> tuple:
+    """Build the cache key for a thumbnail of a stored file."""
+    return (storage_path, str(width))
+
+
+def thumbnail_etag(storage_path: str, width: int) -> str:
+    """Strong ETag for a thumbnail; stored files never change in place."""
+    digest = hashlib.sha256(f"{storage_path}\x00{width}".encode("utf-8")).hexdigest()
+    return digest[:32]
+
+
+def _fit(image, width: int):
+    from PIL import Image
+
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = "transparency" in image.info or image.mode in ("LA", "PA")
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    if image.height > image.width * MAX_ASPECT_RATIO:
+        image = image.crop((0, 0, image.width, image.width * MAX_ASPECT_RATIO))
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    return image
+
+
+def _render_image(path: str, width: int):
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    with Image.open(path) as image:
+        # JPEG can decode straight at a reduced scale, which is much cheaper
+        image.draft("RGB", (width, width * MAX_ASPECT_RATIO))
+        thumbnail = _fit(image, width)
+        # Small images come back as-is; detach them from the closing file
+        return image.copy() if thumbnail is image else thumbnail
+
+
+def _render_pdf(path: str, width: int):
+    try:
+        import pypdfium2
+    except ImportError:
+        return None
+
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        if len(pdf) == 0:
+            return None
+        page = pdf[0]
+        try:
+            page_width = page.get_width() or width
+            page_height = page.get_height() or page_width
+            # Don't rasterize the part of a tall page that _fit crops away
+            crop_bottom = max(page_height - page_width * MAX_ASPECT_RATIO, 0)
+            bitmap = page.render(scale=width / page_width, crop=(0, crop_bottom, 0, 0))
+            image = bitmap.to_pil()
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+    return _fit(image, width)
+
+
+def render_thumbnail(path: str, width: int) -> Optional[bytes]:
+    """Render a PNG thumbnail of a stored file, or None if unsupported."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        image = _render_image(path, width)
+    elif extension in PDF_EXTENSIONS:
+        image = _render_pdf(path, width)
+    else:
+        return None
+    if image is None:
+        return None
+
+    output = io.BytesIO()
+    image.save(output, format="PNG", optimize=True)
+    return output.getvalue()
+
+
+def get_thumbnail(storage_path: str, width: int) -> Optional[str]:
+    """Return the path of a cached thumbnail, rendering it on a miss.
+
+    Returns None if the file type cannot be previewed. Concurrent misses
+    for the same thumbnail may both render it; the cache write is atomic.
+    """
+    cache = get_thumbnail_cache()
+    key = thumbnail_key(storage_path, width)
+    path = cache.get_path(key)
+    if path is not None:
+        return path
+
+    content = run_in_process(render_thumbnail, storage_path, width)
+    if content is None:
+        return None
+    return cache.put(key, content)
+
+
+def delete_thumbnails(storage_path: str) -> None:
+    """Drop every cached thumbnail of a stored file."""
+    cache = get_thumbnail_cache()
+    for width in THUMBNAIL_WIDTHS:
+        cache.delete(thumbnail_key(storage_path, width))
+
+
+def generate_thumbnails(storage_path: str) -> None:
+    """Background task: pre-render the default thumbnail after import."""
+    if not is_previewable(storage_path):
+        return
+    try:
+        get_thumbnail(storage_path, DEFAULT_THUMBNAIL_WIDTH)
+    except Exception as e:
+        current_app.logger.warning(f"Thumbnail generation failed for {storage_path}: {str(e)}")
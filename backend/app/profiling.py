@@ -0,0 +1,199 @@
+"""Opt-in per-request profiling and slow-request tracing.
+
+Every request records a lightweight timeline of SQL statements (timed by
+the cursor hooks in ``app.metrics``) and outbound Google API calls.
+Requests slower than ``SLOW_REQUEST_THRESHOLD_MS`` log that timeline as a
+structured ``slow_request`` record.
+
+A full cProfile capture is taken when a request sends ``X-Profile: 1`` with
+``X-Profile-Token`` matching ``PROFILING_ADMIN_TOKEN``, or when it is picked
+by ``PROFILING_SAMPLE_RATE``. The profile is written to ``PROFILING_PATH``
+and its id returned in the ``X-Profile-Id`` response header; download it
+from ``/debug/profiles/<id>`` (``.prof`` for snakeviz/pstats, or
+``?format=json`` for the timeline and top functions).
+"""
+import hmac
+import io
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Optional
+from flask import current_app, g, has_request_context, jsonify, request, send_file
+
+MAX_SPANS = 500
+
+# cProfile can only be active once per interpreter on newer Pythons
+_profiler_lock = threading.Lock()
+
+
+def record_span(kind: str, name: str, start: float, duration: float, **attrs) -> None:
+    """Append an entry to the current request's timeline."""
+    if not has_request_context():
+        return
+    spans = g.get("trace_spans")
+    if spans is None or len(spans) >= MAX_SPANS:
+        return
+    spans.append({
+        "kind": kind,
+        "name": name,
+        "offset_ms": round((start - g.trace_start) * 1000, 2),
+        "duration_ms": round(duration * 1000, 2),
+        **attrs,
+    })
+
+
+def _profiles_dir() -> str:
+    return current_app.config.get("PROFILING_PATH") or os.path.join(
+        current_app.config["STORAGE_PATH"], ".profiles"
+    )
+
+
+def _is_admin_request() -> bool:
+    token = current_app.config.get("PROFILING_ADMIN_TOKEN")
+    supplied = request.headers.get("X-Profile-Token", "")
+    return bool(token) and hmac.compare_digest(supplied, token)
+
+
+def _should_profile() -> bool:
+    if request.headers.get("X-Profile") == "1" and _is_admin_request():
+        return True
+    rate = current_app.config.get("PROFILING_SAMPLE_RATE", 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _top_functions(profiler, limit: int = 30) -> list:
+    import pstats
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            "function": f"{filename}:{line}({func})",
+            "calls": nc,
+            "total_ms": round(tt * 1000, 2),
+            "cumulative_ms": round(ct * 1000, 2),
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def _trace_record(response, duration: float) -> dict:
+    return {
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.endpoint,
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 2),
+        "db_query_count": g.get("db_query_count"),
+        "user_id": g.get("current_user_id"),
+        "spans": g.get("trace_spans", []),
+    }
+
+
+def _save_profile(profiler, record: dict) -> str:
+    profile_id = uuid.uuid4().hex
+    directory = _profiles_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    profiler.dump_stats(os.path.join(directory, f"{profile_id}.prof"))
+    record = {**record, "profile_id": profile_id, "top_functions": _top_functions(profiler)}
+    with open(os.path.join(directory, f"{profile_id}.json"), "w") as f:
+        json.dump(record, f)
+    _prune_profiles(directory, current_app.config["PROFILING_MAX_PROFILES"])
+    return profile_id
+
+
+def _prune_profiles(directory: str, keep: int) -> None:
+    """Remove the oldest profiles beyond the newest ``keep``."""
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            try:
+                profiles.append((os.path.getmtime(os.path.join(directory, name)), name[:-5]))
+            except FileNotFoundError:
+                continue  # pruned by another worker
+    profiles.sort()
+    for _, profile_id in profiles[:max(len(profiles) - keep, 0)]:
+        for extension in ("json", "prof"):
+            try:
+                os.remove(os.path.join(directory, f"{profile_id}.{extension}"))
+            except FileNotFoundError:
+                pass
+
+
+def _profile_path(profile_id: str, extension: str) -> Optional[str]:
+    # Profile ids are uuid4 hex strings; reject anything else
+    if len(profile_id) != 32 or not all(c in "0123456789abcdef" for c in profile_id):
+        return None
+    path = os.path.join(_profiles_dir(), f"{profile_id}.{extension}")
+    return path if os.path.exists(path) else None
+
+
+def init_profiling(app) -> None:
+    """Install the request timeline, profiler hooks and profile download route."""
+    @app.before_request
+    def start_trace():
+        g.trace_start = time.perf_counter()
+        g.trace_spans = []
+        g.profiler = None
+
+        if _should_profile() and _profiler_lock.acquire(blocking=False):
+            import cProfile
+
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def finish_trace(response):
+        start = g.get("trace_start")
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+            try:
+                profile_id = _save_profile(profiler, _trace_record(response, duration))
+                response.headers["X-Profile-Id"] = profile_id
+            except OSError as e:
+                current_app.logger.error(f"Failed to save profile: {str(e)}")
+
+        threshold_ms = current_app.config.get("SLOW_REQUEST_THRESHOLD_MS")
+        if threshold_ms and duration * 1000 >= threshold_ms:
+            current_app.logger.warning(json.dumps({
+                "event": "slow_request",
+                **_trace_record(response, duration),
+            }))
+        return response
+
+    @app.teardown_request
+    def release_profiler(exc):
+        # after_request does not run if the response could not be built
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+
+    @app.route("/debug/profiles/<profile_id>")
+    def download_profile(profile_id):
+        if not _is_admin_request():
+            return jsonify({"error": "UNAUTHORIZED", "message": "Invalid profiling token"}), 401
+
+        as_json = request.args.get("format") == "json"
+        path = _profile_path(profile_id, "json" if as_json else "prof")
+        if not path:
+            return jsonify({"error": "NOT_FOUND", "message": "Profile not found"}), 404
+
+        if as_json:
+            return send_file(path, mimetype="application/json")
+        return send_file(
+            path,
+            mimetype="application/octet-stream",
+            as_attachment=True,
+            download_name=f"{profile_id}.prof",
+        )
@@ -0,0 +1,131 @@
+"""Retention purge of deleted and failed file rows.
+
+Deleting a file only flips ``files.status``, so without this job dead rows
+pile up in the table and its indexes forever. ``flask purge-files`` removes
+rows that have been ``deleted`` or ``failed`` for longer than
+``FILE_RETENTION_DAYS``, moving them to ``files_archive`` first unless
+``FILE_PURGE_MODE`` is ``delete``. Their stored bytes were already released
+when the file was deleted.
+
+Work is done in short transactions of ``FILE_PURGE_BATCH_SIZE`` rows,
+walked by id through the partial ``ix_files_purgeable`` index, with a pause
+between batches. Locks are held for one batch, and on Postgres rows another
+transaction has locked are skipped rather than waited on. The pause leaves
+autovacuum and replicas time to keep up; ``--vacuum`` runs ``VACUUM
+(ANALYZE) files`` at the end so the freed space is reusable immediately.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from flask import current_app
+from sqlalchemy import func
+from app import db
+from app.metrics import FILES_PURGED
+from app.models import File, FileArchive, FileContent
+
+PURGEABLE_STATUSES = ("deleted", "failed")
+
+# Columns copied from files to files_archive
+ARCHIVED_COLUMNS = (
+    "id",
+    "dataroom_id",
+    "user_id",
+    "google_file_id",
+    "name",
+    "mime_type",
+    "size_bytes",
+    "storage_path",
+    "sha256",
+    "original_url",
+    "status",
+    "imported_at",
+    "deleted_at",
+)
+
+
+def _eligible(cutoff: datetime):
+    return (
+        File.status.in_(PURGEABLE_STATUSES),
+        # imported_at covers rows whose status was set without a deleted_at
+        func.coalesce(File.deleted_at, File.imported_at) < cutoff,
+    )
+
+
+def count_purgeable(retention_days: int) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    return db.session.scalar(db.select(func.count()).select_from(File).where(*_eligible(cutoff)))
+
+
+def _next_batch(cutoff: datetime, after_id: Optional[str], batch_size: int) -> List[str]:
+    query = db.select(File.id).where(*_eligible(cutoff)).order_by(File.id).limit(batch_size)
+    if after_id:
+        query = query.where(File.id > after_id)
+    if db.engine.dialect.name == "postgresql":
+        # Never wait on a row a request is touching; a later run gets it
+        query = query.with_for_update(skip_locked=True)
+    return db.session.scalars(query).all()
+
+
+def _purge_batch(ids: List[str], archive: bool) -> None:
+    if archive:
+        columns = [getattr(File, name) for name in ARCHIVED_COLUMNS]
+        db.session.execute(
+            db.insert(FileArchive).from_select(
+                [*ARCHIVED_COLUMNS, "archived_at"],
+                db.select(*columns, db.literal(datetime.now(timezone.utc), db.DateTime))
+                .where(File.id.in_(ids)),
+            )
+        )
+    # file_contents cascades on Postgres; SQLite doesn't enforce foreign keys by default
+    db.session.execute(
+        db.delete(FileContent).where(FileContent.file_id.in_(ids)),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.execute(
+        db.delete(File).where(File.id.in_(ids)),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.commit()
+
+
+def purge_files(
+    retention_days: int,
+    mode: str = "archive",
+    batch_size: int = 500,
+    pause_seconds: float = 0.2,
+    max_seconds: Optional[float] = None,
+) -> dict:
+    """Purge expired rows in batches. Returns counts and whether it finished."""
+    if mode not in ("archive", "delete"):
+        raise ValueError(f"Unknown purge mode: {mode}")
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    result = {"purged": 0, "batches": 0, "complete": False}
+    after_id = None
+
+    while deadline is None or time.monotonic() < deadline:
+        ids = _next_batch(cutoff, after_id, batch_size)
+        if not ids:
+            result["complete"] = True
+            break
+
+        _purge_batch(ids, archive=mode == "archive")
+        FILES_PURGED.labels(mode=mode).inc(len(ids))
+        result["purged"] += len(ids)
+        result["batches"] += 1
+        after_id = ids[-1]
+        current_app.logger.info(f"Purged {len(ids)} file rows (through {after_id})")
+        time.sleep(pause_seconds)
+
+    return result
+
+
+def vacuum_files() -> bool:
+    """VACUUM (ANALYZE) the files tables on Postgres; returns False elsewhere."""
+    if db.engine.dialect.name != "postgresql":
+        return False
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM (ANALYZE) files")
+        conn.exec_driver_sql("VACUUM (ANALYZE) file_contents")
+    return True
@@ -0,0 +1,235 @@
+"""Read-replica routing.
+
+With ``DATABASE_REPLICA_URLS`` set, the SELECTs of views decorated with
+``@read_replica`` run on a streaming replica, picked round-robin per
+request. Everything else stays on the primary: writes, flushes, and every
+view that isn't decorated (imports, the OAuth callback, Drive routes that
+commit a refreshed Google token).
+
+A request falls back to the primary when:
+
+- every replica is lagging more than ``DB_REPLICA_MAX_LAG_SECONDS`` or is
+  unreachable (lag is measured at most every ``DB_REPLICA_CHECK_SECONDS``);
+- the client wrote something in the last ``DB_REPLICA_STICKY_SECONDS``, so
+  it reads its own writes. Writers are remembered per user in the worker
+  and, across workers, with a cookie;
+- the view answered 401/404 from a replica, or the replica failed
+  mid-request. The view runs again on the primary, so a row that hasn't
+  replicated yet (a user who just signed up, a room just created) is found.
+"""
+import itertools
+import threading
+import time
+from functools import wraps
+from typing import Dict, List, Optional
+from flask import Flask, current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+from app.config import get_engine_options
+from app.metrics import DB_READ_ROUTING
+
+STICKY_COOKIE = "db_primary_until"
+
+# An idle, caught-up replica replays nothing, so the replay timestamp alone
+# would make it look ever more behind
+_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class Replica:
+    """A replica engine and its last measured lag (None = unreachable)."""
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = create_engine(url, **get_engine_options(url))
+        self.lag: Optional[float] = None
+        self.checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def refresh(self, interval: float) -> None:
+        """Re-measure the lag if the last check is older than ``interval``."""
+        if time.monotonic() - self.checked_at < interval:
+            return
+        # One check at a time; concurrent requests use the previous result
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    # NULL when the URL points at a primary
+                    self.lag = float(conn.execute(_LAG_SQL).scalar() or 0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+        except DBAPIError as e:
+            current_app.logger.warning(f"Replica {self.name} unavailable: {e}")
+            self.lag = None
+        finally:
+            self.checked_at = time.monotonic()
+            self._lock.release()
+
+    def mark_down(self) -> None:
+        self.lag = None
+        self.checked_at = time.monotonic()
+
+
+class ReplicaRouter:
+    """Chooses a replica for a request and remembers recent writers."""
+
+    def __init__(self, urls: List[str], max_lag: float, check_interval: float, sticky_seconds: int):
+        self.replicas = [Replica(f"replica{i}", url) for i, url in enumerate(urls)]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self._turn = itertools.count()
+        self._writers: Dict[str, float] = {}
+
+    def choose(self) -> Optional[Replica]:
+        """A replica within the lag budget, or None to use the primary."""
+        start = next(self._turn)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            replica.refresh(self.check_interval)
+            if replica.lag is not None and replica.lag <= self.max_lag:
+                return replica
+        return None
+
+    def remember_writer(self, user_id: str) -> None:
+        now = time.monotonic()
+        if len(self._writers) > 10000:
+            self._writers = {k: v for k, v in self._writers.items() if v > now}
+        self._writers[user_id] = now + self.sticky_seconds
+
+    def wrote_recently(self, user_id: Optional[str]) -> bool:
+        return user_id is not None and self._writers.get(user_id, 0) > time.monotonic()
+
+
+def _router() -> Optional[ReplicaRouter]:
+    return current_app.extensions.get("db_replicas")
+
+
+def _request_user_id() -> Optional[str]:
+    # The user lookup in require_auth is itself routed, so decode the token here
+    if g.get("current_user_id"):
+        return g.current_user_id
+    from app.auth import decode_jwt_token
+
+    auth_header = request.headers.get("Authorization", "")
+    payload = decode_jwt_token(auth_header[7:]) if auth_header.startswith("Bearer ") else None
+    return payload["user_id"] if payload else None
+
+
+def _client_wrote_recently(router: ReplicaRouter) -> bool:
+    try:
+        if float(request.cookies.get(STICKY_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    return router.wrote_recently(_request_user_id())
+
+
+def _request_replica() -> Optional[Replica]:
+    """The replica this request reads from; chosen once, on its first query."""
+    if "db_replica" not in g:
+        router = _router()
+        replica = None
+        if g.get("db_wrote") or _client_wrote_recently(router):
+            DB_READ_ROUTING.labels(target="primary_sticky").inc()
+        else:
+            replica = router.choose()
+            DB_READ_ROUTING.labels(target="replica" if replica else "primary_lagging").inc()
+        g.db_replica = replica
+    return g.db_replica
+
+
+class RoutingSession(Session):
+    """``db.session`` class sending reads of ``@read_replica`` views to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and "db_replicas" in current_app.extensions:
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.db_wrote = True
+            elif g.get("db_read_replica") and isinstance(clause, Select):
+                replica = _request_replica()
+                if replica is not None:
+                    return replica.engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _run_on_primary(view, args, kwargs, reason: str):
+    from app import db
+
+    # Drop the replica's connection and everything loaded from it
+    db.session.close()
+    g.db_read_replica = False
+    g.db_replica = None
+    DB_READ_ROUTING.labels(target=f"primary_{reason}").inc()
+    return view(*args, **kwargs)
+
+
+def read_replica(view):
+    """Let ``view``'s queries run on a read replica (it must not write).
+
+    Put it above ``@require_auth`` so the user lookup is routed too.
+    """
+
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        if _router() is None:
+            return view(*args, **kwargs)
+
+        g.db_read_replica = True
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except OperationalError:
+            replica = g.get("db_replica")
+            if replica is None:
+                raise
+            current_app.logger.warning(f"Replica {replica.name} failed; retrying on the primary")
+            replica.mark_down()
+            return _run_on_primary(view, args, kwargs, "error")
+
+        # Possibly a row that hasn't replicated yet
+        if g.get("db_replica") is not None and response.status_code in (401, 404):
+            return _run_on_primary(view, args, kwargs, "miss")
+        return response
+
+    return decorated_function
+
+
+def _remember_writes(response):
+    if not g.get("db_wrote"):
+        return response
+    router = _router()
+    if g.get("current_user_id"):
+        router.remember_writer(g.current_user_id)
+    # Cross-site from the SPA, so SameSite=None (which requires Secure)
+    secure = request.is_secure or request.headers.get("X-Forwarded-Proto") == "https"
+    response.set_cookie(
+        STICKY_COOKIE,
+        str(int(time.time()) + router.sticky_seconds),
+        max_age=router.sticky_seconds,
+        httponly=True,
+        secure=secure,
+        samesite="None" if secure else "Lax",
+    )
+    return response
+
+
+def init_replicas(app: Flask) -> None:
+    """Set up replica routing when DATABASE_REPLICA_URLS is configured."""
+    urls = app.config.get("DATABASE_REPLICA_URLS")
+    if not urls:
+        return
+    app.extensions["db_replicas"] = ReplicaRouter(
+        urls,
+        max_lag=app.config["DB_REPLICA_MAX_LAG_SECONDS"],
+        check_interval=app.config["DB_REPLICA_CHECK_SECONDS"],
+        sticky_seconds=app.config["DB_REPLICA_STICKY_SECONDS"],
+    )
+    app.after_request(_remember_writes)
@@ -4,11 +4,13 @@ from datetime import datetime, timedelta, timezone
 from app import db
 from app.models import User, OAuthAccount, Dataroom
 from app.auth import create_jwt_token, require_auth, get_current_user
+from app.replicas import read_replica
+from app.usage import usage_dict
 from app.google_client import (
     exchange_code_for_tokens,
-    get_user_info,
     GoogleClientError,
 )
+from app.id_tokens import get_google_identity
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -82,8 +84,8 @@ def google_auth_callback():
         refresh_token = token_data.get("refresh_token")
         expires_in = token_data.get("expires_in", 3600)
 
-        # Get user info from Google
-        user_info = get_user_info(access_token)
+        # Identify the user from the signed id_token (userinfo as a fallback)
+        user_info = get_google_identity(token_data)
         google_id = user_info["sub"]
         email = user_info["email"]
         name = user_info.get("name", "")
@@ -146,6 +148,7 @@ def google_auth_callback():
 
 
 @auth_bp.route("/me")
+@read_replica
 @require_auth
 def get_me():
     """Get the current authenticated user."""
@@ -159,6 +162,7 @@ def get_me():
     return jsonify({
         "user": user.to_dict(),
         "google_connected": oauth_account is not None,
+        "usage": usage_dict(user),
     })
 
 
@@ -1,23 +1,79 @@
-from flask import Blueprint, request, jsonify
-from app import db
+import hashlib
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy import func
+from app import db, release_db_connection
 from app.models import Dataroom, File
 from app.auth import require_auth, get_current_user
+from app.cloning import clone_dataroom
+from app.replicas import read_replica
+from app.search import search_files
+from app.serialization import stream_json
+from app.storage import referenced_paths, release_storage
+from app.usage import release_user_bytes
 
 dataroom_bp = Blueprint("dataroom", __name__)
 
+# Part of every listing ETag; bump when the listing payloads change shape
+LISTING_FORMAT = "1"
+
+
+def _with_etag(response, etag):
+    # Cached copies may be reused only after revalidating with If-None-Match
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def _not_modified(etag):
+    """A 304 response if the client already has ``etag``, else None."""
+    if request.if_none_match.contains_weak(etag):
+        return _with_etag(current_app.response_class(status=304), etag)
+    return None
+
+
+def _dataroom_etag(dataroom, kind):
+    return f"{kind}.{dataroom.id}.{dataroom.version}.{LISTING_FORMAT}"
+
 
 @dataroom_bp.route("", methods=["GET"])
+@read_replica
 @require_auth
 def list_datarooms():
     """List all datarooms for the current user."""
     user = get_current_user()
-    datarooms = Dataroom.query.filter_by(user_id=user.id).order_by(
-        Dataroom.created_at.desc()
+
+    # Any create, rename, delete or file change moves one of these
+    count, versions, updated = db.session.execute(
+        db.select(
+            func.count(), func.coalesce(func.sum(Dataroom.version), 0), func.max(Dataroom.updated_at)
+        ).where(Dataroom.user_id == user.id)
+    ).one()
+    etag = hashlib.sha1(
+        f"{user.id}.{count}.{versions}.{updated}.{LISTING_FORMAT}".encode("utf-8")
+    ).hexdigest()
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    rows = db.session.execute(
+        db.select(*(getattr(Dataroom, c) for c in Dataroom.DICT_COLUMNS))
+        .where(Dataroom.user_id == user.id)
+        .order_by(Dataroom.created_at.desc())
+    ).all()
+
+    return _with_etag(jsonify({
+        "datarooms": [Dataroom.row_to_dict(row) for row in rows]
+    }), etag)
+
+
+def _file_rows(dataroom_id):
+    """Imported files of a dataroom as plain rows of File.DICT_COLUMNS, newest first."""
+    return db.session.execute(
+        db.select(*(getattr(File, c) for c in File.DICT_COLUMNS))
+        .where(File.dataroom_id == dataroom_id, File.status == "imported")
+        .order_by(File.imported_at.desc())
     ).all()
-    
-    return jsonify({
-        "datarooms": [d.to_dict() for d in datarooms]
-    })
 
 
 @dataroom_bp.route("", methods=["POST"])
@@ -45,6 +101,7 @@ def create_dataroom():
 
 
 @dataroom_bp.route("/<dataroom_id>", methods=["GET"])
+@read_replica
 @require_auth
 def get_dataroom(dataroom_id):
     """Get a specific dataroom with its files."""
@@ -57,7 +114,16 @@ def get_dataroom(dataroom_id):
             "message": "Dataroom not found",
         }), 404
 
-    return jsonify(dataroom.to_dict(include_files=True))
+    etag = _dataroom_etag(dataroom, "detail")
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    head = dataroom.to_dict()
+    rows = _file_rows(dataroom_id)
+    release_db_connection()
+
+    return _with_etag(stream_json(map(File.row_to_dict, rows), "files", head), etag)
 
 
 @dataroom_bp.route("/<dataroom_id>", methods=["PUT"])
@@ -78,6 +144,7 @@ def update_dataroom(dataroom_id):
         dataroom.name = data["name"]
     if "description" in data:
         dataroom.description = data["description"]
+    dataroom.version = Dataroom.version + 1
 
     db.session.commit()
     return jsonify(dataroom.to_dict())
@@ -96,19 +163,56 @@ def delete_dataroom(dataroom_id):
             "message": "Dataroom not found",
         }), 404
 
-    # Delete all files from disk
-    from app.storage import delete_file as delete_file_from_disk
-    for file in dataroom.files:
-        if file.storage_path:
-            delete_file_from_disk(file.storage_path)
+    stored = {
+        f.storage_path: f.size_bytes or 0
+        for f in dataroom.files
+        if f.status == "imported" and f.storage_path
+    }
+    user_id = dataroom.user_id
 
     db.session.delete(dataroom)
+    db.session.flush()
+
+    # Stored files shared with a clone stay on disk and keep counting
+    released = set(stored) - referenced_paths(stored)
+    release_user_bytes(user_id, sum(stored[path] for path in released))
     db.session.commit()
 
+    # Delete files from disk once nothing references them
+    release_storage(released)
+
     return jsonify({"message": "Dataroom deleted successfully"})
 
 
+@dataroom_bp.route("/<dataroom_id>/clone", methods=["POST"])
+@require_auth
+def clone_dataroom_route(dataroom_id):
+    """Clone a dataroom, optionally only some of its files, sharing stored bytes."""
+    user = get_current_user()
+    dataroom = Dataroom.query.filter_by(id=dataroom_id, user_id=user.id).first()
+
+    if not dataroom:
+        return jsonify({
+            "error": "NOT_FOUND",
+            "message": "Dataroom not found",
+        }), 404
+
+    data = request.get_json(silent=True) or {}
+    file_ids = data.get("file_ids")
+    if file_ids is not None and (
+        not isinstance(file_ids, list) or not all(isinstance(i, str) for i in file_ids)
+    ):
+        return jsonify({
+            "error": "VALIDATION_ERROR",
+            "message": "file_ids must be a list of file ids",
+        }), 400
+
+    clone = clone_dataroom(dataroom, data.get("name") or f"{dataroom.name} (copy)", file_ids)
+    return jsonify(clone.to_dict()), 201
+
+
 @dataroom_bp.route("/<dataroom_id>/files", methods=["GET"])
+@read_replica
 @require_auth
 def list_dataroom_files(dataroom_id):
     """List all files in a dataroom."""
@@ -121,12 +225,48 @@ def list_dataroom_files(dataroom_id):
             "message": "Dataroom not found",
         }), 404
 
-    files = File.query.filter_by(
-        dataroom_id=dataroom_id,
-        status="imported"
-    ).order_by(File.imported_at.desc()).all()
+    # Checked before the files query runs
+    etag = _dataroom_etag(dataroom, "files")
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    rows = _file_rows(dataroom_id)
+    release_db_connection()
+
+    return _with_etag(stream_json(map(File.row_to_dict, rows), "files"), etag)
+
+
+@dataroom_bp.route("/<dataroom_id>/search", methods=["GET"])
+@read_replica
+@require_auth
+def search_dataroom(dataroom_id):
+    """Full-text search over the contents of a dataroom's files."""
+    user = get_current_user()
+    dataroom = Dataroom.query.filter_by(id=dataroom_id, user_id=user.id).first()
+
+    if not dataroom:
+        return jsonify({
+            "error": "NOT_FOUND",
+            "message": "Dataroom not found",
+        }), 404
+
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({
+            "error": "VALIDATION_ERROR",
+            "message": "q is required",
+        }), 400
+
+    page = max(request.args.get("page", 1, type=int), 1)
+    page_size = min(max(request.args.get("page_size", 20, type=int), 1), 100)
+
+    results, total = search_files(dataroom_id, query, page, page_size)
 
     return jsonify({
-        "files": [f.to_dict() for f in files]
+        "results": results,
+        "query": query,
+        "page": page,
+        "page_size": page_size,
+        "total": total,
     })
-
@@ -1,6 +1,7 @@
-import traceback
 from flask import Blueprint, request, jsonify, current_app
+from app import release_db_connection
 from app.auth import require_auth, get_current_user, get_user_oauth_account
+from app.drive_prefetch import start_prefetch, take_prefetched
 from app.google_client import (
     ensure_valid_access_token,
     list_drive_files,
@@ -19,7 +20,11 @@ ALLOWED_FOLDER_ID = "1Fcc9kd_Wca3CGXT6v2t99BS0JObh0bYl"
 @drive_bp.route("/files")
 @require_auth
 def list_files():
-    """List files from the user's Google Drive."""
+    """List files from the user's Google Drive.
+
+    With ``prefetch=1`` the next page is fetched in the background right
+    away, so the following "load more" doesn't wait on Drive.
+    """
     user = get_current_user()
     oauth_account = get_user_oauth_account(user, "google")
 
@@ -31,29 +36,38 @@ def list_files():
 
     try:
         # Ensure we have a valid access token
-        print(f"[DEBUG] Getting access token for user {user.id}")
         access_token = ensure_valid_access_token(oauth_account)
-        print(f"[DEBUG] Got access token: {access_token[:20]}...")
+        user_id = user.id
+        release_db_connection()
 
         # Get query parameters
         page_size = request.args.get("page_size", 20, type=int)
         page_token = request.args.get("page_token")
         query = request.args.get("q")
         folder_id = request.args.get("folder_id", ALLOWED_FOLDER_ID)
+        prefetch = (
+            request.args.get("prefetch") == "1" and current_app.config["DRIVE_PREFETCH_ENABLED"]
+        )
 
         # Limit page size
         page_size = min(page_size, 100)
 
-        # List files from Drive
-        print(f"[DEBUG] Calling list_drive_files with page_size={page_size}, folder_id={folder_id}")
-        result = list_drive_files(
-            access_token=access_token,
-            page_size=page_size,
-            page_token=page_token,
-            query=query,
-            folder_id=folder_id,
-        )
-        print(f"[DEBUG] Got {len(result.get('files', []))} files")
+        # List files from Drive, or take the page prefetched by the previous
+        # request (any other prefetch of this user is dropped: e.g. a new search)
+        result = take_prefetched(user_id, (page_token, page_size, query, folder_id))
+        if result is None:
+            result = list_drive_files(
+                access_token=access_token,
+                page_size=page_size,
+                page_token=page_token,
+                query=query,
+                folder_id=folder_id,
+            )
+
+        if prefetch and result.get("nextPageToken"):
+            start_prefetch(
+                user_id, access_token, (result["nextPageToken"], page_size, query, folder_id)
+            )
 
         # Normalize the response
         files = []
@@ -74,15 +88,14 @@ def list_files():
         })
 
     except GoogleClientError as e:
-        print(f"[ERROR] GoogleClientError: {e.error_code} - {e.message}")
+        current_app.logger.warning(f"Drive list error: {e.error_code} - {e.message}")
         status_code = 401 if e.error_code == "OAUTH_REVOKED" else 500
         return jsonify({
             "error": e.error_code,
             "message": e.message,
         }), status_code
     except Exception as e:
-        print(f"[ERROR] Exception in list_files: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Drive list error: {str(e)}")
         return jsonify({
             "error": "DRIVE_ERROR",
             "message": str(e),
@@ -1,6 +1,13 @@
+import hashlib
+import io
+import os
+import time
 import uuid
-from flask import Blueprint, request, jsonify, send_file, current_app
-from app import db
+import zlib
+from collections import defaultdict
+from datetime import datetime, timezone
+from flask import Blueprint, Response, request, jsonify, send_file, current_app
+from app import db, release_db_connection
 from app.models import Dataroom, File
 from app.auth import require_auth, get_current_user, get_user_oauth_account
 from app.google_client import (
@@ -9,16 +16,58 @@ from app.google_client import (
     download_drive_file,
     GoogleClientError,
 )
-from app.storage import get_storage_path, save_file, delete_file as delete_file_from_disk
-import io
+from app.events import (
+    download_progress,
+    format_sse,
+    get_event_broker,
+    publish_import_event,
+    streams_block_worker,
+)
+from app.import_coalescing import coalesced_download
+from app.import_scheduler import ImportQueueTimeoutError, import_slot
+from app.links import create_download_token, decode_download_token
+from app.metrics import IMPORTED_BYTES, IMPORTS_IN_PROGRESS, SERVED_BYTES, SSE_CONNECTIONS
+from app.previews import (
+    get_thumbnail,
+    is_previewable,
+    snap_width,
+    thumbnail_etag,
+)
+from app.replicas import read_replica
+from app.storage import (
+    get_extension_for_mime_type,
+    get_storage_path,
+    read_cached_file,
+    referenced_paths,
+    release_storage,
+    save_file,
+    delete_file as delete_file_from_disk,
+)
+from app.tasks import schedule_file_processing, submit
+from app.usage import (
+    QuotaExceededError,
+    check_quota,
+    get_user_quota,
+    record_file_added,
+    record_files_moved,
+    record_files_removed,
+    release_user_bytes,
+)
 
 file_bp = Blueprint("file", __name__)
 
+# Largest file_ids list accepted by POST /bulk
+MAX_BULK_FILES = 1000
+
 
 @file_bp.route("/import", methods=["POST"])
 @require_auth
 def import_file():
-    """Import a file from Google Drive into a dataroom."""
+    """Import a file from Google Drive into a dataroom.
+
+    Progress is published to the user's import event stream under
+    ``import_id`` (taken from the body, or generated).
+    """
     user = get_current_user()
     data = request.get_json()
 
@@ -30,6 +79,7 @@ def import_file():
 
     dataroom_id = data.get("dataroom_id")
     google_file_id = data.get("google_file_id")
+    import_id = str(data.get("import_id") or uuid.uuid4().hex)[:64]
 
     if not dataroom_id or not google_file_id:
         return jsonify({
@@ -65,67 +115,209 @@ def import_file():
             "message": "Please connect your Google account first",
         }), 400
 
+    user_id = user.id
+    event_fields = {"dataroom_id": dataroom_id, "google_file_id": google_file_id}
+    publish_import_event(user_id, import_id, "started", **event_fields)
+
+    IMPORTS_IN_PROGRESS.inc()
     try:
         # Ensure valid access token
         access_token = ensure_valid_access_token(oauth_account)
 
+        quota_bytes = get_user_quota(user)
+        used_bytes = user.storage_used_bytes
+
+        # Don't hold a pooled DB connection while waiting on Drive
+        release_db_connection()
+
         # Get file metadata from Drive
         metadata = get_drive_file_metadata(access_token, google_file_id)
         file_name = metadata["name"]
         mime_type = metadata.get("mimeType", "application/octet-stream")
         original_url = metadata.get("webViewLink")
-
-        # Download file content
-        content = download_drive_file(access_token, google_file_id, mime_type)
+        version = metadata.get("version") or metadata.get("modifiedTime")
+
+        # Drive reports size for binary files; Workspace exports are checked after download
+        drive_size = int(metadata["size"]) if metadata.get("size") else None
+        if drive_size is not None:
+            check_quota(quota_bytes, used_bytes, drive_size)
+
+        # Wait for a download slot: fair across users, small files first
+        def on_queued():
+            publish_import_event(user_id, import_id, "queued", **event_fields)
+
+        def fetch(progress):
+            with import_slot(user_id, drive_size, on_queued):
+                return download_drive_file(
+                    access_token, google_file_id, mime_type, version, progress=progress
+                )
+
+        # Concurrent imports of this revision (any user, any room) share one download
+        content = coalesced_download(
+            google_file_id,
+            version,
+            mime_type,
+            fetch,
+            progress=download_progress(user_id, import_id, name=file_name, **event_fields),
+        )
+        publish_import_event(user_id, import_id, "saving", **event_fields)
 
         # Generate storage path with file extension
         file_uuid = str(uuid.uuid4())
-        extension = _get_extension_for_mime_type(mime_type)
+        extension = get_extension_for_mime_type(mime_type)
         filename = f"{file_uuid}{extension}"
-        storage_path = get_storage_path(user.id, dataroom_id, filename)
+        storage_path = get_storage_path(user_id, dataroom_id, filename)
 
         # Save to disk
         size_bytes = save_file(storage_path, content)
+        sha256 = hashlib.sha256(content).hexdigest()
+        IMPORTED_BYTES.inc(size_bytes)
+
+        # Count against the quota atomically with the insert
+        try:
+            record_file_added(user_id, dataroom_id, size_bytes, quota_bytes)
+        except QuotaExceededError:
+            db.session.rollback()
+            delete_file_from_disk(storage_path)
+            raise
+
+        # The counter update holds the user's row lock until commit, so a
+        # concurrent import of this file into the room has committed by now
+        duplicate = db.session.scalar(
+            db.select(File.id).where(
+                File.dataroom_id == dataroom_id,
+                File.google_file_id == google_file_id,
+                File.status == "imported",
+            )
+        )
+        if duplicate is not None:
+            db.session.rollback()
+            delete_file_from_disk(storage_path)
+            message = "This file has already been imported to this dataroom"
+            publish_import_event(
+                user_id, import_id, "failed", error="ALREADY_EXISTS", message=message, **event_fields
+            )
+            return jsonify({
+                "error": "ALREADY_EXISTS",
+                "message": message,
+            }), 409
 
         # Create file record
         file_record = File(
             dataroom_id=dataroom_id,
-            user_id=user.id,
+            user_id=user_id,
             google_file_id=google_file_id,
             name=file_name,
             mime_type=mime_type,
             size_bytes=size_bytes,
             storage_path=storage_path,
             original_url=original_url,
+            sha256=sha256,
             status="imported",
         )
         db.session.add(file_record)
         db.session.commit()
 
-        return jsonify(file_record.to_dict()), 201
+        # Extract text and render thumbnails off the request path
+        schedule_file_processing(file_record.id, storage_path)
 
+        file_data = file_record.to_dict()
+        publish_import_event(user_id, import_id, "completed", file=file_data, **event_fields)
+        return jsonify(file_data), 201, {"X-Import-Id": import_id}
+
+    except QuotaExceededError as e:
+        publish_import_event(
+            user_id, import_id, "failed", error="QUOTA_EXCEEDED", message=e.message, **event_fields
+        )
+        return jsonify({
+            "error": "QUOTA_EXCEEDED",
+            "message": e.message,
+        }), 413
+    except ImportQueueTimeoutError as e:
+        publish_import_event(
+            user_id, import_id, "failed", error="IMPORT_BUSY", message=e.message, **event_fields
+        )
+        return jsonify({
+            "error": "IMPORT_BUSY",
+            "message": e.message,
+        }), 503, {"Retry-After": "10"}
     except GoogleClientError as e:
         status_code = 401 if e.error_code == "OAUTH_REVOKED" else 500
+        publish_import_event(
+            user_id, import_id, "failed", error=e.error_code, message=e.message, **event_fields
+        )
         return jsonify({
             "error": e.error_code,
             "message": e.message,
         }), status_code
     except Exception as e:
         current_app.logger.error(f"Import error: {str(e)}")
+        publish_import_event(
+            user_id, import_id, "failed", error="IMPORT_FAILED", message=str(e), **event_fields
+        )
         return jsonify({
             "error": "IMPORT_FAILED",
             "message": f"Failed to import file: {str(e)}",
         }), 500
+    finally:
+        IMPORTS_IN_PROGRESS.dec()
+
+
+@file_bp.route("/import/events", methods=["GET"])
+@require_auth
+def import_events():
+    """Stream the current user's import progress as Server-Sent Events.
+
+    The stream ends after ``SSE_MAX_SECONDS``; EventSource-style clients
+    reconnect automatically. Each open stream holds a greenlet (or thread)
+    but no database connection. On blocking workers, where it would hold a
+    whole worker, streams are refused and clients only get the import
+    responses themselves.
+    """
+    if streams_block_worker():
+        return jsonify({
+            "error": "SSE_UNAVAILABLE",
+            "message": "Import progress streaming needs gevent or threaded workers",
+        }), 503
+
+    user_id = get_current_user().id
+    heartbeat = current_app.config["SSE_HEARTBEAT_SECONDS"]
+    max_seconds = current_app.config["SSE_MAX_SECONDS"]
+    subscription = get_event_broker().subscribe(user_id)
+    release_db_connection()
+
+    def stream():
+        SSE_CONNECTIONS.inc()
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                event = subscription.get(timeout=min(heartbeat, remaining))
+                # Comment lines keep proxies from closing an idle stream
+                yield format_sse(event) if event is not None else ": keep-alive\n\n"
+        finally:
+            SSE_CONNECTIONS.dec()
+            subscription.close()
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @file_bp.route("/<file_id>", methods=["GET"])
+@read_replica
 @require_auth
 def get_file(file_id):
     """Get file metadata."""
     user = get_current_user()
     file = File.query.filter_by(id=file_id, user_id=user.id).first()
 
-    if not file or file.status == "deleted":
+    if not file or file.status != "imported":
         return jsonify({
             "error": "NOT_FOUND",
             "message": "File not found",
@@ -134,6 +326,30 @@ def get_file(file_id):
     return jsonify(file.to_dict())
 
 
+def _stored_file_etag(path, mtime_ns, size):
+    # Stored files are written once under fresh names; this changes if one is replaced
+    check = zlib.crc32(os.path.abspath(path).encode()) & 0xFFFFFFFF
+    return f"{mtime_ns:x}-{size:x}-{check:08x}"
+
+
+def _send_stored_file(path, **kwargs):
+    """``send_file`` for a stored file; small hot files are served from memory.
+
+    Unless the caller passes its own (e.g. the content hash), both ways send
+    the same ETag, built from the file's mtime, size and path.
+    """
+    cached = read_cached_file(path)
+    default_etag = kwargs.get("etag", True) is True
+    if cached is None:
+        if default_etag:
+            stat = os.stat(path)
+            kwargs["etag"] = _stored_file_etag(path, stat.st_mtime_ns, stat.st_size)
+        return send_file(path, **kwargs)
+    if default_etag:
+        kwargs["etag"] = _stored_file_etag(path, cached.mtime_ns, len(cached.data))
+    return send_file(io.BytesIO(cached.data), last_modified=cached.mtime, **kwargs)
+
+
 @file_bp.route("/<file_id>/download", methods=["GET"])
 @require_auth
 def download_file(file_id):
@@ -141,7 +357,7 @@ def download_file(file_id):
     user = get_current_user()
     file = File.query.filter_by(id=file_id, user_id=user.id).first()
 
-    if not file or file.status == "deleted":
+    if not file or file.status != "imported":
         return jsonify({
             "error": "NOT_FOUND",
             "message": "File not found",
@@ -154,15 +370,14 @@ def download_file(file_id):
         }), 404
 
     try:
-        from app.storage import read_file
-        content = read_file(file.storage_path)
-        
-        return send_file(
-            io.BytesIO(content),
+        response = _send_stored_file(
+            file.storage_path,
             mimetype=file.mime_type or "application/octet-stream",
             as_attachment=True,
             download_name=file.name,
         )
+        SERVED_BYTES.inc(response.content_length or 0)
+        return response
     except FileNotFoundError:
         return jsonify({
             "error": "FILE_NOT_FOUND",
@@ -170,6 +385,140 @@ def download_file(file_id):
         }), 404
 
 
+@file_bp.route("/<file_id>/link", methods=["POST"])
+@require_auth
+def create_download_link(file_id):
+    """Mint a short-lived signed download URL that needs no auth header.
+
+    Body (optional): {"expires_in": seconds, "inline": bool}.
+    """
+    user = get_current_user()
+    file = File.query.filter_by(id=file_id, user_id=user.id).first()
+
+    if not file or file.status != "imported":
+        return jsonify({
+            "error": "NOT_FOUND",
+            "message": "File not found",
+        }), 404
+
+    if not file.storage_path:
+        return jsonify({
+            "error": "FILE_NOT_STORED",
+            "message": "File content not available",
+        }), 404
+
+    data = request.get_json(silent=True) or {}
+    max_seconds = current_app.config["DOWNLOAD_LINK_MAX_SECONDS"]
+    expires_in = data.get("expires_in", current_app.config["DOWNLOAD_LINK_SECONDS"])
+    # bool is an int subclass; don't let {"expires_in": true} mint a 1-second link
+    if (
+        not isinstance(expires_in, int)
+        or isinstance(expires_in, bool)
+        or not 0 < expires_in <= max_seconds
+    ):
+        return jsonify({
+            "error": "VALIDATION_ERROR",
+            "message": f"expires_in must be between 1 and {max_seconds} seconds",
+        }), 400
+
+    token, expires_at = create_download_token(file, expires_in, bool(data.get("inline")))
+    base_url = current_app.config.get("DOWNLOAD_LINK_BASE_URL") or request.host_url
+    return jsonify({
+        "url": f"{base_url.rstrip('/')}/api/files/links/{token}",
+        "expires_at": expires_at.isoformat(),
+    }), 201
+
+
+@file_bp.route("/links/<token>", methods=["GET"])
+def download_link(token):
+    """Serve a file through a signed link: signature check only, no DB access."""
+    link = decode_download_token(token)
+    if not link:
+        return jsonify({
+            "error": "INVALID_LINK",
+            "message": "Download link is invalid or expired",
+        }), 403
+
+    try:
+        # conditional: Range requests (PDF viewers) and If-None-Match
+        response = _send_stored_file(
+            link["path"],
+            mimetype=link["mime"],
+            as_attachment=not link["inline"],
+            download_name=link["name"],
+            conditional=True,
+            etag=link["sha"] or True,
+        )
+    except FileNotFoundError:
+        return jsonify({
+            "error": "FILE_NOT_FOUND",
+            "message": "File not found on disk",
+        }), 404
+
+    if response.status_code in (200, 206):
+        SERVED_BYTES.inc(response.content_length or 0)
+
+    # Stored files never change in place; shared caches may keep it until the link expires
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = max(int(link["exp"] - time.time()), 0)
+    return response
+
+
+@file_bp.route("/<file_id>/thumbnail", methods=["GET"])
+@require_auth
+def get_file_thumbnail(file_id):
+    """Get a PNG thumbnail of a PDF or image file (?w= width in pixels)."""
+    user = get_current_user()
+    file = File.query.filter_by(id=file_id, user_id=user.id).first()
+
+    if not file or file.status != "imported":
+        return jsonify({
+            "error": "NOT_FOUND",
+            "message": "File not found",
+        }), 404
+
+    if not is_previewable(file.storage_path):
+        return jsonify({
+            "error": "PREVIEW_UNAVAILABLE",
+            "message": "No preview is available for this file type",
+        }), 404
+
+    width = snap_width(request.args.get("w", type=int))
+    storage_path = file.storage_path
+    release_db_connection()
+
+    # Stored files never change in place, so a matching ETag needs no work
+    etag = thumbnail_etag(storage_path, width)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        try:
+            path = get_thumbnail(storage_path, width)
+        except FileNotFoundError:
+            return jsonify({
+                "error": "FILE_NOT_FOUND",
+                "message": "File not found on disk",
+            }), 404
+        except Exception as e:
+            current_app.logger.warning(f"Thumbnail error for {file_id}: {str(e)}")
+            path = None
+
+        if path is None:
+            return jsonify({
+                "error": "PREVIEW_UNAVAILABLE",
+                "message": "No preview could be rendered for this file",
+            }), 404
+        response = send_file(path, mimetype="image/png", conditional=False, etag=False)
+
+    response.set_etag(etag)
+    response.cache_control.no_cache = None
+    response.cache_control.private = True
+    response.cache_control.max_age = 365 * 24 * 3600
+    response.cache_control.immutable = True
+    return response
+
+
 @file_bp.route("/<file_id>", methods=["DELETE"])
 @require_auth
 def delete_file(file_id):
@@ -177,42 +526,146 @@ def delete_file(file_id):
     user = get_current_user()
     file = File.query.filter_by(id=file_id, user_id=user.id).first()
 
-    if not file or file.status == "deleted":
+    if not file or file.status != "imported":
         return jsonify({
             "error": "NOT_FOUND",
             "message": "File not found",
         }), 404
 
-    # Delete from disk
-    if file.storage_path:
-        delete_file_from_disk(file.storage_path)
+    # Mark as deleted in DB; only the request that flips the status releases usage
+    result = db.session.execute(
+        db.update(File)
+        .where(File.id == file.id, File.status == "imported")
+        .values(status="deleted", deleted_at=datetime.now(timezone.utc)),
+        execution_options={"synchronize_session": "fetch"},
+    )
+    if not result.rowcount:
+        # Deleted (or flagged by the scrubber) since we loaded it
+        db.session.rollback()
+        return jsonify({
+            "error": "NOT_FOUND",
+            "message": "File not found",
+        }), 404
 
-    # Mark as deleted in DB
-    file.status = "deleted"
+    # A clone may still share the stored file; then it keeps using disk
+    shared = file.storage_path in referenced_paths([file.storage_path])
+    size_bytes = file.size_bytes or 0
+    record_files_removed(
+        file.user_id, file.dataroom_id, size_bytes, released_bytes=0 if shared else size_bytes
+    )
     db.session.commit()
 
+    # Delete from disk once nothing references it
+    release_storage([file.storage_path])
+
     return jsonify({"message": "File deleted successfully"})
 
 
-def _get_extension_for_mime_type(mime_type: str) -> str:
-    """Get file extension for a MIME type."""
-    mime_to_ext = {
-        "application/pdf": ".pdf",
-        "application/vnd.google-apps.document": ".pdf",
-        "application/vnd.google-apps.spreadsheet": ".xlsx",
-        "application/vnd.google-apps.presentation": ".pdf",
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
-        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": ".xlsx",
-        "application/vnd.openxmlformats-officedocument.presentationml.presentation": ".pptx",
-        "text/plain": ".txt",
-        "text/html": ".html",
-        "text/csv": ".csv",
-        "image/jpeg": ".jpg",
-        "image/png": ".png",
-        "image/gif": ".gif",
-        "image/webp": ".webp",
-        "application/json": ".json",
-        "application/xml": ".xml",
-    }
-    return mime_to_ext.get(mime_type, "")
+@file_bp.route("/bulk", methods=["POST"])
+@require_auth
+def bulk_files():
+    """Delete or move many files in one transaction.
+
+    Body: {"action": "delete" | "move", "file_ids": [...], "dataroom_id"
+    (move target)}. Files that aren't the user's imported files (or, for a
+    move, are already in the target or would duplicate a Drive file there)
+    are returned as ``skipped``.
+    """
+    user = get_current_user()
+    data = request.get_json(silent=True) or {}
+    action = data.get("action")
+    file_ids = data.get("file_ids")
+
+    if action not in ("delete", "move"):
+        return jsonify({
+            "error": "VALIDATION_ERROR",
+            "message": "action must be 'delete' or 'move'",
+        }), 400
+
+    if (
+        not isinstance(file_ids, list)
+        or not file_ids
+        or not all(isinstance(i, str) for i in file_ids)
+    ):
+        return jsonify({
+            "error": "VALIDATION_ERROR",
+            "message": "file_ids must be a non-empty list of file ids",
+        }), 400
+
+    if len(file_ids) > MAX_BULK_FILES:
+        return jsonify({
+            "error": "VALIDATION_ERROR",
+            "message": f"At most {MAX_BULK_FILES} files per request",
+        }), 400
+
+    target = None
+    if action == "move":
+        target = Dataroom.query.filter_by(id=data.get("dataroom_id"), user_id=user.id).first()
+        if not target:
+            return jsonify({
+                "error": "NOT_FOUND",
+                "message": "Dataroom not found",
+            }), 404
+
+    # Lock the rows so a concurrent single delete can't double count them
+    query = db.select(
+        File.id, File.dataroom_id, File.storage_path, File.size_bytes, File.google_file_id
+    ).where(
+        File.id.in_(set(file_ids)), File.user_id == user.id, File.status == "imported"
+    )
+    if target is not None:
+        query = query.where(File.dataroom_id != target.id)
+    rows = db.session.execute(query.with_for_update()).all()
+
+    if target is not None and rows:
+        # Keep the one-import-per-Drive-file rule in the target room
+        taken = set(db.session.scalars(
+            db.select(File.google_file_id).where(
+                File.dataroom_id == target.id,
+                File.status == "imported",
+                File.google_file_id.in_({r.google_file_id for r in rows if r.google_file_id}),
+            )
+        ))
+        rows = [r for r in rows if r.google_file_id not in taken]
+
+    done = [r.id for r in rows]
+    by_room = defaultdict(lambda: [0, 0])
+    for row in rows:
+        by_room[row.dataroom_id][0] += 1
+        by_room[row.dataroom_id][1] += row.size_bytes or 0
+
+    paths = set()
+    if rows and action == "delete":
+        db.session.execute(
+            db.update(File)
+            .where(File.id.in_(done))
+            .values(status="deleted", deleted_at=datetime.now(timezone.utc)),
+            execution_options={"synchronize_session": False},
+        )
+        for dataroom_id, (count, size_bytes) in by_room.items():
+            record_files_removed(user.id, dataroom_id, size_bytes, count=count, released_bytes=0)
+
+        # Usage counts a stored file once: release the ones no clone still uses
+        sizes = {r.storage_path: r.size_bytes or 0 for r in rows if r.storage_path}
+        paths = set(sizes) - referenced_paths(sizes)
+        release_user_bytes(user.id, sum(sizes[p] for p in paths))
+    elif rows:
+        # Metadata only: storage paths don't depend on the dataroom
+        db.session.execute(
+            db.update(File).where(File.id.in_(done)).values(dataroom_id=target.id),
+            execution_options={"synchronize_session": False},
+        )
+        for dataroom_id, (count, size_bytes) in by_room.items():
+            record_files_moved(dataroom_id, target.id, size_bytes, count)
+    db.session.commit()
+
+    # Disk removal happens after the response, in one batch
+    if paths:
+        submit(release_storage, paths)
 
+    done_ids = set(done)
+    return jsonify({
+        "action": action,
+        "file_ids": done,
+        "skipped": [i for i in dict.fromkeys(file_ids) if i not in done_ids],
+    })
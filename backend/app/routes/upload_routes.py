@@ -0,0 +1,233 @@
+from flask import Blueprint, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_content_range_header, parse_options_header
+from app import db, release_db_connection
+from app.models import Dataroom, File
+from app.auth import require_auth, get_current_user
+from app.tasks import schedule_file_processing
+from app.uploads import (
+    UploadError,
+    append_chunk,
+    create_session,
+    delete_session,
+    finish_session,
+    load_session,
+    remove_stored,
+    session_offset,
+    stream_multipart,
+)
+from app.usage import QuotaExceededError, check_quota, get_user_quota, record_file_added
+
+upload_bp = Blueprint("upload", __name__)
+
+
+def _dataroom_not_found():
+    return jsonify({
+        "error": "NOT_FOUND",
+        "message": "Dataroom not found",
+    }), 404
+
+
+def _too_large():
+    return jsonify({
+        "error": "PAYLOAD_TOO_LARGE",
+        "message": "Request body exceeds the maximum upload size",
+    }), 413
+
+
+def _quota_exceeded(e: QuotaExceededError):
+    return jsonify({
+        "error": "QUOTA_EXCEEDED",
+        "message": e.message,
+    }), 413
+
+
+def _record_uploads(user_id, dataroom_id, uploads, quota_bytes):
+    """Insert file rows for stored uploads in one transaction."""
+    try:
+        records = []
+        for upload in uploads:
+            record_file_added(user_id, dataroom_id, upload.size_bytes, quota_bytes)
+            record = File(
+                dataroom_id=dataroom_id,
+                user_id=user_id,
+                name=upload.name,
+                mime_type=upload.mime_type,
+                size_bytes=upload.size_bytes,
+                storage_path=upload.storage_path,
+                sha256=upload.sha256,
+                status="imported",
+            )
+            db.session.add(record)
+            records.append(record)
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        remove_stored([u.storage_path for u in uploads])
+        raise
+
+    for record in records:
+        schedule_file_processing(record.id, record.storage_path)
+    return records
+
+
+@upload_bp.route("/<dataroom_id>/upload", methods=["POST"])
+@require_auth
+def upload_files(dataroom_id):
+    """Upload one or more files as multipart/form-data, streamed to storage."""
+    user = get_current_user()
+    dataroom = Dataroom.query.filter_by(id=dataroom_id, user_id=user.id).first()
+    if not dataroom:
+        return _dataroom_not_found()
+
+    mimetype, options = parse_options_header(request.headers.get("Content-Type", ""))
+    if mimetype != "multipart/form-data" or not options.get("boundary"):
+        return jsonify({
+            "error": "VALIDATION_ERROR",
+            "message": "Expected a multipart/form-data body",
+        }), 400
+
+    user_id = user.id
+    quota_bytes = get_user_quota(user)
+    used_bytes = user.storage_used_bytes
+
+    # The body may take minutes to arrive; don't hold a DB connection meanwhile
+    release_db_connection()
+
+    try:
+        # request.stream enforces MAX_CONTENT_LENGTH, also for chunked bodies
+        uploads = stream_multipart(
+            request.stream, options["boundary"], user_id, dataroom_id, quota_bytes, used_bytes
+        )
+        if not uploads:
+            return jsonify({
+                "error": "VALIDATION_ERROR",
+                "message": "No files in request",
+            }), 400
+        records = _record_uploads(user_id, dataroom_id, uploads, quota_bytes)
+    except RequestEntityTooLarge:
+        return _too_large()
+    except QuotaExceededError as e:
+        return _quota_exceeded(e)
+    except UploadError as e:
+        return jsonify({
+            "error": e.error_code,
+            "message": e.message,
+        }), e.status_code
+
+    return jsonify({"files": [r.to_dict() for r in records]}), 201
+
+
+@upload_bp.route("/<dataroom_id>/uploads", methods=["POST"])
+@require_auth
+def create_upload(dataroom_id):
+    """Start a resumable upload. Body: {"name", "size", "mime_type"?}."""
+    user = get_current_user()
+    dataroom = Dataroom.query.filter_by(id=dataroom_id, user_id=user.id).first()
+    if not dataroom:
+        return _dataroom_not_found()
+
+    data = request.get_json(silent=True) or {}
+    name = data.get("name")
+    size = data.get("size")
+    if not name or not isinstance(size, int) or size < 0:
+        return jsonify({
+            "error": "VALIDATION_ERROR",
+            "message": "name and a non-negative integer size are required",
+        }), 400
+
+    try:
+        check_quota(get_user_quota(user), user.storage_used_bytes, size)
+    except QuotaExceededError as e:
+        return _quota_exceeded(e)
+
+    session = create_session(user.id, dataroom_id, name, data.get("mime_type"), size)
+    return jsonify({"upload_id": session["id"], "offset": 0, "size": size}), 201
+
+
+@upload_bp.route("/<dataroom_id>/uploads/<upload_id>", methods=["GET"])
+@require_auth
+def get_upload(dataroom_id, upload_id):
+    """Get the offset to resume a resumable upload from."""
+    user = get_current_user()
+    session = load_session(upload_id, user.id, dataroom_id)
+    if not session:
+        return jsonify({
+            "error": "NOT_FOUND",
+            "message": "Upload not found",
+        }), 404
+
+    return jsonify({
+        "upload_id": session["id"],
+        "offset": session_offset(session),
+        "size": session["size"],
+    })
+
+
+@upload_bp.route("/<dataroom_id>/uploads/<upload_id>", methods=["PUT"])
+@require_auth
+def upload_chunk(dataroom_id, upload_id):
+    """Append a chunk (Content-Range: bytes start-end/size) to a resumable upload.
+
+    Returns the new offset, or the created file once the last byte arrives.
+    """
+    user = get_current_user()
+    session = load_session(upload_id, user.id, dataroom_id)
+    if not session:
+        return jsonify({
+            "error": "NOT_FOUND",
+            "message": "Upload not found",
+        }), 404
+
+    content_range = parse_content_range_header(request.headers.get("Content-Range"))
+    if session["size"] == 0:
+        start, length = 0, 0
+    elif (
+        content_range is None
+        or content_range.units != "bytes"
+        or content_range.length != session["size"]
+    ):
+        return jsonify({
+            "error": "VALIDATION_ERROR",
+            "message": f"Content-Range: bytes start-end/{session['size']} is required",
+        }), 400
+    else:
+        start, length = content_range.start, content_range.stop - content_range.start
+
+    user_id = user.id
+    quota_bytes = get_user_quota(user)
+    release_db_connection()
+
+    try:
+        offset = append_chunk(session, start, length, request.stream)
+        if offset < session["size"]:
+            return jsonify({"upload_id": session["id"], "offset": offset, "size": session["size"]})
+        records = _record_uploads(user_id, dataroom_id, [finish_session(session)], quota_bytes)
+    except RequestEntityTooLarge:
+        return _too_large()
+    except QuotaExceededError as e:
+        delete_session(session)
+        return _quota_exceeded(e)
+    except UploadError as e:
+        return jsonify({
+            "error": e.error_code,
+            "message": e.message,
+        }), e.status_code
+
+    return jsonify(records[0].to_dict()), 201
+
+
+@upload_bp.route("/<dataroom_id>/uploads/<upload_id>", methods=["DELETE"])
+@require_auth
+def cancel_upload(dataroom_id, upload_id):
+    """Abort a resumable upload and discard the bytes received so far."""
+    user = get_current_user()
+    session = load_session(upload_id, user.id, dataroom_id)
+    if not session:
+        return jsonify({
+            "error": "NOT_FOUND",
+            "message": "Upload not found",
+        }), 404
+
+    delete_session(session)
+    return jsonify({"message": "Upload cancelled"})
@@ -0,0 +1,282 @@
+"""Integrity scrubbing of stored files.
+
+``flask scrub-storage`` walks imported ``files`` rows in keyset batches and
+re-reads each stored file in a pool of low-priority worker processes,
+checking that it exists, has the recorded size and hashes to the recorded
+SHA-256. Uploads, Drive imports and manifest imports all hash the bytes
+as they store them, so a row without a checksum predates that; its first
+scrub records the digest of whatever is on disk at the time, which only
+catches corruption from then on. Rows whose file is gone become
+``status='missing'`` and rows whose bytes changed ``status='corrupt'``; like
+a deleted file they drop out of listings and usage counters, and can be
+imported again. Corrupt bytes are left on disk for inspection.
+
+Reads are throttled to ``SCRUB_IO_BYTES_PER_SEC`` and the workers run at
+nice 10, so a scrub can share a host with the web workers. Progress is
+checkpointed after every batch under ``SCRUB_STATE_PATH``: a run cut short
+by ``max_seconds`` (or killed) resumes where it stopped, so a nightly cron
+job gets through a large store over several nights. A pass that reaches
+the end also looks for orphaned files on disk that no row references.
+"""
+import fcntl
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from flask import current_app
+from app import db
+from app.models import File
+from app.storage import get_file_size, referenced_paths
+from app.usage import record_files_removed
+
+CHUNK_SIZE = 1024 * 1024
+
+# Imports write the stored file before committing its row
+ORPHAN_MIN_AGE_SECONDS = 3600
+
+
+class ScrubInProgressError(Exception):
+    """Another scrub holds the lock."""
+
+
+def _worker_init() -> None:
+    try:
+        os.nice(10)
+    except OSError:
+        pass
+
+
+def verify_stored_file(
+    path: str, size_bytes: Optional[int], sha256: Optional[str]
+) -> Tuple[str, Optional[str]]:
+    """Check one stored file; returns ("ok" | "missing" | "corrupt", its sha256).
+
+    Runs in a worker process.
+    """
+    if not os.path.isfile(path):
+        return "missing", None
+    if size_bytes is not None and get_file_size(path) != size_bytes:
+        return "corrupt", None
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    actual = digest.hexdigest()
+    if sha256 and actual != sha256:
+        return "corrupt", actual
+    return "ok", actual
+
+
+class _IOBudget:
+    """Token bucket over bytes read; ``consume`` sleeps to stay under the rate."""
+
+    def __init__(self, bytes_per_sec: int):
+        self.rate = bytes_per_sec
+        self.allowance = float(bytes_per_sec)
+        self.last = time.monotonic()
+
+    def consume(self, n: int) -> None:
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+        self.last = now
+        self.allowance -= n
+        if self.allowance < 0:
+            time.sleep(-self.allowance / self.rate)
+
+
+# ----------------------------------------------------------------------
+# Checkpoint
+
+
+def _state_dir() -> str:
+    return current_app.config.get("SCRUB_STATE_PATH") or os.path.join(
+        current_app.config["STORAGE_PATH"], ".scrub"
+    )
+
+
+def load_checkpoint() -> dict:
+    """The current pass's progress (empty when starting a new pass)."""
+    try:
+        with open(os.path.join(_state_dir(), "checkpoint.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_checkpoint(state: dict) -> None:
+    path = os.path.join(_state_dir(), "checkpoint.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+# ----------------------------------------------------------------------
+# Verification
+
+
+def _next_batch(after_id: Optional[str], batch_size: int):
+    query = (
+        db.select(
+            File.id, File.user_id, File.dataroom_id, File.storage_path, File.size_bytes, File.sha256
+        )
+        .where(File.status == "imported", File.storage_path.isnot(None))
+        .order_by(File.id)
+        .limit(batch_size)
+    )
+    if after_id:
+        query = query.where(File.id > after_id)
+    return db.session.execute(query).all()
+
+
+def _record_results(rows, results: Dict[str, Tuple[str, Optional[str]]], totals: dict) -> None:
+    """Apply one batch's results in a single transaction."""
+    flagged = []
+    for row in rows:
+        status, digest = results[row.storage_path]
+        if status == "ok":
+            if row.sha256 is None:
+                # A legacy row: nothing to compare against, so trust the bytes once
+                db.session.execute(
+                    db.update(File)
+                    .where(File.id == row.id, File.sha256.is_(None))
+                    .values(sha256=digest),
+                    execution_options={"synchronize_session": False},
+                )
+                totals["checksums_recorded"] += 1
+            continue
+
+        # Only flip rows still imported (a concurrent delete wins)
+        result = db.session.execute(
+            db.update(File)
+            .where(File.id == row.id, File.status == "imported")
+            .values(status=status),
+            execution_options={"synchronize_session": False},
+        )
+        if result.rowcount:
+            totals[status] += 1
+            flagged.append(row)
+            current_app.logger.warning(f"Scrub: file {row.id} is {status} ({row.storage_path})")
+
+    # Usage counts a stored file once; release it when its last imported row goes
+    still_referenced = referenced_paths(row.storage_path for row in flagged)
+    released = set()
+    for row in flagged:
+        release = row.storage_path not in still_referenced and row.storage_path not in released
+        released.add(row.storage_path)
+        size_bytes = row.size_bytes or 0
+        record_files_removed(
+            row.user_id, row.dataroom_id, size_bytes, released_bytes=size_bytes if release else 0
+        )
+    db.session.commit()
+
+
+def find_orphans(min_age_seconds: int = ORPHAN_MIN_AGE_SECONDS) -> Iterator[str]:
+    """Stored files no (non-deleted) row references.
+
+    Dot-directories (caches, upload sessions, scrub state) and files newer
+    than ``min_age_seconds`` (an import may not have committed yet) are
+    skipped.
+    """
+    cutoff = time.time() - min_age_seconds
+    batch: List[str] = []
+    for root, dirs, filenames in os.walk(current_app.config["STORAGE_PATH"]):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for filename in filenames:
+            if filename.startswith(".") or filename.endswith(".part"):
+                continue
+            path = os.path.join(root, filename)
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            batch.append(path)
+            if len(batch) >= 500:
+                yield from _unreferenced(batch)
+                batch = []
+    yield from _unreferenced(batch)
+
+
+def _unreferenced(paths: List[str]) -> List[str]:
+    if not paths:
+        return []
+    known = set(db.session.scalars(
+        db.select(File.storage_path).distinct().where(
+            File.storage_path.in_(paths), File.status != "deleted"
+        )
+    ))
+    db.session.close()
+    return [path for path in paths if path not in known]
+
+
+def scrub_storage(
+    batch_size: int = 200,
+    max_seconds: Optional[float] = None,
+    restart: bool = False,
+) -> dict:
+    """Verify stored files, resuming the current pass. Returns the pass totals.
+
+    ``complete`` in the result is True when the pass reached the last file
+    (the next run starts a new pass).
+    """
+    os.makedirs(_state_dir(), exist_ok=True)
+    lock = open(os.path.join(_state_dir(), "scrub.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        raise ScrubInProgressError("Another scrub is running")
+
+    try:
+        state = load_checkpoint()
+        if restart or state.get("complete"):
+            state = {}
+        state.setdefault("started_at", datetime.now(timezone.utc).isoformat())
+        totals = state.setdefault(
+            "totals", {"checked": 0, "missing": 0, "corrupt": 0, "checksums_recorded": 0}
+        )
+        budget = _IOBudget(current_app.config["SCRUB_IO_BYTES_PER_SEC"])
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+
+        # spawn: workers must not inherit the app's pooled DB connections
+        with ProcessPoolExecutor(
+            max_workers=current_app.config["SCRUB_WORKERS"],
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_worker_init,
+        ) as pool:
+            while deadline is None or time.monotonic() < deadline:
+                rows = _next_batch(state.get("after_id"), batch_size)
+                if not rows:
+                    state["complete"] = True
+                    break
+
+                # Clones share stored files; read each one once per batch
+                futures = {}
+                for row in rows:
+                    if row.storage_path not in futures:
+                        budget.consume(row.size_bytes or 0)
+                        futures[row.storage_path] = pool.submit(
+                            verify_stored_file, row.storage_path, row.size_bytes, row.sha256
+                        )
+                results = {path: future.result() for path, future in futures.items()}
+
+                _record_results(rows, results, totals)
+                totals["checked"] += len(rows)
+                state["after_id"] = rows[-1].id
+                _save_checkpoint(state)
+                db.session.close()
+
+        # A complete checkpoint makes the next run start a new pass
+        _save_checkpoint(state)
+        return state
+    finally:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
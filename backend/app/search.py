@@ -0,0 +1,89 @@
+"""Ranked full-text search over extracted file contents."""
+from typing import Tuple
+from sqlalchemy import func, or_
+from app import db
+from app.extraction import search_config
+from app.models import File, FileContent
+
+SNIPPET_CHARS = 160
+
+
+def _like_snippet(text: str, query: str) -> str:
+    index = text.lower().find(query.lower())
+    if index < 0:
+        return text[:SNIPPET_CHARS]
+    start = max(index - SNIPPET_CHARS // 2, 0)
+    return text[start:start + SNIPPET_CHARS]
+
+
+def search_files(dataroom_id: str, query: str, page: int, page_size: int) -> Tuple[list, int]:
+    """Search a dataroom's imported files. Returns (results, total matches)."""
+    if db.engine.dialect.name == "postgresql":
+        return _search_postgres(dataroom_id, query, page, page_size)
+    return _search_like(dataroom_id, query, page, page_size)
+
+
+def _search_postgres(dataroom_id, query, page, page_size):
+    ts_query = func.websearch_to_tsquery(search_config(), query)
+    matches = (
+        db.select(File.id, func.ts_rank_cd(FileContent.search_vector, ts_query).label("rank"))
+        .join(FileContent, FileContent.file_id == File.id)
+        .where(
+            File.dataroom_id == dataroom_id,
+            File.status == "imported",
+            FileContent.search_vector.op("@@")(ts_query),
+        )
+    )
+    total = db.session.scalar(db.select(func.count()).select_from(matches.subquery()))
+
+    # Rank and paginate on the GIN match first; build headlines for the page only
+    page_ids = (
+        matches.order_by(db.desc("rank"), File.id)
+        .limit(page_size)
+        .offset((page - 1) * page_size)
+        .subquery()
+    )
+    headline = func.ts_headline(
+        search_config(),
+        FileContent.text,
+        ts_query,
+        "MaxFragments=2, MaxWords=20, MinWords=5",
+    )
+    rows = db.session.execute(
+        db.select(File, page_ids.c.rank, headline)
+        .join(page_ids, page_ids.c.id == File.id)
+        .join(FileContent, FileContent.file_id == File.id)
+        .order_by(page_ids.c.rank.desc(), File.id)
+    ).all()
+
+    results = [
+        {**file.to_dict(), "rank": float(rank), "snippet": snippet}
+        for file, rank, snippet in rows
+    ]
+    return results, total
+
+
+def _search_like(dataroom_id, query, page, page_size):
+    # Fallback for non-Postgres databases (local development, benchmarks)
+    pattern = f"%{query}%"
+    matches = (
+        db.select(File, FileContent.text)
+        .join(FileContent, FileContent.file_id == File.id)
+        .where(
+            File.dataroom_id == dataroom_id,
+            File.status == "imported",
+            or_(FileContent.text.ilike(pattern), File.name.ilike(pattern)),
+        )
+    )
+    total = db.session.scalar(db.select(func.count()).select_from(matches.subquery()))
+    rows = db.session.execute(
+        matches.order_by(File.imported_at.desc(), File.id)
+        .limit(page_size)
+        .offset((page - 1) * page_size)
+    ).all()
+
+    results = [
+        {**file.to_dict(), "rank": None, "snippet": _like_snippet(text or "", query)}
+        for file, text in rows
+    ]
+    return results, total
@@ -1,7 +1,10 @@
 import os
+import threading
 import uuid
-from typing import Optional
-from flask import current_app
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Optional, Set
+from flask import current_app, has_app_context
+from app.metrics import HOT_FILE_CACHE_BYTES, HOT_FILE_CACHE_REQUESTS
 
 
 def get_storage_path(user_id: str, dataroom_id: str, filename: Optional[str] = None) -> str:
@@ -29,17 +32,117 @@ def save_file(path: str, content: bytes) -> int:
     return len(content)
 
 
+class CachedFile(NamedTuple):
+    data: bytes
+    mtime: float
+    mtime_ns: int
+
+
+class HotFileCache:
+    """Byte-budgeted in-memory LRU of small stored files, per worker process.
+
+    A hit costs one ``stat`` instead of an open and read: the entry is served
+    only while the file still exists with the same mtime and size. Deletes
+    by another worker (or a released file behind a signed link) therefore
+    take effect at once, not just in the worker that made them.
+    """
+
+    def __init__(self, max_bytes: int, max_file_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[CachedFile]:
+        """The cached file, loading it on a miss; None if it's too large to cache.
+
+        Raises FileNotFoundError like ``open``.
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+
+        if entry is not None:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self.invalidate(path)
+                raise
+            if stat.st_mtime_ns == entry.mtime_ns and stat.st_size == len(entry.data):
+                HOT_FILE_CACHE_REQUESTS.labels(result="hit").inc()
+                return entry
+            self.invalidate(path)
+
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size > self.max_file_bytes:
+                HOT_FILE_CACHE_REQUESTS.labels(result="bypass").inc()
+                return None
+            entry = CachedFile(f.read(), stat.st_mtime, stat.st_mtime_ns)
+        HOT_FILE_CACHE_REQUESTS.labels(result="miss").inc()
+        self._store(path, entry)
+        return entry
+
+    def _store(self, path: str, entry: CachedFile) -> None:
+        with self._lock:
+            old = self._entries.pop(path, None)
+            delta = len(entry.data) - (len(old.data) if old else 0)
+            self._entries[path] = entry
+            while self.size + delta > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                delta -= len(evicted.data)
+            self.size += delta
+        HOT_FILE_CACHE_BYTES.inc(delta)
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is None:
+                return
+            self.size -= len(entry.data)
+        HOT_FILE_CACHE_BYTES.dec(len(entry.data))
+
+
+def get_hot_file_cache() -> Optional[HotFileCache]:
+    """The worker's hot-file cache (None when HOT_FILE_CACHE_BYTES is 0)."""
+    if not has_app_context() or not current_app.config["HOT_FILE_CACHE_BYTES"]:
+        return None
+    cache = current_app.extensions.get("hot_file_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault("hot_file_cache", HotFileCache(
+            current_app.config["HOT_FILE_CACHE_BYTES"],
+            current_app.config["HOT_FILE_MAX_BYTES"],
+        ))
+    return cache
+
+
+def read_cached_file(path: str) -> Optional[CachedFile]:
+    """A small stored file from memory (loaded on first use), or None.
+
+    None means the file is too large for the cache (or it's disabled): stream
+    it from ``path`` instead. Raises FileNotFoundError if it's gone.
+    """
+    cache = get_hot_file_cache()
+    return cache.get(path) if cache is not None else None
+
+
 def read_file(path: str) -> bytes:
-    """Read file content from disk."""
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"File not found: {path}")
-    
+    """Read file content (small files come from the hot-file cache)."""
+    cached = read_cached_file(path)
+    if cached is not None:
+        return cached.data
+
     with open(path, "rb") as f:
         return f.read()
 
 
 def delete_file(path: str) -> bool:
     """Delete a file from disk."""
+    cache = get_hot_file_cache()
+    if cache is not None:
+        cache.invalidate(path)
     try:
         if os.path.exists(path):
             os.remove(path)
@@ -49,9 +152,67 @@ def delete_file(path: str) -> bool:
         return False
 
 
+def referenced_paths(paths: Iterable[str]) -> Set[str]:
+    """Storage paths still used by an imported file.
+
+    Cloned datarooms share stored files, so a path may only be removed from
+    disk once no imported row points at it. Sees the caller's uncommitted
+    changes when called inside its transaction.
+    """
+    from app import db
+    from app.models import File
+
+    paths = [p for p in set(paths) if p]
+    found = set()
+    for start in range(0, len(paths), 500):
+        found.update(db.session.scalars(
+            db.select(File.storage_path).distinct().where(
+                File.storage_path.in_(paths[start:start + 500]),
+                File.status == "imported",
+            )
+        ))
+    return found
+
+
+def release_storage(paths: Iterable[str]) -> None:
+    """Delete stored files (and cached thumbnails) no imported file references.
+
+    Call after the transaction that removed the rows has committed.
+    """
+    from app.previews import delete_thumbnails
+
+    paths = set(p for p in paths if p)
+    for path in paths - referenced_paths(paths):
+        delete_file(path)
+        delete_thumbnails(path)
+
+
 def get_file_size(path: str) -> int:
     """Get the size of a file in bytes."""
     if os.path.exists(path):
         return os.path.getsize(path)
     return 0
 
+
+def get_extension_for_mime_type(mime_type: str) -> str:
+    """Get file extension for a MIME type."""
+    mime_to_ext = {
+        "application/pdf": ".pdf",
+        "application/vnd.google-apps.document": ".pdf",
+        "application/vnd.google-apps.spreadsheet": ".xlsx",
+        "application/vnd.google-apps.presentation": ".pdf",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": ".xlsx",
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation": ".pptx",
+        "text/plain": ".txt",
+        "text/html": ".html",
+        "text/csv": ".csv",
+        "image/jpeg": ".jpg",
+        "image/png": ".png",
+        "image/gif": ".gif",
+        "image/webp": ".webp",
+        "application/json": ".json",
+        "application/xml": ".xml",
+    }
+    return mime_to_ext.get(mime_type, "")
+
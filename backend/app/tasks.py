@@ -0,0 +1,113 @@
+"""In-process background tasks.
+
+Work that must stay off the request path (text extraction, previews, ...)
+is submitted here and runs on a small thread pool inside an app context.
+Under gevent those threads are greenlets on the worker's hub, so the
+CPU-bound part of a task (parsing a PDF, rendering a page) goes through
+``run_in_process`` to a few niced processes instead. Both pools are created
+lazily so they are never inherited across gunicorn forks.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+from flask import current_app
+from app import db
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+_processes: Optional[ProcessPoolExecutor] = None
+_processes_lock = threading.Lock()
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="dataroom-task"
+            )
+        return _executor
+
+
+def submit(fn: Callable, *args, **kwargs) -> Future:
+    """Run ``fn(*args, **kwargs)`` in the background within an app context."""
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                app.logger.exception(f"Background task {fn.__name__} failed")
+                raise
+            finally:
+                db.session.remove()
+
+    return _get_executor(app.config["BACKGROUND_WORKERS"]).submit(run)
+
+
+def _process_init() -> None:
+    try:
+        os.nice(10)
+    except OSError:
+        pass
+
+
+def _get_processes(max_workers: int) -> ProcessPoolExecutor:
+    global _processes
+    with _processes_lock:
+        if _processes is None:
+            # spawn: children must not inherit the app's pooled DB connections
+            _processes = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_process_init,
+            )
+        return _processes
+
+
+def run_in_process(fn: Callable, *args):
+    """Run CPU-bound ``fn(*args)`` in a worker process and return its result.
+
+    ``fn`` must be a module-level function of picklable arguments; it runs
+    without an app context. Waiting yields to other greenlets under gevent.
+    """
+    global _processes
+    processes = _get_processes(current_app.config["BACKGROUND_PROCESSES"])
+    try:
+        return processes.submit(fn, *args).result()
+    except BrokenProcessPool:
+        # A child died (e.g. killed for memory); start afresh next time
+        with _processes_lock:
+            if _processes is processes:
+                _processes = None
+        processes.shutdown(wait=False)
+        raise
+
+
+def wait_for_tasks() -> None:
+    """Block until every submitted task has finished (for CLI commands)."""
+    global _executor, _processes
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    with _processes_lock:
+        processes, _processes = _processes, None
+    if processes is not None:
+        processes.shutdown(wait=True)
+
+
+def schedule_file_processing(file_id: str, storage_path: str) -> None:
+    """Queue text extraction and thumbnail rendering for a newly stored file."""
+    from app.extraction import index_file
+    from app.previews import generate_thumbnails, is_previewable
+
+    if current_app.config["TEXT_EXTRACTION_ENABLED"]:
+        submit(index_file, file_id)
+    if current_app.config["THUMBNAILS_EAGER"] and is_previewable(storage_path):
+        submit(generate_thumbnails, storage_path)
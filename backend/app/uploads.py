@@ -0,0 +1,360 @@
+"""Direct file uploads, streamed from the request body to storage.
+
+Two paths, both constant-memory regardless of file size:
+
+- ``stream_multipart`` decodes a ``multipart/form-data`` body chunk by chunk
+  from ``request.stream`` (never touching ``request.files``), writing and
+  hashing each file part as it arrives.
+- Resumable upload sessions accept a large file as a series of
+  ``Content-Range`` chunks across requests. Session state is the partial
+  file plus a JSON sidecar under ``UPLOAD_SESSIONS_PATH``, so a client can
+  ask for the current offset and continue after a dropped connection. The
+  SHA-256 is updated as each chunk is appended; the partial file is only
+  re-read at the end when the chunks didn't all land on one worker process.
+"""
+import fcntl
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
+import uuid
+from typing import BinaryIO, List, Optional
+from flask import current_app
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+from app.storage import get_extension_for_mime_type, get_storage_path
+from app.usage import QuotaExceededError
+
+CHUNK_SIZE = 1024 * 1024
+
+# Bounds the decoder's buffer; file data is drained from it every chunk
+MAX_BUFFERED_BYTES = 4 * CHUNK_SIZE
+
+_EXTENSION_RE = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+
+class UploadError(Exception):
+    """An upload request that can't be accepted."""
+
+    def __init__(self, message: str, error_code: str = "UPLOAD_FAILED", status_code: int = 400):
+        self.message = message
+        self.error_code = error_code
+        self.status_code = status_code
+        super().__init__(self.message)
+
+
+class StoredUpload:
+    """A file written to storage, not yet recorded in the database."""
+
+    def __init__(self, name: str, mime_type: str, storage_path: str, size_bytes: int, sha256: str):
+        self.name = name
+        self.mime_type = mime_type
+        self.storage_path = storage_path
+        self.size_bytes = size_bytes
+        self.sha256 = sha256
+
+
+def _upload_target(user_id: str, dataroom_id: str, name: str, mime_type: str) -> str:
+    extension = os.path.splitext(name)[1].lower()
+    if not _EXTENSION_RE.match(extension):
+        extension = get_extension_for_mime_type(mime_type)
+    return get_storage_path(user_id, dataroom_id, f"{uuid.uuid4()}{extension}")
+
+
+def _guess_mime_type(name: str, declared: Optional[str]) -> str:
+    if declared and declared != "application/octet-stream":
+        return declared
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+def _clean_name(name: str) -> str:
+    # Browsers may send a full client path; keep the base name only
+    name = name.replace("\\", "/").rsplit("/", 1)[-1].strip()
+    return name[:500] or "upload"
+
+
+class _FileWriter:
+    """Writes one file to a temp path while hashing and counting it."""
+
+    def __init__(self, user_id: str, dataroom_id: str, name: str, mime_type: str):
+        self.name = _clean_name(name)
+        self.mime_type = _guess_mime_type(self.name, mime_type)
+        self.path = _upload_target(user_id, dataroom_id, self.name, self.mime_type)
+        self.tmp_path = f"{self.path}.part"
+        self.size = 0
+        self._hash = hashlib.sha256()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.tmp_path, "wb")
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+
+    def finish(self) -> StoredUpload:
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+        return StoredUpload(self.name, self.mime_type, self.path, self.size, self._hash.hexdigest())
+
+    def abort(self) -> None:
+        self._file.close()
+        remove_stored([self.tmp_path])
+
+
+def remove_stored(paths: List[str]) -> None:
+    """Best-effort removal of files written by a failed upload."""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def stream_multipart(
+    stream: BinaryIO,
+    boundary: str,
+    user_id: str,
+    dataroom_id: str,
+    quota_bytes: Optional[int] = None,
+    used_bytes: int = 0,
+) -> List[StoredUpload]:
+    """Stream every file part of a multipart body into storage.
+
+    With ``quota_bytes`` the upload is cut off as soon as the files written
+    so far would take the user over quota. On any error, files already
+    written are removed.
+    """
+    decoder = MultipartDecoder(boundary.encode("latin-1"), max_form_memory_size=MAX_BUFFERED_BYTES)
+    uploads: List[StoredUpload] = []
+    writer: Optional[_FileWriter] = None
+    total = 0
+
+    try:
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                chunk = stream.read(CHUNK_SIZE)
+                decoder.receive_data(chunk or None)
+            elif isinstance(event, File):
+                writer = _FileWriter(
+                    user_id, dataroom_id, event.filename, event.headers.get("Content-Type")
+                )
+            elif isinstance(event, Field):
+                # Plain form fields are ignored; their data events are skipped
+                writer = None
+            elif isinstance(event, Data):
+                if writer is None:
+                    continue
+                writer.write(event.data)
+                total += len(event.data)
+                if quota_bytes is not None and used_bytes + total > quota_bytes:
+                    raise QuotaExceededError(quota_bytes, used_bytes, total)
+                if not event.more_data:
+                    uploads.append(writer.finish())
+                    writer = None
+            elif isinstance(event, Epilogue):
+                break
+    except ValueError as e:
+        if writer is not None:
+            writer.abort()
+        remove_stored([u.storage_path for u in uploads])
+        raise UploadError(f"Malformed multipart body: {str(e)}", "VALIDATION_ERROR")
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        remove_stored([u.storage_path for u in uploads])
+        raise
+
+    return uploads
+
+
+# ----------------------------------------------------------------------
+# Resumable upload sessions
+
+
+def _sessions_dir() -> str:
+    return current_app.config.get("UPLOAD_SESSIONS_PATH") or os.path.join(
+        current_app.config["STORAGE_PATH"], ".uploads"
+    )
+
+
+def _session_paths(upload_id: str):
+    base = os.path.join(_sessions_dir(), upload_id)
+    return f"{base}.json", f"{base}.part"
+
+
+class _SessionDigests:
+    """Running SHA-256 of each session's partial file, in this worker process.
+
+    A hash object can't be stored in the JSON sidecar, so it lives here,
+    tagged with the offset it has hashed up to. A chunk appended by another
+    worker (or before a restart) leaves the tag behind the file, and the
+    digest is then recomputed from the file when the upload completes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._digests = {}
+
+    def take(self, upload_id: str, offset: int):
+        """Remove and return the hash of the first ``offset`` bytes, if tracked."""
+        with self._lock:
+            entry = self._digests.pop(upload_id, None)
+        if offset == 0:
+            return hashlib.sha256()
+        if entry is None or entry[0] != offset:
+            return None
+        return entry[1]
+
+    def put(self, upload_id: str, offset: int, digest) -> None:
+        with self._lock:
+            self._digests[upload_id] = (offset, digest)
+
+    def discard(self, upload_id: str) -> None:
+        with self._lock:
+            self._digests.pop(upload_id, None)
+
+
+def _session_digests() -> _SessionDigests:
+    digests = current_app.extensions.get("upload_session_digests")
+    if digests is None:
+        digests = current_app.extensions.setdefault("upload_session_digests", _SessionDigests())
+    return digests
+
+
+def create_session(
+    user_id: str, dataroom_id: str, name: str, mime_type: Optional[str], size: int
+) -> dict:
+    """Start a resumable upload of a file of ``size`` bytes."""
+    name = _clean_name(name)
+    session = {
+        "id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "dataroom_id": dataroom_id,
+        "name": name,
+        "mime_type": _guess_mime_type(name, mime_type),
+        "size": size,
+        "created_at": time.time(),
+    }
+    meta_path, part_path = _session_paths(session["id"])
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+    open(part_path, "wb").close()
+    with open(meta_path, "w") as f:
+        json.dump(session, f)
+    return session
+
+
+def load_session(upload_id: str, user_id: str, dataroom_id: str) -> Optional[dict]:
+    """Load a session owned by the user in the given dataroom."""
+    # Session ids are uuid4 hex strings; reject anything else
+    if len(upload_id) != 32 or not all(c in "0123456789abcdef" for c in upload_id):
+        return None
+    meta_path, _ = _session_paths(upload_id)
+    try:
+        with open(meta_path) as f:
+            session = json.load(f)
+    except FileNotFoundError:
+        return None
+    if session["user_id"] != user_id or session["dataroom_id"] != dataroom_id:
+        return None
+    return session
+
+
+def session_offset(session: dict) -> int:
+    """Bytes received so far."""
+    _, part_path = _session_paths(session["id"])
+    try:
+        return os.path.getsize(part_path)
+    except FileNotFoundError:
+        return 0
+
+
+def append_chunk(session: dict, start: int, length: int, stream: BinaryIO) -> int:
+    """Append ``length`` bytes at ``start`` from ``stream``; returns the new offset.
+
+    ``start`` must equal the current offset, so a retried chunk that was
+    already stored is rejected (the client resumes from the reported
+    offset) rather than duplicated.
+    """
+    _, part_path = _session_paths(session["id"])
+    if length <= 0 and session["size"] > 0:
+        raise UploadError("Empty chunk", "VALIDATION_ERROR")
+    if start + length > session["size"]:
+        raise UploadError("Chunk extends past the declared file size", "VALIDATION_ERROR")
+
+    with open(part_path, "ab") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another chunk is being written", "UPLOAD_BUSY", 409)
+
+        offset = f.tell()
+        if start != offset:
+            raise UploadError(f"Expected chunk at offset {offset}", "OFFSET_MISMATCH", 409)
+
+        digests = _session_digests()
+        digest = digests.take(session["id"], offset)
+        remaining = length
+        while remaining > 0:
+            chunk = stream.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            f.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
+            remaining -= len(chunk)
+        f.flush()
+        offset = f.tell()
+        if digest is not None:
+            digests.put(session["id"], offset, digest)
+        return offset
+
+
+def finish_session(session: dict) -> StoredUpload:
+    """Move a completed upload into storage and drop the session."""
+    meta_path, part_path = _session_paths(session["id"])
+    digest = _session_digests().take(session["id"], os.path.getsize(part_path))
+    if digest is None:
+        # Some chunks were appended by another worker process
+        digest = hashlib.sha256()
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+
+    path = _upload_target(
+        session["user_id"], session["dataroom_id"], session["name"], session["mime_type"]
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(part_path, path)
+    remove_stored([meta_path])
+    return StoredUpload(session["name"], session["mime_type"], path, session["size"], digest.hexdigest())
+
+
+def delete_session(session: dict) -> None:
+    """Abort an upload, removing its partial file."""
+    _session_digests().discard(session["id"])
+    remove_stored(list(_session_paths(session["id"])))
+
+
+def cleanup_sessions(max_age_seconds: int) -> int:
+    """Remove sessions older than ``max_age_seconds``. Returns the number removed."""
+    directory = _sessions_dir()
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for filename in os.listdir(directory):
+        if not filename.endswith(".json"):
+            continue
+        meta_path = os.path.join(directory, filename)
+        try:
+            with open(meta_path) as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if session.get("created_at", 0) < cutoff:
+            delete_session(session)
+            removed += 1
+    return removed
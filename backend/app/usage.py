@@ -0,0 +1,210 @@
+"""Per-user and per-dataroom storage usage counters and quota checks.
+
+Counters on ``users`` and ``datarooms`` are updated with relative
+``SET x = x + n`` statements in the same transaction as the file row
+change, so concurrent imports never lose an update and reading usage is a
+single row lookup. Dataroom counters are logical (every file counts);
+user usage counts each stored file once, so cloned rooms are free.
+``flask reconcile-usage`` recomputes them from ``files`` to repair any
+drift (e.g. files removed outside the API).
+"""
+from typing import Optional
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import Dataroom, File, User
+
+
+class QuotaExceededError(Exception):
+    """Raised when an import would take a user over their storage quota."""
+
+    def __init__(self, quota_bytes: int, used_bytes: int, requested_bytes: int):
+        self.quota_bytes = quota_bytes
+        self.used_bytes = used_bytes
+        self.requested_bytes = requested_bytes
+        self.message = (
+            f"Storage quota exceeded: {requested_bytes} bytes requested, "
+            f"{max(quota_bytes - used_bytes, 0)} of {quota_bytes} bytes available"
+        )
+        super().__init__(self.message)
+
+
+def get_user_quota(user: User) -> Optional[int]:
+    """The user's storage quota in bytes, or None if unlimited."""
+    if user.storage_quota_bytes is not None:
+        return user.storage_quota_bytes
+    return current_app.config["USER_QUOTA_BYTES"] or None
+
+
+def usage_dict(user: User) -> dict:
+    """Usage summary for API responses."""
+    return {
+        "storage_used_bytes": user.storage_used_bytes,
+        "storage_quota_bytes": get_user_quota(user),
+    }
+
+
+def check_quota(quota_bytes: Optional[int], used_bytes: int, requested_bytes: int) -> None:
+    """Fail fast (before downloading) if a file clearly won't fit."""
+    if quota_bytes is not None and used_bytes + requested_bytes > quota_bytes:
+        raise QuotaExceededError(quota_bytes, used_bytes, requested_bytes)
+
+
+def record_file_added(
+    user_id: str,
+    dataroom_id: str,
+    size_bytes: int,
+    quota_bytes: Optional[int] = None,
+    count: int = 1,
+) -> None:
+    """Count newly imported files (``count`` of them, ``size_bytes`` in total).
+
+    With ``quota_bytes`` the user update is conditional on staying within
+    the quota, which makes the check race-free across workers. Call before
+    committing the file rows; on QuotaExceededError roll back.
+    """
+    query = db.update(User).where(User.id == user_id)
+    if quota_bytes is not None:
+        query = query.where(User.storage_used_bytes + size_bytes <= quota_bytes)
+    result = db.session.execute(
+        query.values(storage_used_bytes=User.storage_used_bytes + size_bytes),
+        execution_options={"synchronize_session": False},
+    )
+    if result.rowcount == 0:
+        used = db.session.scalar(db.select(User.storage_used_bytes).where(User.id == user_id))
+        raise QuotaExceededError(quota_bytes, used or 0, size_bytes)
+
+    db.session.execute(
+        db.update(Dataroom)
+        .where(Dataroom.id == dataroom_id)
+        .values(
+            file_count=Dataroom.file_count + count,
+            storage_used_bytes=Dataroom.storage_used_bytes + size_bytes,
+            version=Dataroom.version + 1,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def record_files_removed(
+    user_id: str,
+    dataroom_id: str,
+    size_bytes: int,
+    count: int = 1,
+    released_bytes: Optional[int] = None,
+) -> None:
+    """Release the usage of files that are no longer imported.
+
+    The dataroom loses ``size_bytes``; the user only loses ``released_bytes``
+    (default: all of it), since stored files shared with a clone still
+    occupy disk.
+    """
+    if released_bytes is None:
+        released_bytes = size_bytes
+    if released_bytes:
+        release_user_bytes(user_id, released_bytes)
+    db.session.execute(
+        db.update(Dataroom)
+        .where(Dataroom.id == dataroom_id)
+        .values(
+            file_count=Dataroom.file_count - count,
+            storage_used_bytes=Dataroom.storage_used_bytes - size_bytes,
+            version=Dataroom.version + 1,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def record_files_moved(
+    from_dataroom_id: str, to_dataroom_id: str, size_bytes: int, count: int
+) -> None:
+    """Move file counters between datarooms; the user's usage is unchanged."""
+    for dataroom_id, sign in ((from_dataroom_id, -1), (to_dataroom_id, 1)):
+        db.session.execute(
+            db.update(Dataroom)
+            .where(Dataroom.id == dataroom_id)
+            .values(
+                file_count=Dataroom.file_count + sign * count,
+                storage_used_bytes=Dataroom.storage_used_bytes + sign * size_bytes,
+                version=Dataroom.version + 1,
+            ),
+            execution_options={"synchronize_session": False},
+        )
+
+
+def release_user_bytes(user_id: str, released_bytes: int) -> None:
+    """Release stored bytes from a user's usage (e.g. after deleting a dataroom)."""
+    db.session.execute(
+        db.update(User)
+        .where(User.id == user_id)
+        .values(storage_used_bytes=User.storage_used_bytes - released_bytes),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def reconcile_usage() -> int:
+    """Recompute every counter from the files table. Returns rows corrected.
+
+    Mismatches are found with one query per table, then each is
+    fixed with a correlated UPDATE so the value written is recomputed at
+    write time rather than copied from the (possibly stale) scan.
+    """
+    imported = File.status == "imported"
+
+    room_count = (
+        db.select(func.count()).where(imported, File.dataroom_id == Dataroom.id)
+        .correlate(Dataroom).scalar_subquery()
+    )
+    room_bytes = (
+        db.select(func.coalesce(func.sum(File.size_bytes), 0))
+        .where(imported, File.dataroom_id == Dataroom.id)
+        .correlate(Dataroom).scalar_subquery()
+    )
+    # A user's usage counts each stored file once, however many clones share it
+    other = aliased(File)
+    first_reference = ~(
+        db.select(other.id)
+        .where(
+            other.storage_path == File.storage_path,
+            other.status == "imported",
+            other.id < File.id,
+        )
+        .exists()
+    )
+    user_bytes = (
+        db.select(func.coalesce(func.sum(File.size_bytes), 0))
+        .where(imported, File.user_id == User.id, first_reference)
+        .correlate(User).scalar_subquery()
+    )
+
+    dataroom_ids = db.session.scalars(
+        db.select(Dataroom.id).where(
+            (Dataroom.file_count != room_count) | (Dataroom.storage_used_bytes != room_bytes)
+        )
+    ).all()
+    for dataroom_id in dataroom_ids:
+        db.session.execute(
+            db.update(Dataroom)
+            .where(Dataroom.id == dataroom_id)
+            .values(
+                file_count=room_count,
+                storage_used_bytes=room_bytes,
+                version=Dataroom.version + 1,
+            ),
+            execution_options={"synchronize_session": False},
+        )
+
+    user_ids = db.session.scalars(
+        db.select(User.id).where(User.storage_used_bytes != user_bytes)
+    ).all()
+    for user_id in user_ids:
+        db.session.execute(
+            db.update(User)
+            .where(User.id == user_id)
+            .values(storage_used_bytes=user_bytes),
+            execution_options={"synchronize_session": False},
+        )
+
+    db.session.commit()
+    return len(dataroom_ids) + len(user_ids)
@@ -0,0 +1,109 @@
+"""Shared helpers for the benchmark scripts."""
+import json
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterable, List
+
+import requests
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int = 0
+    errors: int = 0
+    duration_s: float = 0.0
+    latencies_ms: List[float] = field(default_factory=list, repr=False)
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.duration_s if self.duration_s else 0.0
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self) -> dict:
+        data = asdict(self)
+        data.pop("latencies_ms")
+        data.update({
+            "throughput_rps": round(self.throughput, 2),
+            "p50_ms": round(self.percentile(50), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        })
+        return data
+
+
+_local = threading.local()
+
+
+def session() -> requests.Session:
+    """A requests session per client thread (keeps connections alive)."""
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def run_load(
+    name: str,
+    call: Callable[[object], requests.Response],
+    items: Iterable,
+    concurrency: int = 1,
+    ok_statuses=(200, 201),
+) -> ScenarioResult:
+    """Run ``call(item)`` for every item with N concurrent client threads."""
+    result = ScenarioResult(name)
+    lock = threading.Lock()
+
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            response = call(item)
+            # Drain the body so streaming responses are fully measured
+            _ = response.content
+            ok = response.status_code in ok_statuses
+        except requests.RequestException:
+            ok = False
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            result.requests += 1
+            result.latencies_ms.append(elapsed)
+            if not ok:
+                result.errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, items))
+    result.duration_s = time.perf_counter() - start
+    return result
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def print_report(results: List[ScenarioResult], as_json: bool = False) -> None:
+    summaries = [r.summary() for r in results]
+    if as_json:
+        print(json.dumps(summaries, indent=2))
+        return
+
+    header = f"{'scenario':<24}{'reqs':>7}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for s in summaries:
+        print(
+            f"{s['name']:<24}{s['requests']:>7}{s['errors']:>8}{s['throughput_rps']:>10}"
+            f"{s['p50_ms']:>10}{s['p99_ms']:>10}{s['peak_rss_mb']:>9}"
+        )
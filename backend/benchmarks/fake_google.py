@@ -0,0 +1,256 @@
+"""Local fake of the Google OAuth, userinfo, certs and Drive v3 endpoints.
+
+Serves a synthetic Drive with a configurable number of files, file size,
+per-request latency and shared download bandwidth, so benchmarks exercise the real HTTP code paths in
+``app.google_client`` without touching googleapis.com.
+
+Run standalone with ``python -m benchmarks.fake_google --port 8765`` and point
+the backend at it with ``GOOGLE_TOKEN_URL``, ``GOOGLE_USERINFO_URL``,
+``GOOGLE_CERTS_URL`` and ``GOOGLE_DRIVE_API`` (see ``FakeGoogle.env()``).
+With ``cryptography`` installed, token responses carry an ``id_token``
+signed by a key generated at startup and published at ``/certs``.
+"""
+import argparse
+import json
+import threading
+import time
+import jwt
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+CHUNK_SIZE = 64 * 1024
+SIGNING_KEY_ID = "fake-google-key"
+WORKSPACE_MIME = "application/vnd.google-apps.document"
+
+
+class FakeGoogle:
+    """A fake Google API server with a synthetic Drive."""
+
+    def __init__(
+        self,
+        file_count: int = 1000,
+        file_size: int = 256 * 1024,
+        latency_ms: float = 0,
+        workspace_every: int = 10,
+        workspace_size: int = None,
+        bandwidth: int = 0,
+    ):
+        self.file_count = file_count
+        self.file_size = file_size
+        self.latency = latency_ms / 1000
+        self.workspace_every = workspace_every
+        # Size of Workspace exports (defaults to file_size)
+        self.workspace_size = file_size if workspace_size is None else workspace_size
+        # Bytes/sec shared by all downloads, like one uplink (0 = unlimited)
+        self.bandwidth = bandwidth
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._link_free_at = 0.0
+        self._server = None
+        self._signing_key = self._generate_signing_key()
+        self.app = self._build_app()
+
+    # ------------------------------------------------------------------
+    # Synthetic Drive
+
+    def file_ids(self) -> list:
+        return [f"fake-{i:07d}" for i in range(self.file_count)]
+
+    def _metadata(self, index: int) -> dict:
+        is_workspace = self.workspace_every and index % self.workspace_every == 0
+        return {
+            "id": f"fake-{index:07d}",
+            "name": f"Document {index}" if is_workspace else f"file-{index}.pdf",
+            "mimeType": WORKSPACE_MIME if is_workspace else "application/pdf",
+            "size": None if is_workspace else str(self.file_size),
+            "version": "1",
+            "modifiedTime": "2024-01-01T00:00:00.000Z",
+            "webViewLink": f"https://drive.example/file/{index}",
+            "iconLink": None,
+        }
+
+    def _index(self, file_id: str):
+        try:
+            index = int(file_id.split("-", 1)[1])
+        except (IndexError, ValueError):
+            return None
+        return index if 0 <= index < self.file_count else None
+
+    def _throttle(self, n: int) -> None:
+        # Chunks from all downloads queue for the one link, first come first served
+        if not self.bandwidth:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._link_free_at = max(self._link_free_at, now) + n / self.bandwidth
+            delay = self._link_free_at - now
+        time.sleep(delay)
+
+    def _content(self, size: int) -> Response:
+        def generate():
+            remaining = size
+            chunk = b"\x00" * CHUNK_SIZE
+            while remaining > 0:
+                n = min(CHUNK_SIZE, remaining)
+                self._throttle(n)
+                yield chunk[:n]
+                remaining -= CHUNK_SIZE
+
+        return Response(
+            generate(),
+            mimetype="application/octet-stream",
+            headers={"Content-Length": str(size)},
+        )
+
+    # ------------------------------------------------------------------
+    # ID tokens
+
+    @staticmethod
+    def _generate_signing_key():
+        if not jwt.algorithms.has_crypto:
+            return None
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def _jwks(self) -> dict:
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self._signing_key.public_key()))
+        jwk.update(kid=SIGNING_KEY_ID, use="sig", alg="RS256")
+        return {"keys": [jwk]}
+
+    def _id_token(self, client_id: str) -> str:
+        now = int(time.time())
+        claims = {
+            "iss": "https://accounts.google.com",
+            "aud": client_id,
+            "sub": "fake-google-user",
+            "email": "bench@example.com",
+            "email_verified": True,
+            "name": "Benchmark User",
+            "iat": now,
+            "exp": now + 3600,
+        }
+        return jwt.encode(
+            claims, self._signing_key, algorithm="RS256", headers={"kid": SIGNING_KEY_ID}
+        )
+
+    # ------------------------------------------------------------------
+    # HTTP endpoints
+
+    def _build_app(self) -> Flask:
+        app = Flask("fake_google")
+
+        @app.before_request
+        def simulate_latency():
+            with self._lock:
+                self.request_count += 1
+            if self.latency:
+                time.sleep(self.latency)
+
+        @app.route("/token", methods=["POST"])
+        def token():
+            result = {
+                "access_token": "fake-access-token",
+                "refresh_token": "fake-refresh-token",
+                "expires_in": 3600,
+                "token_type": "Bearer",
+            }
+            is_code_exchange = request.form.get("grant_type") == "authorization_code"
+            if self._signing_key is not None and is_code_exchange:
+                result["id_token"] = self._id_token(request.form.get("client_id", ""))
+            return jsonify(result)
+
+        @app.route("/certs")
+        def certs():
+            if self._signing_key is None:
+                return jsonify({"keys": []})
+            response = jsonify(self._jwks())
+            response.headers["Cache-Control"] = "public, max-age=21600, must-revalidate"
+            return response
+
+        @app.route("/userinfo")
+        def userinfo():
+            return jsonify({
+                "sub": "fake-google-user",
+                "email": "bench@example.com",
+                "name": "Benchmark User",
+            })
+
+        @app.route("/drive/v3/files")
+        def list_files():
+            page_size = min(request.args.get("pageSize", 100, type=int), 1000)
+            start = request.args.get("pageToken", 0, type=int)
+            end = min(start + page_size, self.file_count)
+            result = {"files": [self._metadata(i) for i in range(start, end)]}
+            if end < self.file_count:
+                result["nextPageToken"] = str(end)
+            return jsonify(result)
+
+        @app.route("/drive/v3/files/<file_id>")
+        def get_file(file_id):
+            index = self._index(file_id)
+            if index is None:
+                return jsonify({"error": {"code": 404, "message": "File not found"}}), 404
+            if request.args.get("alt") == "media":
+                return self._content(self.file_size)
+            return jsonify(self._metadata(index))
+
+        @app.route("/drive/v3/files/<file_id>/export")
+        def export_file(file_id):
+            if self._index(file_id) is None:
+                return jsonify({"error": {"code": 404, "message": "File not found"}}), 404
+            return self._content(self.workspace_size)
+
+        @app.route("/drive/v3/changes/startPageToken")
+        def start_page_token():
+            return jsonify({"startPageToken": "1"})
+
+        @app.route("/drive/v3/changes")
+        def changes():
+            return jsonify({"changes": [], "newStartPageToken": request.args.get("pageToken", "1")})
+
+        return app
+
+    # ------------------------------------------------------------------
+    # Server lifecycle
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def env(self) -> dict:
+        """Environment variables pointing the backend at this server."""
+        return {
+            "GOOGLE_TOKEN_URL": f"{self.base_url}/token",
+            "GOOGLE_USERINFO_URL": f"{self.base_url}/userinfo",
+            "GOOGLE_CERTS_URL": f"{self.base_url}/certs",
+            "GOOGLE_DRIVE_API": f"{self.base_url}/drive/v3",
+        }
+
+    def start(self, port: int = 0) -> "FakeGoogle":
+        self._server = make_server("127.0.0.1", port, self.app, threaded=True)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--file-size", type=int, default=256 * 1024)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    fake = FakeGoogle(args.files, args.file_size, args.latency_ms)
+    fake._server = make_server("127.0.0.1", args.port, fake.app, threaded=True)
+    for key, value in fake.env().items():
+        print(f"{key}={value}")
+    fake._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Latency of small interactive imports while another user runs a big batch.
+
+One user imports a folder of large files at high concurrency while a second
+user imports small files (Workspace exports) one at a time. Downloads share
+one simulated uplink (``--bandwidth``), so without scheduling every small
+import competes with the whole batch for bandwidth; with the import
+scheduler (``IMPORT_SLOTS``) it takes the small-file lane and one of the
+reserved slots.
+
+Usage (from the backend directory)::
+
+    python -m benchmarks.import_fairness
+    python -m benchmarks.import_fairness --batch 120 --batch-concurrency 40 --bandwidth 20000000
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from werkzeug.serving import make_server
+
+from benchmarks.common import print_report, run_load, session
+from benchmarks.fake_google import FakeGoogle
+from benchmarks.run import Bench
+
+
+def _second_user(app) -> tuple:
+    """Seed another user with a dataroom; returns (headers, dataroom_id)."""
+    from app import db
+    from app.auth import create_jwt_token
+    from app.models import Dataroom, OAuthAccount, User
+
+    with app.app_context():
+        user = User(email="interactive@example.com", name="Interactive User")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(OAuthAccount(
+            user_id=user.id,
+            provider="google",
+            provider_account_id="fake-google-user-2",
+            access_token="fake-access-token",
+            refresh_token="fake-refresh-token",
+            expires_at=datetime.now(timezone.utc) + timedelta(days=1),
+        ))
+        dataroom = Dataroom(user_id=user.id, name="Interactive room")
+        db.session.add(dataroom)
+        db.session.commit()
+        return {"Authorization": f"Bearer {create_jwt_token(user.id)}"}, dataroom.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import fairness benchmark")
+    parser.add_argument("--batch", type=int, default=60, help="large files in the batch import")
+    parser.add_argument("--batch-concurrency", type=int, default=30)
+    parser.add_argument("--small", type=int, default=15, help="sequential small imports")
+    parser.add_argument("--file-size", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--small-size", type=int, default=64 * 1024)
+    parser.add_argument("--bandwidth", type=int, default=40 * 1024 * 1024, help="shared bytes/sec")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    workdir = tempfile.mkdtemp(prefix="dataroom-fairness-")
+    # Every 10th file is a Workspace doc (exported at --small-size)
+    fake = FakeGoogle(
+        file_count=max(1000, (args.batch + args.small) * 10 * 2),
+        file_size=args.file_size,
+        latency_ms=args.latency_ms,
+        workspace_size=args.small_size,
+        bandwidth=args.bandwidth,
+    ).start()
+
+    os.environ.update(fake.env())
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["STORAGE_PATH"] = os.path.join(workdir, "data")
+    os.environ.setdefault("SLOW_REQUEST_THRESHOLD_MS", "0")
+    os.environ.setdefault("TEXT_EXTRACTION_ENABLED", "false")
+    os.environ.setdefault("THUMBNAILS_EAGER", "false")
+
+    from app import create_app
+
+    app = create_app()
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    bench = Bench(app, f"http://127.0.0.1:{server.server_port}")
+    bench.seed()
+    small_headers, small_room = _second_user(app)
+
+    ids = fake.file_ids()
+    large_ids = iter(i for n, i in enumerate(ids) if n % 10)
+    small_ids = iter(i for n, i in enumerate(ids) if n % 10 == 0)
+
+    def import_small(google_file_id):
+        return session().post(
+            bench.url("/api/files/import"),
+            headers=small_headers,
+            json={"dataroom_id": small_room, "google_file_id": google_file_id},
+            timeout=300,
+        )
+
+    results = []
+    try:
+        for label, slots in (("unscheduled", 0), ("scheduled", app.config["IMPORT_SLOTS"] or 8)):
+            app.config["IMPORT_SLOTS"] = slots
+            app.extensions.pop("import_scheduler", None)
+
+            batch_files = [next(large_ids) for _ in range(args.batch)]
+            batch = {}
+            batch_thread = threading.Thread(target=lambda: batch.update(result=run_load(
+                f"{label}: batch", bench._import, batch_files, args.batch_concurrency
+            )))
+            batch_thread.start()
+            time.sleep(1)  # let the batch saturate the link
+            small_files = [next(small_ids) for _ in range(args.small)]
+            results.append(run_load(f"{label}: small", import_small, small_files, 1))
+            batch_thread.join()
+            results.append(batch["result"])
+    finally:
+        server.shutdown()
+        fake.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,5 +13,5 @@ echo "Creating data directory..."
 mkdir -p data
 
 echo "Build complete!"
-echo "Database will be initialized on first request."
+echo "Database migrations are applied by render_start.py before gunicorn starts."
 
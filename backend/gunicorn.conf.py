@@ -0,0 +1,54 @@
+"""Gunicorn configuration (loaded automatically from the backend directory)."""
+import os
+import shutil
+import tempfile
+
+# Worker model. The Drive proxy routes spend almost all their time waiting
+# on googleapis.com, so "gevent" lets one worker serve hundreds of requests
+# concurrently instead of one, and holds import progress streams (SSE)
+# without tying up a worker each.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "500"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "180"))
+
+if worker_class == "gevent":
+    # Patch before the app (requests/ssl, psycopg, threading) is preloaded in
+    # the master; psycopg 3 then waits on sockets cooperatively.
+    from gevent import monkey
+
+    monkey.patch_all()
+
+# Aggregate Prometheus metrics across workers. This must be set, and stale
+# files from a previous master dropped, before the app (and prometheus_client)
+# is imported - which happens in the master right after this file is loaded
+# when preload_app is on.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "dataroom-metrics")
+)
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+# Import the app once in the master and fork workers from it: workers boot
+# instantly and share the imported code pages copy-on-write.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    # Never share pooled DB connections opened in the master with a worker
+    from app import db
+    from app.main import app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+        router = app.extensions.get("db_replicas")
+        if router is not None:
+            for replica in router.replicas:
+                replica.engine.dispose(close=False)
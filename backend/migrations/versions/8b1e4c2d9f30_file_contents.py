@@ -0,0 +1,37 @@
+"""File contents for full-text search
+
+Revision ID: 8b1e4c2d9f30
+Revises: 3027e64db378
+Create Date: 2026-10-19 09:12:44.201733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e4c2d9f30'
+down_revision = '3027e64db378'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('file_contents',
+    sa.Column('file_id', sa.String(length=36), nullable=False),
+    sa.Column('text', sa.Text(), nullable=True),
+    sa.Column('search_vector', sa.Text().with_variant(postgresql.TSVECTOR(), 'postgresql'), nullable=True),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.Column('extracted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['file_id'], ['files.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('file_id')
+    )
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index('ix_file_contents_search_vector', 'file_contents', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_file_contents_search_vector', table_name='file_contents', postgresql_using='gin')
+    op.drop_table('file_contents')
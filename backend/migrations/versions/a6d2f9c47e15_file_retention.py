@@ -0,0 +1,63 @@
+"""Deletion timestamps, purge index and archive table for file retention
+
+Revision ID: a6d2f9c47e15
+Revises: f3b8d1c6a920
+Create Date: 2026-10-19 19:05:41.228017
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d2f9c47e15'
+down_revision = 'f3b8d1c6a920'
+branch_labels = None
+depends_on = None
+
+PURGEABLE = "status IN ('deleted', 'failed')"
+
+
+def upgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+    # Rows deleted before this revision start their retention period now
+    op.execute(f"UPDATE files SET deleted_at = CURRENT_TIMESTAMP WHERE {PURGEABLE}")
+
+    op.create_index(
+        'ix_files_purgeable', 'files', ['id'], unique=False,
+        postgresql_where=sa.text(PURGEABLE), sqlite_where=sa.text(PURGEABLE),
+    )
+
+    op.create_table(
+        'files_archive',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('dataroom_id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('google_file_id', sa.String(length=255), nullable=True),
+        sa.Column('name', sa.String(length=500), nullable=False),
+        sa.Column('mime_type', sa.String(length=255), nullable=True),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('storage_path', sa.String(length=1000), nullable=True),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('original_url', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('imported_at', sa.DateTime(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    with op.batch_alter_table('files_archive', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_files_archive_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('files_archive', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_files_archive_user_id'))
+
+    op.drop_table('files_archive')
+    op.drop_index('ix_files_purgeable', table_name='files')
+
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
@@ -0,0 +1,55 @@
+"""Storage usage counters and per-user quotas
+
+Revision ID: c5d2a7e19b84
+Revises: 8b1e4c2d9f30
+Create Date: 2026-10-19 14:03:27.518210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2a7e19b84'
+down_revision = '8b1e4c2d9f30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('storage_used_bytes', sa.BigInteger(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('storage_quota_bytes', sa.BigInteger(), nullable=True))
+
+    with op.batch_alter_table('datarooms', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('storage_used_bytes', sa.BigInteger(), server_default='0', nullable=False))
+
+    # Backfill from existing imported files
+    op.execute("""
+        UPDATE datarooms SET
+            file_count = (
+                SELECT COUNT(*) FROM files
+                WHERE files.dataroom_id = datarooms.id AND files.status = 'imported'
+            ),
+            storage_used_bytes = (
+                SELECT COALESCE(SUM(size_bytes), 0) FROM files
+                WHERE files.dataroom_id = datarooms.id AND files.status = 'imported'
+            )
+    """)
+    op.execute("""
+        UPDATE users SET storage_used_bytes = (
+            SELECT COALESCE(SUM(size_bytes), 0) FROM files
+            WHERE files.user_id = users.id AND files.status = 'imported'
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('datarooms', schema=None) as batch_op:
+        batch_op.drop_column('storage_used_bytes')
+        batch_op.drop_column('file_count')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('storage_quota_bytes')
+        batch_op.drop_column('storage_used_bytes')
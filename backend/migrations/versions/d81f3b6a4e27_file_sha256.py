@@ -0,0 +1,26 @@
+"""Content hash for uploaded files
+
+Revision ID: d81f3b6a4e27
+Revises: c5d2a7e19b84
+Create Date: 2026-10-19 16:40:11.902455
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3b6a4e27'
+down_revision = 'c5d2a7e19b84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sha256', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_column('sha256')
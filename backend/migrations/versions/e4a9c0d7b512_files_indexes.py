@@ -0,0 +1,28 @@
+"""Index files by dataroom and storage path
+
+Revision ID: e4a9c0d7b512
+Revises: d81f3b6a4e27
+Create Date: 2026-10-19 18:22:05.310948
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9c0d7b512'
+down_revision = 'd81f3b6a4e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_files_dataroom_id'), ['dataroom_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_files_storage_path'), ['storage_path'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_files_storage_path'))
+        batch_op.drop_index(batch_op.f('ix_files_dataroom_id'))
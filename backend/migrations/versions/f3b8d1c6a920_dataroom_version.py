@@ -0,0 +1,26 @@
+"""Dataroom change counter for listing ETags
+
+Revision ID: f3b8d1c6a920
+Revises: e4a9c0d7b512
+Create Date: 2026-10-19 18:42:09.351774
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d1c6a920'
+down_revision = 'e4a9c0d7b512'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('datarooms', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('datarooms', schema=None) as batch_op:
+        batch_op.drop_column('version')
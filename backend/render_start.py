@@ -1,5 +1,8 @@
 """
-Render startup script - initializes database on first run
+Render deploy script - applies Alembic migrations once per deploy.
+
+Run before starting gunicorn (see render.yaml / Procfile); web workers never
+create or inspect tables themselves.
 """
 import os
 import sys
@@ -7,12 +10,23 @@ import sys
 # Add the backend directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import create_app, db
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect
+
+from app import create_app, db, init_migrate
+
+# First migration; databases created by the old db.create_all() startup
+# hook already have this schema but no alembic_version table.
+INITIAL_REVISION = "3027e64db378"
 
 app = create_app()
+init_migrate(app)
 
 with app.app_context():
-    # Create all tables
-    db.create_all()
-    print("Database tables created!")
+    tables = inspect(db.engine).get_table_names()
+    if "users" in tables and "alembic_version" not in tables:
+        stamp(revision=INITIAL_REVISION)
+        print(f"Existing schema stamped at {INITIAL_REVISION}")
 
+    upgrade()
+    print("Database migrations applied!")
@@ -0,0 +1,163 @@
+"""Local verification of Google ID tokens against a generated key set."""
+import os
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/test.db")
+os.environ.setdefault("STORAGE_PATH", os.path.join(_tmp, "data"))
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from app import create_app, id_tokens
+from app.id_tokens import IdTokenError, get_google_identity, verify_id_token
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+class FakeCerts:
+    """Stands in for get_google_certs(): serves a JWKS of the given keys."""
+
+    def __init__(self):
+        self.keys = {}
+        self.fetches = 0
+
+    def add_key(self, kid: str):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.keys[kid] = key
+        return key
+
+    def __call__(self):
+        self.fetches += 1
+        jwks = {"keys": []}
+        for kid, key in self.keys.items():
+            jwk = jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key(), as_dict=True)
+            jwks["keys"].append({**jwk, "kid": kid, "alg": "RS256", "use": "sig"})
+        return FakeResponse(jwks)
+
+
+class FakeResponse:
+    def __init__(self, payload: dict):
+        self._payload = payload
+        self.headers = {"Cache-Control": "public, max-age=3600"}
+
+    def json(self):
+        return self._payload
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def make_token(key, kid: str, **overrides) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234567890",
+        "email": "alice@example.com",
+        "email_verified": True,
+        "name": "Alice",
+        "iat": now,
+        "exp": now + 3600,
+        **overrides,
+    }
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update(GOOGLE_CLIENT_ID=CLIENT_ID, GOOGLE_ID_TOKEN_VERIFY=True)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def certs(monkeypatch):
+    certs = FakeCerts()
+    monkeypatch.setattr(id_tokens, "get_google_certs", certs)
+    return certs
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(id_tokens.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def test_valid_token(app, certs, clock):
+    key = certs.add_key("k1")
+    claims = verify_id_token(make_token(key, "k1"), CLIENT_ID)
+    assert claims["sub"] == "1234567890"
+    assert claims["email"] == "alice@example.com"
+
+
+def test_keys_are_cached(app, certs, clock):
+    key = certs.add_key("k1")
+    for _ in range(3):
+        verify_id_token(make_token(key, "k1"), CLIENT_ID)
+    assert certs.fetches == 1
+
+
+def test_bad_signature(app, certs, clock):
+    certs.add_key("k1")
+    forged = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(IdTokenError):
+        verify_id_token(make_token(forged, "k1"), CLIENT_ID)
+
+
+def test_expired(app, certs, clock):
+    key = certs.add_key("k1")
+    past = int(time.time()) - 7200
+    with pytest.raises(IdTokenError):
+        verify_id_token(make_token(key, "k1", iat=past, exp=past + 600), CLIENT_ID)
+
+
+def test_wrong_audience(app, certs, clock):
+    key = certs.add_key("k1")
+    with pytest.raises(IdTokenError):
+        verify_id_token(make_token(key, "k1", aud="someone-else"), CLIENT_ID)
+
+
+def test_wrong_issuer(app, certs, clock):
+    key = certs.add_key("k1")
+    with pytest.raises(IdTokenError):
+        verify_id_token(make_token(key, "k1", iss="https://evil.example.com"), CLIENT_ID)
+
+
+def test_key_rotation_refreshes_keys(app, certs, clock):
+    old_key = certs.add_key("k1")
+    verify_id_token(make_token(old_key, "k1"), CLIENT_ID)
+
+    new_key = certs.add_key("k2")
+    # An unknown kid right after a fetch doesn't hammer the certs endpoint
+    with pytest.raises(IdTokenError):
+        verify_id_token(make_token(new_key, "k2"), CLIENT_ID)
+    assert certs.fetches == 1
+
+    clock.now += id_tokens.MIN_REFRESH_SECONDS
+    assert verify_id_token(make_token(new_key, "k2"), CLIENT_ID)["sub"] == "1234567890"
+    assert certs.fetches == 2
+
+
+def test_identity_from_verified_token(app, certs, clock, monkeypatch):
+    key = certs.add_key("k1")
+    monkeypatch.setattr(id_tokens, "get_user_info", pytest.fail)
+    identity = get_google_identity({"access_token": "at", "id_token": make_token(key, "k1")})
+    assert identity["email"] == "alice@example.com"
+
+
+@pytest.mark.parametrize("overrides", [{"email_verified": False}, {"aud": "someone-else"}])
+def test_identity_falls_back_to_userinfo(app, certs, clock, monkeypatch, overrides):
+    key = certs.add_key("k1")
+    userinfo = {"sub": "1234567890", "email": "alice@example.com", "name": "Alice"}
+    monkeypatch.setattr(id_tokens, "get_user_info", lambda access_token: userinfo)
+    token = make_token(key, "k1", **overrides)
+    assert get_google_identity({"access_token": "at", "id_token": token}) is userinfo
@@ -1,5 +1,5 @@
 import axios, { AxiosError } from 'axios';
-import type { User, Dataroom, File, DriveFile, ApiError } from '../types';
+import type { User, Usage, Dataroom, File, DriveFile, ImportEvent, ApiError } from '../types';
 
 const API_URL = import.meta.env.VITE_BACKEND_URL || 'http://localhost:5000';
 
@@ -39,7 +39,7 @@ api.interceptors.response.use(
 
 // Auth API
 export const authApi = {
-  getMe: async (): Promise<{ user: User; google_connected: boolean }> => {
+  getMe: async (): Promise<{ user: User; google_connected: boolean; usage: Usage }> => {
     const response = await api.get('/auth/me');
     return response.data;
   },
@@ -80,10 +80,22 @@ export const dataroomsApi = {
     await api.delete(`/api/datarooms/${id}`);
   },
 
+  clone: async (id: string, data?: { name?: string; file_ids?: string[] }): Promise<Dataroom> => {
+    const response = await api.post(`/api/datarooms/${id}/clone`, data ?? {});
+    return response.data;
+  },
+
   getFiles: async (id: string): Promise<{ files: File[] }> => {
     const response = await api.get(`/api/datarooms/${id}/files`);
     return response.data;
   },
+
+  upload: async (id: string, uploads: globalThis.File[]): Promise<{ files: File[] }> => {
+    const form = new FormData();
+    uploads.forEach((upload) => form.append('file', upload, upload.name));
+    const response = await api.post(`/api/datarooms/${id}/upload`, form);
+    return response.data;
+  },
 };
 
 // Drive API
@@ -92,6 +104,7 @@ export const driveApi = {
     page_size?: number;
     page_token?: string;
     q?: string;
+    prefetch?: 0 | 1;
   }): Promise<{ files: DriveFile[]; next_page_token: string | null }> => {
     const response = await api.get('/api/drive/files', { params });
     return response.data;
@@ -120,8 +133,81 @@ export const filesApi = {
     return response.data;
   },
 
+  // Stream import progress (SSE). fetch is used instead of EventSource so the
+  // auth header can be sent; reconnects when the server ends the stream.
+  subscribeImportEvents: (onEvent: (event: ImportEvent) => void): (() => void) => {
+    const controller = new AbortController();
+
+    async function listen() {
+      while (!controller.signal.aborted) {
+        try {
+          const token = localStorage.getItem('authToken');
+          const response = await fetch(`${API_URL}/api/files/import/events`, {
+            headers: token ? { Authorization: `Bearer ${token}` } : {},
+            credentials: 'include',
+            signal: controller.signal,
+          });
+          if (!response.ok || !response.body) return;
+
+          const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+          let buffer = '';
+          for (;;) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += value;
+            const messages = buffer.split('\n\n');
+            buffer = messages.pop() ?? '';
+            for (const message of messages) {
+              const data = message
+                .split('\n')
+                .filter((line) => line.startsWith('data:'))
+                .map((line) => line.slice(5).trim())
+                .join('\n');
+              if (data) onEvent(JSON.parse(data));
+            }
+          }
+        } catch {
+          if (controller.signal.aborted) return;
+        }
+        await new Promise((resolve) => setTimeout(resolve, 3000));
+      }
+    }
+
+    listen();
+    return () => controller.abort();
+  },
+
+  createLink: async (
+    id: string,
+    options?: { expires_in?: number; inline?: boolean }
+  ): Promise<{ url: string; expires_at: string }> => {
+    const response = await api.post(`/api/files/${id}/link`, options ?? {});
+    return response.data;
+  },
+
+  thumbnail: async (id: string, width: number): Promise<Blob> => {
+    const response = await api.get(`/api/files/${id}/thumbnail`, {
+      params: { w: width },
+      responseType: 'blob',
+    });
+    return response.data;
+  },
+
   delete: async (id: string): Promise<void> => {
     await api.delete(`/api/files/${id}`);
   },
+
+  bulk: async (
+    action: 'delete' | 'move',
+    fileIds: string[],
+    dataroomId?: string
+  ): Promise<{ action: string; file_ids: string[]; skipped: string[] }> => {
+    const response = await api.post('/api/files/bulk', {
+      action,
+      file_ids: fileIds,
+      dataroom_id: dataroomId,
+    });
+    return response.data;
+  },
 };
 
@@ -1,6 +1,6 @@
 import { useState, useEffect, useCallback } from 'react';
 import { driveApi, filesApi } from '../api/client';
-import type { DriveFile, File as DataroomFile } from '../types';
+import type { DriveFile, File as DataroomFile, ImportEvent } from '../types';
 import {
   X,
   Search,
@@ -31,6 +31,24 @@ export default function DriveFilePickerModal({
   const [importingFileId, setImportingFileId] = useState<string | null>(null);
   const [importedFileIds, setImportedFileIds] = useState<Set<string>>(new Set());
   const [importError, setImportError] = useState<string | null>(null);
+  const [importProgress, setImportProgress] = useState<Record<string, number>>({});
+
+  // Live download progress for imports, keyed by Drive file id
+  useEffect(() => {
+    return filesApi.subscribeImportEvents((event: ImportEvent) => {
+      if (event.dataroom_id !== dataroomId) return;
+      if (event.stage === 'downloading' && event.total_bytes) {
+        const percent = Math.min(100, Math.round((event.bytes_downloaded! / event.total_bytes) * 100));
+        setImportProgress((prev) => ({ ...prev, [event.google_file_id]: percent }));
+      } else if (event.stage === 'completed' || event.stage === 'failed') {
+        setImportProgress((prev) => {
+          const next = { ...prev };
+          delete next[event.google_file_id];
+          return next;
+        });
+      }
+    });
+  }, [dataroomId]);
 
   const loadFiles = useCallback(async (query?: string, pageToken?: string) => {
     try {
@@ -45,6 +63,8 @@ export default function DriveFilePickerModal({
         page_size: 20,
         page_token: pageToken,
         q: query || undefined,
+        // Server fetches the next page in the background for "load more"
+        prefetch: 1,
       });
 
       if (pageToken) {
@@ -249,7 +269,9 @@ export default function DriveFilePickerModal({
                       ) : isImporting ? (
                         <span className="flex items-center gap-1.5">
                           <Loader2 className="w-4 h-4 animate-spin" />
-                          Importing...
+                          {importProgress[file.id] !== undefined
+                            ? `Importing ${importProgress[file.id]}%`
+                            : 'Importing...'}
                         </span>
                       ) : (
                         'Import'
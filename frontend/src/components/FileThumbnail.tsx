@@ -0,0 +1,67 @@
+import { useEffect, useState } from 'react';
+import type { LucideIcon } from 'lucide-react';
+import { filesApi } from '../api/client';
+
+// Types the backend can render a first-page / image thumbnail for
+// (Google Docs and Slides are stored as exported PDFs)
+const PREVIEWABLE_TYPES = [
+  'application/pdf',
+  'application/vnd.google-apps.document',
+  'application/vnd.google-apps.presentation',
+  'image/jpeg',
+  'image/png',
+  'image/gif',
+  'image/webp',
+];
+
+interface FileThumbnailProps {
+  fileId: string;
+  mimeType: string | null;
+  fallbackIcon: LucideIcon;
+  width?: number;
+}
+
+export default function FileThumbnail({
+  fileId,
+  mimeType,
+  fallbackIcon: FallbackIcon,
+  width = 128,
+}: FileThumbnailProps) {
+  const [src, setSrc] = useState<string | null>(null);
+  const previewable = mimeType !== null && PREVIEWABLE_TYPES.includes(mimeType);
+
+  useEffect(() => {
+    if (!previewable) return;
+
+    // Fetched with the auth header (an <img> can't send it); the response is
+    // immutable and privately cacheable, so revisits hit the browser cache
+    let objectUrl: string | null = null;
+    let cancelled = false;
+    filesApi
+      .thumbnail(fileId, width)
+      .then((blob) => {
+        if (cancelled) return;
+        objectUrl = URL.createObjectURL(blob);
+        setSrc(objectUrl);
+      })
+      .catch(() => {
+        // No preview available - keep the icon
+      });
+
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [fileId, width, previewable]);
+
+  return (
+    <div className="w-10 h-10 rounded-lg bg-midnight-700/50 overflow-hidden
+                    flex items-center justify-center flex-shrink-0">
+      {src ? (
+        <img src={src} alt="" loading="lazy" className="w-full h-full object-cover object-top" />
+      ) : (
+        <FallbackIcon className="w-5 h-5 text-teal-400" />
+      )}
+    </div>
+  );
+}
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { dataroomsApi, filesApi } from '../api/client';
 import { useAuth } from '../context/AuthContext';
@@ -12,8 +12,11 @@ import {
   Loader2,
   ExternalLink,
   AlertCircle,
+  Upload,
+  Copy,
 } from 'lucide-react';
 import DriveFilePickerModal from '../components/DriveFilePickerModal';
+import FileThumbnail from '../components/FileThumbnail';
 import { authApi } from '../api/client';
 
 export default function DataroomDetailPage() {
@@ -28,6 +31,9 @@ export default function DataroomDetailPage() {
   const [showFilePicker, setShowFilePicker] = useState(false);
   const [deletingFileId, setDeletingFileId] = useState<string | null>(null);
   const [downloadingFileId, setDownloadingFileId] = useState<string | null>(null);
+  const [isUploading, setIsUploading] = useState(false);
+  const [isCloning, setIsCloning] = useState(false);
+  const uploadInputRef = useRef<HTMLInputElement>(null);
 
   useEffect(() => {
     if (id) {
@@ -119,6 +125,42 @@ export default function DataroomDetailPage() {
     setFiles([file, ...files]);
   }
 
+  async function handleUploadFiles(event: React.ChangeEvent<HTMLInputElement>) {
+    const selected = Array.from(event.target.files ?? []);
+    event.target.value = '';
+    if (!dataroom || selected.length === 0) return;
+
+    try {
+      setIsUploading(true);
+      setError(null);
+      const result = await dataroomsApi.upload(dataroom.id, selected);
+      setFiles((prev) => [...result.files, ...prev]);
+    } catch (err: unknown) {
+      console.error('Error uploading files:', err);
+      const error = err as { response?: { data?: { message?: string } } };
+      setError(error.response?.data?.message || 'Failed to upload files');
+    } finally {
+      setIsUploading(false);
+    }
+  }
+
+  async function handleCloneDataroom() {
+    if (!dataroom) return;
+
+    try {
+      setIsCloning(true);
+      setError(null);
+      const clone = await dataroomsApi.clone(dataroom.id);
+      navigate(`/datarooms/${clone.id}`);
+    } catch (err: unknown) {
+      console.error('Error cloning dataroom:', err);
+      const error = err as { response?: { data?: { message?: string } } };
+      setError(error.response?.data?.message || 'Failed to clone dataroom');
+    } finally {
+      setIsCloning(false);
+    }
+  }
+
   function formatFileSize(bytes: number | null): string {
     if (!bytes) return 'Unknown size';
     if (bytes < 1024) return `${bytes} B`;
@@ -210,6 +252,39 @@ export default function DataroomDetailPage() {
               </a>
             )}
 
+            <input
+              ref={uploadInputRef}
+              type="file"
+              multiple
+              className="hidden"
+              onChange={handleUploadFiles}
+            />
+            <button
+              onClick={() => uploadInputRef.current?.click()}
+              disabled={isUploading}
+              className="btn-secondary flex items-center gap-2"
+            >
+              {isUploading ? (
+                <Loader2 className="w-4 h-4 animate-spin" />
+              ) : (
+                <Upload className="w-4 h-4" />
+              )}
+              Upload
+            </button>
+
+            <button
+              onClick={handleCloneDataroom}
+              disabled={isCloning}
+              className="btn-secondary flex items-center gap-2"
+            >
+              {isCloning ? (
+                <Loader2 className="w-4 h-4 animate-spin" />
+              ) : (
+                <Copy className="w-4 h-4" />
+              )}
+              Clone
+            </button>
+
             <button
               onClick={handleDeleteDataroom}
               className="btn-danger flex items-center gap-2"
@@ -302,10 +377,11 @@ export default function DataroomDetailPage() {
                     >
                       <td className="py-4 px-4">
                         <div className="flex items-center gap-3">
-                          <div className="w-10 h-10 rounded-lg bg-midnight-700/50 
-                                          flex items-center justify-center flex-shrink-0">
-                            <FileIcon className="w-5 h-5 text-teal-400" />
-                          </div>
+                          <FileThumbnail
+                            fileId={file.id}
+                            mimeType={file.mime_type}
+                            fallbackIcon={FileIcon}
+                          />
                           <div className="min-w-0">
                             <p className="text-white font-medium truncate">
                               {file.name}
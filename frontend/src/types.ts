@@ -5,6 +5,11 @@ export interface User {
   created_at: string;
 }
 
+export interface Usage {
+  storage_used_bytes: number;
+  storage_quota_bytes: number | null;
+}
+
 export interface Dataroom {
   id: string;
   user_id: string;
@@ -13,6 +18,7 @@ export interface Dataroom {
   created_at: string;
   updated_at: string;
   file_count: number;
+  storage_used_bytes: number;
   files?: File[];
 }
 
@@ -38,6 +44,19 @@ export interface DriveFile {
   icon_link: string | null;
 }
 
+export interface ImportEvent {
+  import_id: string;
+  stage: 'started' | 'queued' | 'downloading' | 'saving' | 'completed' | 'failed';
+  dataroom_id: string;
+  google_file_id: string;
+  timestamp: number;
+  bytes_downloaded?: number;
+  total_bytes?: number | null;
+  file?: File;
+  error?: string;
+  message?: string;
+}
+
 export interface ApiError {
   error: string;
   message: string;